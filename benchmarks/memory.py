@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2009 Adriano Monteiro Marques.
+#
+# Author: Bartosz SKOWRON <getxsick at gmail dot com>
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation; either version 2.1 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+
+"""
+Measure memory used by decoded packets.
+
+Many copies of an IP+TCP packet are decoded (in the full mode, so all
+fields are created) and kept in a list. The growth of the resident
+memory of the process divided by the number of packets is reported
+as bytes per packet. With -c packets are kept in a columnar store
+(see umit.umpa.sniffing._columns) with columns of common fields.
+
+Usage: python benchmarks/memory.py [-n packets] [-l] [-c]
+"""
+
+import gc
+import optparse
+import resource
+
+from umit.umpa import Packet
+from umit.umpa.protocols import Ethernet, IP, TCP, Payload
+from umit.umpa.protocols._consts import DLT_EN10MB
+from umit.umpa.protocols._decoder import Decoder
+from umit.umpa.sniffing._columns import PacketColumns
+
+# columns gathered in the columnar mode
+COLUMNS = ('ts', 'ip.src', 'ip.dst', 'ip._proto', 'tcp.srcport',
+           'tcp.dstport', 'tcp.flags')
+
+def rss():
+    """
+    Return the resident memory of the process in bytes.
+    """
+
+    try:
+        for line in open('/proc/self/status'):
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) * 1024
+    except IOError:
+        pass
+    # maximum only, but it's enough because memory grows
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('-n', '--packets', type='int', default=20000,
+                      help='number of decoded packets')
+    parser.add_option('-l', '--lazy', action='store_true', default=False,
+                      help='decode in the lazy mode')
+    parser.add_option('-c', '--columns', action='store_true', default=False,
+                      help='store packets in a columnar store')
+    options, args = parser.parse_args()
+
+    raw = Packet(Ethernet(src="00:11:22:33:44:55", dst="66:77:88:99:aa:bb"),
+                 IP(src="10.0.0.1", dst="10.0.0.2"),
+                 TCP(srcport=2000, dstport=80, flags=0x12),
+                 Payload("x" * 64)).get_raw()
+    decoder = Decoder(DLT_EN10MB, options.lazy)
+    # warm up caches (e.g. compiled layouts)
+    decoder.decode(raw)
+
+    gc.collect()
+    before = rss()
+    if options.columns:
+        packets = PacketColumns(DLT_EN10MB)
+        for i in xrange(options.packets):
+            packets.append(i, raw)
+        for name in COLUMNS:
+            packets[name]
+    else:
+        packets = [ decoder.decode(raw) for i in xrange(options.packets) ]
+    gc.collect()
+    used = rss() - before
+
+    print "%d packets, %.1f MB, %d bytes per packet" % (len(packets),
+                                        used / 1e6, used // len(packets))
+
+if __name__ == '__main__':
+    main()
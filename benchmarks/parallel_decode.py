@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2009 Adriano Monteiro Marques.
+#
+# Author: Bartosz SKOWRON <getxsick at gmail dot com>
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation; either version 2.1 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+
+"""
+Compare serial and parallel decoding of a capture file.
+
+A pcap file with generated TCP and UDP packets is written to a temporary
+directory. Statistics of the file (see umit.umpa.sniffing.file_stats())
+are computed by iterating over the file in this process and by a pool
+of processes.
+
+Usage: python benchmarks/parallel_decode.py [-n packets] [-p processes]
+"""
+
+import optparse
+import os
+import shutil
+import tempfile
+import time
+
+import umit.umpa.sniffing
+from umit.umpa import Packet
+from umit.umpa.protocols import Ethernet, IP, TCP, UDP, Payload
+from umit.umpa.protocols._decoder import Decoder
+from umit.umpa.sniffing import FileStats, PcapWriter
+from umit.umpa.sniffing.libpcap import pcapfile
+
+def generate(filename, count):
+    """
+    Write count packets to the pcap file.
+    """
+
+    writer = PcapWriter(filename)
+    for i in xrange(count):
+        if i % 3:
+            layer4 = TCP(srcport=1024 + i % 1000, dstport=80)
+        else:
+            layer4 = UDP(srcport=1024 + i % 1000, dstport=53)
+        packet = Packet(Ethernet(), IP(src="10.0.%d.%d" % (i % 7, i % 250),
+                                       dst="192.168.0.1"),
+                        layer4, Payload("x" * (i % 512)))
+        writer.write(packet, 1000 + i * 0.001)
+    writer.close()
+
+def serial_stats(filename):
+    """
+    Compute statistics in this process.
+    """
+
+    stats = FileStats()
+    f = pcapfile.open_pcap(filename)
+    try:
+        decoder = Decoder(f.datalink(), lazy=True)
+        for ts, raw in f:
+            stats.add(ts, decoder.decode(str(raw)), len(raw))
+    finally:
+        f.close()
+    return stats
+
+def measure(func, *args):
+    start = time.time()
+    result = func(*args)
+    return time.time() - start, result
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('-n', '--packets', type='int', default=100000,
+                      help='number of packets in the file')
+    parser.add_option('-p', '--processes', type='int', default=None,
+                      help='number of processes (default: number of CPUs)')
+    options, args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(directory, 'bench.pcap')
+        generate(filename, options.packets)
+        size = os.path.getsize(filename)
+
+        serial_time, serial = measure(serial_stats, filename)
+        parallel_time, parallel = measure(umit.umpa.sniffing.file_stats,
+                                          filename, None, options.processes)
+        assert serial.packets == parallel.packets == options.packets
+        assert serial.protocols == parallel.protocols
+    finally:
+        shutil.rmtree(directory)
+
+    print "%d packets, %.1f MB" % (options.packets, size / 1e6)
+    for name, elapsed in (('serial', serial_time),
+                          ('parallel', parallel_time)):
+        print "%-10s %8.3f s %12.0f packets/s" % (name, elapsed,
+                                                options.packets / elapsed)
+    print "speedup    %8.2fx" % (serial_time / parallel_time)
+
+if __name__ == '__main__':
+    main()
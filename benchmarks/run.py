@@ -0,0 +1,441 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2009 Adriano Monteiro Marques.
+#
+# Author: Bartosz SKOWRON <getxsick at gmail dot com>
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation; either version 2.1 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+
+"""
+Benchmark suite of building, decoding, serialization and sending packets.
+
+Every benchmark reports a rate (packets or bytes per second, the best
+of a few repeats). Sections which need no privileges are run by default:
+
+ - create: instances of protocols (without building packets),
+ - access: getting and setting protocols and fields by attributes,
+ - build: IP+TCP/UDP/ICMP and IPv6+TCP/UDP packets with various payloads,
+ - decode: packets of a generated pcap file (full, lazy and raw modes),
+ - xml: saving and loading packets by the XML extension,
+ - checksum: in_cksum() throughput.
+
+The send section (raw sockets, root privileges) is run with --send.
+
+Results are printed as a table and may be saved as JSON (--output)
+to compare them with results of other commits (--compare).
+With --profile time of stages (see umit.umpa.utils.profiling) is printed
+for every benchmark (rates are lower then).
+
+Usage: python benchmarks/run.py [options] [benchmark name prefixes]
+"""
+
+import optparse
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+import umit.umpa
+import umit.umpa.sniffing
+from umit.umpa import Packet, Socket, SocketL2
+from umit.umpa.protocols import Ethernet, IP, IPV6, TCP, UDP, Payload
+from umit.umpa.protocols.ICMP import ICMP
+from umit.umpa.sniffing import PcapWriter
+from umit.umpa.utils.checksum import in_cksum
+from umit.umpa.utils import profiling
+from umit.umpa.utils.clock import monotonic
+
+PAYLOAD_SIZES = (0, 64, 512, 1400)
+IPV6_ADDR = "0000:0000:0000:0000:0000:0000:0000:0001"
+
+# (name, section, unit, setup) of registered benchmarks
+_benchmarks = []
+
+def benchmark(name, section, unit='packets'):
+    """
+    Register a benchmark.
+
+    The decorated function prepares the benchmark and returns
+    (func, amount) where func() does the measured work and amount is
+    the number of units (e.g. packets) processed by one call.
+    """
+
+    def register(setup):
+        _benchmarks.append((name, section, unit, setup))
+        return setup
+    return register
+
+def measure(func, amount, min_time=0.2, repeat=3):
+    """
+    Return the best rate of the function in units per second.
+
+    The function is called in loops which take at least min_time.
+    """
+
+    calls = 1
+    while True:
+        start = monotonic()
+        for i in xrange(calls):
+            func()
+        elapsed = monotonic() - start
+        if elapsed >= min_time:
+            break
+        calls *= 2
+    best = elapsed
+    for i in xrange(repeat - 1):
+        start = monotonic()
+        for i in xrange(calls):
+            func()
+        best = min(best, monotonic() - start)
+    return calls * amount / best
+
+# create
+
+def _create_benchmark(cls):
+    def setup():
+        return cls, 1
+    benchmark("create.%s" % cls.name.lower(), 'create', 'instances')(setup)
+
+for _cls in (Ethernet, IP, IPV6, TCP, UDP, ICMP, Payload):
+    _create_benchmark(_cls)
+del _cls
+
+# access
+
+def _access_packet():
+    return Packet(Ethernet(), IP(src="10.0.0.1", dst="10.0.0.2"),
+                  TCP(srcport=2000, dstport=80), Payload("x" * 64))
+
+@benchmark('access.protocol', 'access', 'accesses')
+def bench_access_protocol():
+    packet = _access_packet()
+    return lambda: packet.tcp, 1
+
+@benchmark('access.get', 'access', 'accesses')
+def bench_access_get():
+    packet = _access_packet()
+    return lambda: packet.tcp.dstport, 1
+
+@benchmark('access.set_int', 'access', 'accesses')
+def bench_access_set_int():
+    tcp = _access_packet().tcp
+    def func():
+        tcp.dstport = 81
+    return func, 1
+
+@benchmark('access.set_addr', 'access', 'accesses')
+def bench_access_set_addr():
+    ip = _access_packet().ip
+    def func():
+        ip.src = "10.0.0.3"
+    return func, 1
+
+# build
+
+def _build_benchmark(name, factory):
+    for size in PAYLOAD_SIZES:
+        def setup(size=size):
+            data = "x" * size
+            return lambda: factory(data).get_raw(), 1
+        benchmark("build.%s.%d" % (name, size), 'build')(setup)
+
+_build_benchmark('ip_tcp', lambda data: Packet(
+                        IP(src="10.0.0.1", dst="10.0.0.2"),
+                        TCP(srcport=2000, dstport=80), Payload(data)))
+_build_benchmark('ip_udp', lambda data: Packet(
+                        IP(src="10.0.0.1", dst="10.0.0.2"),
+                        UDP(srcport=2000, dstport=53), Payload(data)))
+_build_benchmark('ip_icmp', lambda data: Packet(
+                        IP(src="10.0.0.1", dst="10.0.0.2"),
+                        ICMP(type='ECHO'), Payload(data)))
+_build_benchmark('ipv6_tcp', lambda data: Packet(
+                        IPV6(src=IPV6_ADDR, dst=IPV6_ADDR),
+                        TCP(srcport=2000, dstport=80), Payload(data)))
+_build_benchmark('ipv6_udp', lambda data: Packet(
+                        IPV6(src=IPV6_ADDR, dst=IPV6_ADDR),
+                        UDP(srcport=2000, dstport=53), Payload(data)))
+
+@benchmark('build.get_raw.ip_tcp', 'build')
+def bench_get_raw():
+    packet = Packet(IP(src="10.0.0.1", dst="10.0.0.2"),
+                    TCP(srcport=2000, dstport=80), Payload("x" * 64))
+    return packet.get_raw, 1
+
+@benchmark('build.template.ip_tcp', 'build')
+def bench_template():
+    template = Packet(IP(src="10.0.0.1", dst="10.0.0.2"),
+                      TCP(srcport=2000, dstport=80),
+                      Payload("x" * 64)).compile('tcp.dstport')
+    return lambda: template.render(dstport=81), 1
+
+# decode
+
+def _frames(count=1000):
+    """
+    Return mixed Ethernet frames for decode benchmarks.
+    """
+
+    frames = []
+    for i in xrange(count):
+        if i % 2:
+            layer3 = IP(src="10.0.0.%d" % (i % 250), dst="10.0.1.1")
+        else:
+            layer3 = IPV6(src=IPV6_ADDR, dst=IPV6_ADDR)
+        if i % 3:
+            layer4 = TCP(srcport=1024 + i, dstport=80)
+        else:
+            layer4 = UDP(srcport=1024 + i, dstport=53)
+        frames.append(Packet(Ethernet(), layer3, layer4,
+                             Payload("x" * (i % 512))).get_raw())
+    return frames
+
+def _decode_benchmark(mode):
+    def setup():
+        filename = os.path.join(_tmpdir(), 'decode.pcap')
+        if not os.path.isfile(filename):
+            writer = PcapWriter(filename)
+            writer.write_many(_frames())
+            writer.close()
+        def func():
+            for ts, packet in umit.umpa.sniffing.iter_file(filename,
+                                                        decode=mode):
+                pass
+        return func, 1000
+    benchmark("decode.%s" % mode, 'decode')(setup)
+
+for _mode in ('full', 'lazy', 'raw'):
+    _decode_benchmark(_mode)
+del _mode
+
+# xml
+
+def _xml_packets(count=100):
+    packets = []
+    for i in xrange(count):
+        if i % 2:
+            layer4 = TCP(srcport=1024 + i, dstport=80)
+        else:
+            layer4 = UDP(srcport=1024 + i, dstport=53)
+        packets.append(Packet(IP(src="10.0.0.1", dst="10.0.0.2"), layer4,
+                              Payload("x" * 64)))
+    return packets
+
+@benchmark('xml.save', 'xml')
+def bench_xml_save():
+    from umit.umpa.extensions import XML
+    packets = _xml_packets()
+    filename = os.path.join(_tmpdir(), 'save.xml')
+    return lambda: XML.save(filename, packets), len(packets)
+
+@benchmark('xml.load', 'xml')
+def bench_xml_load():
+    from umit.umpa.extensions import XML
+    packets = _xml_packets()
+    filename = os.path.join(_tmpdir(), 'load.xml')
+    XML.save(filename, packets)
+    return lambda: XML.load(filename), len(packets)
+
+# checksum
+
+for _size in (20, 64, 1500, 65535):
+    def _setup(size=_size):
+        data = os.urandom(size)
+        return lambda: in_cksum(data), size
+    benchmark("checksum.%d" % _size, 'checksum', 'bytes')(_setup)
+del _size, _setup
+
+# send (root privileges)
+
+@benchmark('send.l2', 'send')
+def bench_send_l2():
+    sock = _socket(SocketL2, _options.iface)
+    packets = [ Packet(Ethernet(), IP(src="127.0.0.1", dst="127.0.0.1"),
+                       UDP(srcport=2000, dstport=9), Payload("x" * 64)) ] * 64
+    return lambda: sock.send(*packets), len(packets)
+
+@benchmark('send.l2_raw', 'send')
+def bench_send_l2_raw():
+    sock = _socket(SocketL2, _options.iface)
+    raws = [ Packet(Ethernet(), IP(src="127.0.0.1", dst="127.0.0.1"),
+                    UDP(srcport=2000, dstport=9),
+                    Payload("x" * 64)).get_raw() ] * 64
+    return lambda: sock.send_raw(*raws), len(raws)
+
+@benchmark('send.l3', 'send')
+def bench_send_l3():
+    sock = _socket(Socket)
+    packets = [ Packet(IP(src="127.0.0.1", dst="127.0.0.1"),
+                       UDP(srcport=2000, dstport=9), Payload("x" * 64)) ] * 64
+    return lambda: sock.send(*packets), len(packets)
+
+# runner
+
+_options = None
+_resources = {'tmpdir' : None, 'sockets' : []}
+
+def _tmpdir():
+    if _resources['tmpdir'] is None:
+        _resources['tmpdir'] = tempfile.mkdtemp(prefix='umpa-bench-')
+    return _resources['tmpdir']
+
+def _socket(cls, *args):
+    sock = cls(*args)
+    _resources['sockets'].append(sock)
+    return sock
+
+def _cleanup():
+    for sock in _resources['sockets']:
+        sock.close()
+    _resources['sockets'] = []
+    if _resources['tmpdir'] is not None:
+        shutil.rmtree(_resources['tmpdir'])
+        _resources['tmpdir'] = None
+
+def _commit():
+    """
+    Return the current git commit (or None).
+    """
+
+    directory = os.path.dirname(os.path.abspath(__file__))
+    try:
+        process = subprocess.Popen(['git', 'rev-parse', 'HEAD'],
+                                   cwd=directory, stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE)
+    except OSError:
+        return None
+    output = process.communicate()[0].strip()
+    if process.returncode:
+        return None
+    return output
+
+def run(names=None, sections=None, min_time=0.2, repeat=3, profile=False):
+    """
+    Run selected benchmarks and return results.
+
+    @type names: C{list}
+    @param names: prefixes of names of benchmarks (default: all)
+
+    @type sections: C{list}
+    @param sections: sections to run (default: all)
+
+    @type profile: C{bool}
+    @param profile: print time of stages of every benchmark
+
+    @rtype: C{dict}
+    @return: name -> {'rate': units per second, 'unit': unit}
+    """
+
+    results = {}
+    try:
+        for name, section, unit, setup in _benchmarks:
+            if sections is not None and section not in sections:
+                continue
+            if names and not [ prefix for prefix in names
+                                        if name.startswith(prefix) ]:
+                continue
+            func, amount = setup()
+            if profile:
+                profiling.reset()
+                profiling.enable()
+            try:
+                results[name] = {
+                    'rate' : measure(func, amount, min_time, repeat),
+                    'unit' : unit,
+                }
+            finally:
+                profiling.disable()
+            _report(name, results[name])
+            if profile:
+                print profiling.report()
+                print
+    finally:
+        _cleanup()
+    return results
+
+def _report(name, result, base=None):
+    line = "%-28s %14.0f %s/s" % (name, result['rate'], result['unit'])
+    if base is not None:
+        line += "  %6.2fx" % (result['rate'] / base['rate'])
+    print line
+    sys.stdout.flush()
+
+def main():
+    global _options
+
+    parser = optparse.OptionParser(usage="%prog [options] [names]")
+    parser.add_option('-o', '--output', help='save results as JSON')
+    parser.add_option('-c', '--compare', metavar='FILE',
+                      help='compare results with the saved ones')
+    parser.add_option('-s', '--section', action='append', dest='sections',
+                      help='run only this section (may be repeated)')
+    parser.add_option('--send', action='store_true', default=False,
+                      help='run the send section (root privileges)')
+    parser.add_option('-i', '--iface', default='lo',
+                      help='interface for L2 send benchmarks (default: lo)')
+    parser.add_option('-t', '--min-time', type='float', default=0.2,
+                      help='minimum time of a measurement in seconds')
+    parser.add_option('-r', '--repeat', type='int', default=3,
+                      help='number of measurements (the best one is used)')
+    parser.add_option('-p', '--profile', action='store_true', default=False,
+                      help='print time of stages of every benchmark')
+    parser.add_option('-l', '--list', action='store_true', default=False,
+                      help='list benchmarks')
+    _options, names = parser.parse_args()
+
+    if _options.list:
+        for name, section, unit, setup in _benchmarks:
+            print "%-28s %s" % (name, section)
+        return
+
+    sections = _options.sections
+    if sections is None:
+        sections = [ section for name, section, unit, setup in _benchmarks
+                                                    if section != 'send' ]
+        if _options.send:
+            sections.append('send')
+
+    results = run(names, sections, _options.min_time, _options.repeat,
+                  _options.profile)
+
+    if _options.compare:
+        base = json.load(open(_options.compare))['results']
+        print
+        print "compared with %s" % _options.compare
+        for name, section, unit, setup in _benchmarks:
+            if name in results and name in base:
+                _report(name, results[name], base[name])
+
+    if _options.output:
+        output = open(_options.output, 'w')
+        json.dump({
+            'commit' : _commit(),
+            'time' : time.time(),
+            'python' : platform.python_version(),
+            'platform' : platform.platform(),
+            'results' : results,
+        }, output, indent=1, sort_keys=True)
+        output.close()
+
+if __name__ == '__main__':
+    main()
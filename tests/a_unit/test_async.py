@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2009 Adriano Monteiro Marques.
+#
+# Author: Bartosz SKOWRON <getxsick at gmail dot com>
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation; either version 2.1 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+
+
+import asyncore
+import fcntl
+import os
+import socket
+
+import py.test
+
+import umit.umpa
+from umit.umpa import AsyncSocket, SocketL2
+from umit.umpa.sniffing import AsyncSession
+from umit.umpa.utils.exceptions import UMPAException
+from tests.a_unit.test_sniffing.test_libpcap.test_tpacket import FILTER, \
+                                                                    _frame
+
+class TestAsync(object):
+    def setup_method(self, method):
+        if os.name == 'posix' and os.geteuid() != 0:
+            py.test.skip('root-privileges are needed')
+        if umit.umpa._sockets._l2model != 'AF_PACKET':
+            py.test.skip('AF_PACKET is needed')
+
+    def test_send_many(self):
+        sniffer = socket.socket(socket.AF_PACKET, socket.SOCK_RAW,
+                                socket.htons(umit.umpa._sockets.ETH_P_ALL))
+        sniffer.bind(('lo', 0))
+        sniffer.settimeout(1)
+
+        results = []
+        channels = {}
+        sock = AsyncSocket(SocketL2('lo'), channels, batch_size=4)
+        packets = [ _frame(i) for i in xrange(10) ]
+        sock.send_many(packets, results.append)
+        sock.send_many([], results.append)
+        assert results == [[]]
+        assert sock.pending() == 10
+        assert sock.writable() and not sock.readable()
+
+        asyncore.loop(0.1, True, channels, 10)
+        assert sock.pending() == 0
+        assert results == [[], [ len(p.get_raw()) for p in packets ]]
+        sock.close()
+        assert channels == {}
+
+        raws = [ p.get_raw() for p in packets ]
+        received = []
+        while len(received) < len(raws):
+            raw = sniffer.recv(2048)
+            if raw in raws and raw not in received:
+                received.append(raw)
+        assert received == raws
+
+        py.test.raises(UMPAException, AsyncSocket, SocketL2('lo', tx_ring=8))
+
+    def test_nonblocking(self):
+        sock = AsyncSocket(SocketL2('lo'), {})
+        flags = fcntl.fcntl(sock.socket.fileno(), fcntl.F_GETFL)
+        assert flags & os.O_NONBLOCK
+        sock.close()
+
+    def test_session(self):
+        from umit.umpa.sniffing.libpcap import tpacket
+
+        def cbk(ts, packet, result):
+            result.append(packet)
+
+        channels = {}
+        captured = []
+        session = tpacket.open_pcap('lo', to_ms=10)
+        session.setfilter(FILTER)
+        sniffer = AsyncSession(session, cbk, [captured], count=3,
+                               decode='full', map=channels)
+        sock = AsyncSocket(SocketL2('lo'), channels)
+        # frames are captured twice on the loopback device
+        sock.send_many([ _frame(i) for i in xrange(2) ])
+
+        for i in xrange(100):
+            if sniffer.session is None:
+                break
+            asyncore.loop(0.1, True, channels, 1)
+        sock.close()
+
+        # closed after count packets
+        assert channels == {}
+        assert len(captured) == 3
+        assert captured[0].get_raw() == _frame(0).get_raw()
+        assert captured[0].udp.srcport == 1234
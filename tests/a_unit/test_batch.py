@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2009 Adriano Monteiro Marques.
+#
+# Author: Bartosz SKOWRON <getxsick at gmail dot com>
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation; either version 2.1 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+
+import py.test
+
+from umit.umpa import Packet
+from umit.umpa.protocols import IP, TCP, UDP, Payload
+from umit.umpa import _batch
+from umit.umpa.utils.exceptions import UMPAException, UMPAAttributeException
+
+def _tcp(dst="5.6.7.8", dstport=80, seq=1, flags=2):
+    return Packet(IP(src="1.2.3.4", dst=dst),
+                  TCP(srcport=2000, dstport=dstport, _seq=seq, flags=flags),
+                  Payload("UMPA!"))
+
+class TestBatch(object):
+    def setup_method(self, method):
+        if _batch.numpy is None:
+            py.test.skip("NumPy is not installed")
+
+    def test_render_batch(self):
+        numpy = _batch.numpy
+        t = _tcp().compile('ip.dst', 'tcp.dstport', 'tcp._seq', 'tcp.flags')
+        dsts = numpy.arange(0x0a000000, 0x0a000000 + 300)
+        ports = numpy.arange(300) * 200
+        seqs = numpy.arange(300, dtype=numpy.uint64) * 14000000
+        batch = t.render_batch(dstport=ports, _seq=seqs, flags=ports % 64,
+                               **{'ip.dst' : dsts})
+        assert batch.shape == (300, len(t.get_raw()))
+        for i in xrange(300):
+            dst = "10.0.%d.%d" % (i >> 8, i & 0xff)
+            expected = _tcp(dst, int(ports[i]), int(seqs[i]),
+                                            int(ports[i] % 64)).get_raw()
+            assert batch[i].tostring() == expected
+
+        # the template is not changed
+        assert t.get_raw() == _tcp().get_raw()
+
+    def test_render_batch_convert(self):
+        t = _tcp().compile('ip.dst', 'tcp.dstport')
+        batch = t.render_batch(dst=["1.1.1.1", "2.2.2.2"], dstport=8080)
+        assert batch[0].tostring() == _tcp("1.1.1.1", 8080).get_raw()
+        assert batch[1].tostring() == _tcp("2.2.2.2", 8080).get_raw()
+
+    def test_render_batch_udp(self):
+        def packet(srcport):
+            return Packet(IP(), UDP(srcport=srcport, dstport=53),
+                          Payload("odd"))
+        t = packet(1).compile('udp.srcport')
+        batch = t.render_batch(srcport=range(0, 65536, 4099))
+        for i, port in enumerate(range(0, 65536, 4099)):
+            assert batch[i].tostring() == packet(port).get_raw()
+
+    def test_wrong_values(self):
+        numpy = _batch.numpy
+        t = _tcp().compile('ip.dst', 'tcp.dstport')
+        py.test.raises(UMPAAttributeException, t.render_batch, foo=[1])
+        py.test.raises(UMPAAttributeException, t.render_batch,
+                                            dstport=numpy.array([-1, 2]))
+        py.test.raises(UMPAAttributeException, t.render_batch,
+                                            dstport=[1, 65536])
+        py.test.raises(UMPAAttributeException, t.render_batch,
+                                            dst=["1.2.3.4", "foo"])
+        py.test.raises(UMPAException, t.render_batch, dst=["1.2.3.4"],
+                                            dstport=[1, 2])
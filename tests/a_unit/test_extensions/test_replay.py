@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2009 Adriano Monteiro Marques.
+#
+# Author: Bartosz SKOWRON <getxsick at gmail dot com>
+#
+# This library is free software; you can redistribute it and/or modify 
+# it under the terms of the GNU Lesser General Public License as published 
+# by the Free Software Foundation; either version 2.1 of the License, or 
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but 
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public 
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License 
+# along with this library; if not, write to the Free Software Foundation, 
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA 
+
+
+import os
+import socket
+import tempfile
+
+import py.test
+
+import umit.umpa
+from umit.umpa import Packet
+from umit.umpa.protocols import Ethernet, IP, UDP, Payload
+from umit.umpa.protocols._consts import DLT_EN10MB, DLT_LINUX_SLL
+from umit.umpa.extensions import replay
+from umit.umpa.sniffing.libpcap.pcapfile import PcapWriter
+from umit.umpa.utils.clock import monotonic
+from umit.umpa.utils.exceptions import UMPAException
+
+def _frame(i):
+    return Packet(Ethernet(src='00:11:22:33:44:55', dst='00:11:22:33:44:55'),
+                  IP(src="127.0.0.1", dst="127.0.0.1"),
+                  UDP(srcport=1234, dstport=4321),
+                  Payload('x' * i)).get_raw()
+
+def _capture(timestamps, linktype=DLT_EN10MB):
+    f = tempfile.NamedTemporaryFile()
+    writer = PcapWriter(f.name, linktype)
+    for i, ts in enumerate(timestamps):
+        writer.write(_frame(i), ts)
+    writer.close()
+    return f
+
+class _Socket(object):
+    """
+    Records sent frames with times of sending.
+    """
+
+    def __init__(self):
+        self.sent = []
+        self.calls = 0
+
+    def send_raw(self, *raws):
+        now = monotonic()
+        self.calls += 1
+        for raw in raws:
+            self.sent.append((now, raw))
+        return [ len(raw) for raw in raws ]
+
+class TestExtensionReplay(object):
+    def test_timing(self):
+        f = _capture([100, 100.05, 100.1, 100.1005])
+        for speed, gaps in ((1, (0.05, 0.05, 0.0005)),
+                            (2, (0.025, 0.025, 0.00025))):
+            for preload in (True, False):
+                sock = _Socket()
+                stats = replay.replay(f.name, speed=speed, socket=sock,
+                                      preload=preload)
+                assert [ raw for t, raw in sock.sent ] == \
+                                    [ _frame(i) for i in xrange(4) ]
+                for i, gap in enumerate(gaps):
+                    real = sock.sent[i + 1][0] - sock.sent[i][0]
+                    assert abs(real - gap) < 0.005
+
+                assert stats.packets == 4
+                assert stats.bytes == sum([ len(_frame(i))
+                                            for i in xrange(4) ])
+                assert 0 <= stats.lateness_avg <= stats.lateness_max < 0.01
+                assert stats.jitter < 0.01
+                assert 0.1 / speed <= stats.elapsed < 0.1 / speed + 0.01
+                assert stats.pps == stats.packets / stats.elapsed
+                assert stats.bps == stats.bytes * 8 / stats.elapsed
+                assert str(stats).startswith("4 packets")
+
+    def test_fast(self):
+        f = _capture([ 100 + i for i in xrange(10) ])
+        sock = _Socket()
+        stats = replay.replay(f.name, speed=0, loop=3, socket=sock,
+                                                        batch_size=4)
+        assert [ raw for t, raw in sock.sent ] == \
+                                    [ _frame(i) for i in xrange(10) ] * 3
+        # late packets are sent in batches
+        assert sock.calls == 9
+        assert stats.packets == 30
+        assert stats.elapsed < 1
+
+    def test_errors(self):
+        py.test.raises(UMPAException, replay.replay, "/non/existing/file",
+                                                        socket=_Socket())
+        f = _capture([0])
+        py.test.raises(UMPAException, replay.replay, f.name, speed=-1,
+                                                        socket=_Socket())
+        f = _capture([0], DLT_LINUX_SLL)
+        py.test.raises(UMPAException, replay.replay, f.name,
+                                                        socket=_Socket())
+
+    def test_replay_lo(self):
+        if os.name == 'posix' and os.geteuid() != 0:
+            py.test.skip('root-privileges are needed')
+        if umit.umpa._sockets._l2model != 'AF_PACKET':
+            py.test.skip('AF_PACKET is needed to capture frames')
+
+        sniffer = socket.socket(socket.AF_PACKET, socket.SOCK_RAW,
+                                socket.htons(umit.umpa._sockets.ETH_P_ALL))
+        sniffer.bind(('lo', 0))
+        sniffer.settimeout(1)
+
+        f = _capture([ 100 + i * 0.001 for i in xrange(5) ])
+        stats = replay.replay(f.name, iface='lo')
+        assert stats.packets == 5
+
+        raws = [ _frame(i) for i in xrange(5) ]
+        received = []
+        while len(received) < len(raws):
+            raw = sniffer.recv(2048)
+            if raw in raws and raw not in received:
+                received.append(raw)
+        assert received == raws
@@ -20,25 +20,182 @@
 # Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA 
 
 import os
+import socket
 import time
 
 import py.test
 
 import umit.umpa
+from umit.umpa import _sockets
 from umit.umpa.protocols import IP
 from umit.umpa.extensions import schedule
+from umit.umpa.utils.clock import monotonic
 from umit.umpa.utils.exceptions import UMPAException
 
+class _Socket(object):
+    """
+    Records sent packets with times of sending.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def send(self, *packets):
+        self.calls.append((monotonic(), packets))
+        return [ len(packet.get_raw()) for packet in packets ]
+
+    def times(self):
+        result = []
+        for t, packets in self.calls:
+            result.extend([t] * len(packets))
+        return result
 
 class TestExtensionSchedule(object):
     def test_send_schedule_attr(self):
         assert hasattr(umit.umpa.Socket, 'send_schedule')
+        assert hasattr(_sockets.SocketL3, 'send_schedule')
+        assert hasattr(_sockets.INET6, 'send_schedule')
+        assert hasattr(_sockets.SocketL2, 'send_schedule')
 
     def test_wrong_arg(self):
         py.test.raises(UMPAException, "schedule.send(0, bad_args=None)")
         py.test.raises(UMPAException,
                             "schedule.send(0, interval=10, bad_args=None)")
 
+class TestScheduler(object):
+    def test_pps(self):
+        sock = _Socket()
+        packets = [ umit.umpa.Packet(IP()) for i in xrange(21) ]
+        stats = schedule.Scheduler(pps=200, socket=sock).run(packets)
+        times = sock.times()
+        assert len(times) == 21
+        # the schedule doesn't drift
+        assert abs(times[-1] - times[0] - 0.1) < 0.002
+        for i in xrange(20):
+            assert 0.003 < times[i + 1] - times[i] < 0.007
+        assert stats.packets == 21
+        assert stats.bytes == 21 * 20
+        assert 190 < stats.pps < 220
+
+    def test_bps(self):
+        sock = _Socket()
+        # 160 bits per packet
+        packets = [ umit.umpa.Packet(IP()) for i in xrange(11) ]
+        schedule.Scheduler(bps=16000, socket=sock).run(packets)
+        times = sock.times()
+        assert abs(times[-1] - times[0] - 0.1) < 0.002
+
+    def test_burst(self):
+        sock = _Socket()
+        packets = [ umit.umpa.Packet(IP()) for i in xrange(12) ]
+        schedule.Scheduler(pps=100, burst=4, socket=sock,
+                                            batch_size=8).run(packets)
+        # tokens for the burst are collected first
+        assert [ len(p) for t, p in sock.calls ][-4:] == [1, 1, 1, 1]
+        times = sock.times()
+        assert abs(times[-1] - times[0] - 0.08) < 0.003
+
+    def test_fast(self):
+        sock = _Socket()
+        packets = [ umit.umpa.Packet(IP()) for i in xrange(10) ]
+        stats = schedule.Scheduler(socket=sock, batch_size=4).run(packets,
+                                                                loop=3)
+        assert [ len(p) for t, p in sock.calls ] == [4, 4, 4, 4, 4, 4, 4, 2]
+        assert stats.packets == 30
+
+    def test_background(self):
+        sock = _Socket()
+        scheduler = schedule.Scheduler(pps=1000, socket=sock)
+        scheduler.start([ umit.umpa.Packet(IP()) ])
+        time.sleep(0.05)
+        assert scheduler.running
+        py.test.raises(UMPAException, scheduler.start, [])
+        scheduler.stop()
+        assert not scheduler.running
+        assert 30 < scheduler.stats.packets < 70
+        assert scheduler.stats.packets == len(sock.times())
+
+        # finite loop
+        scheduler.start([ umit.umpa.Packet(IP()) ], loop=5)
+        scheduler.join()
+        assert not scheduler.running
+
+    def test_stop_at_once(self):
+        sock = _Socket()
+        scheduler = schedule.Scheduler(socket=sock)
+        for i in xrange(10):
+            scheduler.start([ umit.umpa.Packet(IP()) ])
+            scheduler.stop(timeout=1)
+            assert not scheduler.running
+
+    def test_stats_reset(self):
+        sock = _Socket()
+        scheduler = schedule.Scheduler(pps=1000, socket=sock)
+        packets = [ umit.umpa.Packet(IP()) for i in xrange(10) ]
+        first = scheduler.run(packets)
+        second = scheduler.run(packets)
+        assert second is scheduler.stats
+        assert second is not first
+        assert second.packets == 10
+        assert second.bytes == 200
+        assert 800 < second.pps < 1200
+
+    def test_send_error(self):
+        class BrokenSocket(_Socket):
+            def send(self, *packets):
+                error = socket.error(100, 'Network is down')
+                error.sent_bytes = [20]
+                raise error
+
+        results = []
+        scheduler = schedule.Scheduler(socket=BrokenSocket())
+        py.test.raises(socket.error, scheduler.run,
+                       [ umit.umpa.Packet(IP()) for i in xrange(3) ],
+                       results=results)
+        assert results == [20]
+        assert scheduler.stats.packets == 1
+        assert scheduler.stats.bytes == 20
+
+    def test_detach(self):
+        sock = _Socket()
+        scheduler = schedule.send(0, [ umit.umpa.Packet(IP()) ] * 3,
+                                  detach=True, socket=sock, interval=0.01)
+        scheduler.join()
+        assert len(sock.times()) == 3
+        assert scheduler.stats.elapsed >= 0.03
+
+    def test_results(self):
+        sock = _Socket()
+        assert schedule.send(0, umit.umpa.Packet(IP()),
+                             umit.umpa.Packet(IP()), socket=sock,
+                             pps=1000, burst=2) == [[20], [20]]
+
+    def test_send_raw(self):
+        builds = []
+        class CountedPacket(umit.umpa.Packet):
+            def get_raw(self):
+                builds.append(self)
+                return super(CountedPacket, self).get_raw()
+
+        class RawSocket(_Socket):
+            def send_raw(self, *raws):
+                self.calls.append((monotonic(), raws))
+                return [ len(raw) for raw in raws ]
+
+        sock = RawSocket()
+        packets = [ CountedPacket(IP()) for i in xrange(3) ]
+        stats = schedule.Scheduler(bps=160000, socket=sock).run(packets)
+        # built once for the limit and for sending
+        assert builds == packets
+        assert [ raws for t, raws in sock.calls ] == \
+                                    [ (packet.get_raw(),) for packet in packets ]
+        assert stats.bytes == 60
+
+    def test_wrong_values(self):
+        for kwargs in ({'pps' : 0}, {'bps' : -1}, {'burst' : 0},
+                       {'interval' : -1}):
+            py.test.raises(UMPAException, schedule.Scheduler, **kwargs)
+
 class TestExtensionScheduleRoot(object):
     def setup_class(cls):
         # EUID has to be 0 for POSIX
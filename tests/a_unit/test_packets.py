@@ -63,6 +63,30 @@ class TestUMPAPacketsBasic(object):
         assert p.ip.src == "10.0.0.1"
         assert ip.src == "10.0.0.1"
 
+    def test_proto_access_changed(self):
+        ip = IP()
+        tcp = TCP()
+        udp = UDP()
+        p = Packet(ip, tcp)
+        assert p.tcp is tcp
+        assert p.TCP is tcp
+        py.test.raises(AttributeError, "p.udp")
+
+        p.protos.pop(0)
+        py.test.raises(AttributeError, "p.ip")
+        assert p.tcp is tcp
+
+        p.protos = [ip, udp]
+        assert p.ip is ip
+        assert p.udp is udp
+        py.test.raises(AttributeError, "p.tcp")
+
+        # the first protocol of the name is returned
+        ip2 = IP()
+        p.protos[1] = ip2
+        p.protos.insert(0, ip2)
+        assert p.ip is ip2
+
 class TestUMPAPackets(object):
     def test_add_new_protocols__strict(self):
         py.test.raises(UMPAStrictException, Packet, TCP(), IP())
@@ -210,3 +234,20 @@ class TestUMPAPacketsOutput(object):
 
         expected += "\x55\x4d\x50\x41"
         assert expected == p.get_raw()
+
+    def test_get_raw__big_payload(self):
+        # compare the buffer-based output with the number-based one
+        ip = IP(src="1.2.3.4", dst="5.6.7.8", flags='df', _frag_offset=123)
+        udp = UDP(srcport=1234, dstport=4321)
+        payload = Payload("UMPA" * 1024)
+        p = Packet(ip, udp, payload)
+        raw = p.get_raw()
+
+        expected = 0
+        bits = 0
+        for proto in reversed(p.protos):
+            raw_proto, bit_proto = proto.get_raw(tuple(p.protos), bits)
+            expected |= raw_proto << bits
+            bits += bit_proto
+        assert bits == len(raw) * 8
+        assert int(raw.encode('hex'), 16) == expected
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2009 Adriano Monteiro Marques.
+#
+# Author: Bartosz SKOWRON <getxsick at gmail dot com>
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation; either version 2.1 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+
+import os
+import socket
+
+import py.test
+
+import umit.umpa
+from umit.umpa import Packet, SocketL2, build_parallel
+from umit.umpa.protocols import Ethernet, IP, TCP, Payload
+from umit.umpa import _parallel
+from umit.umpa.utils.exceptions import UMPAException, UMPAAttributeException
+
+def _tcp(dst="5.6.7.8", dstport=80, seq=1):
+    return Packet(IP(src="1.2.3.4", dst=dst),
+                  TCP(srcport=2000, dstport=dstport, _seq=seq),
+                  Payload("UMPA!"))
+
+def _factory(i, payload):
+    # variable-length packets
+    return Packet(IP(src="1.2.3.4", dst="5.6.7.8"),
+                  TCP(srcport=2000, dstport=i + 1, _seq=i),
+                  Payload(payload * (i % 5)))
+
+def _ethernet(i):
+    return Packet(Ethernet(), IP(src="127.0.0.1", dst="127.0.0.2"),
+                  TCP(srcport=2000, dstport=i + 1), Payload("x" * i))
+
+def _expected(dst, dstport, seq):
+    return _tcp().compile('ip.dst', 'tcp.dstport', 'tcp._seq').render(
+                                    dst=dst, dstport=dstport, _seq=seq)
+
+class TestParallel(object):
+    def test_shards(self):
+        assert _parallel._shards(10, 1) == [(0, 3), (3, 6), (6, 8), (8, 10)]
+        assert _parallel._shards(3, 2) == [(0, 1), (1, 2), (2, 3)]
+        assert _parallel._shards(0, 2) == []
+        shards = _parallel._shards(1000, 3)
+        assert len(shards) == 12
+        assert shards[0][0] == 0 and shards[-1][1] == 1000
+
+    def test_render_parallel(self):
+        t = _tcp().compile('ip.dst', 'tcp.dstport', 'tcp._seq')
+        dsts = [ "10.0.0.%d" % (i % 256) for i in xrange(300) ]
+        packets = t.render_parallel(processes=2, dst=dsts,
+                                    dstport=xrange(1, 301), _seq=7)
+        assert len(packets) == 300
+        assert packets.length == len(t.raw)
+        assert len(packets.raw) == 300 * len(t.raw)
+        assert packets.sent is None
+        for i in (0, 1, 150, 299):
+            assert packets[i] == _expected(dsts[i], i + 1, 7)
+        assert packets[-1] == packets[299]
+        assert list(packets) == [ packets[i] for i in xrange(300) ]
+        py.test.raises(IndexError, packets.__getitem__, 300)
+
+        # the template is not changed
+        assert t.raw == _tcp().get_raw()
+
+    def test_render_parallel_single(self):
+        t = _tcp().compile('tcp.dstport')
+        packets = t.render_parallel(processes=1, dstport=443)
+        assert list(packets) == [_expected("5.6.7.8", 443, 1)]
+
+    def test_render_parallel_wrong(self):
+        t = _tcp().compile('ip.dst', 'tcp.dstport')
+        py.test.raises(UMPAAttributeException, t.render_parallel,
+                                                        srcport=[1, 2])
+        py.test.raises(UMPAException, t.render_parallel,
+                                    dst=["1.1.1.1"], dstport=[1, 2])
+        py.test.raises(UMPAException, t.render_parallel, processes=0,
+                                                        dstport=[1, 2])
+
+    def test_build_parallel(self):
+        raws = build_parallel(_factory, 50, processes=2, args=("ab",))
+        assert len(raws) == 50
+        for i in (0, 3, 4, 49):
+            assert raws[i] == _factory(i, "ab").get_raw()
+
+    def test_send(self):
+        if os.name == 'posix' and os.geteuid() != 0:
+            py.test.skip('root-privileges are needed')
+        if umit.umpa._sockets._l2model != 'AF_PACKET':
+            py.test.skip('AF_PACKET is needed')
+
+        t = Packet(Ethernet(), IP(src="127.0.0.1", dst="127.0.0.2"),
+                   TCP(srcport=2000, dstport=80)).compile('tcp.dstport')
+        sent = t.render_parallel(processes=2, iface='lo',
+                                 dstport=xrange(1, 21)).sent
+        assert sent == 20 * len(t.raw)
+        sent = build_parallel(_ethernet, 10, processes=2, iface='lo')
+        assert sent == sum([ len(_ethernet(i).get_raw())
+                                                for i in xrange(10) ])
@@ -21,10 +21,16 @@
 
 import os.path
 
-from umit.umpa.protocols._decoder import decode
-from umit.umpa.protocols import _consts
+from umit.umpa import Packet
+from umit.umpa.protocols._decoder import decode, Decoder
+import umit.umpa.protocols
+from umit.umpa.protocols import _consts, Ethernet, IP, IPV6, UDP, Payload
 import tests.a_unit.test_protocols
 
+def _values(packet):
+    return [ [ field.get() for field in proto.get_fields() ]
+                                                for proto in packet.protos ]
+
 class TestDecode(object):
     def test_iface_any(self):
         # for some reasons CWD is set to /tmp
@@ -96,3 +102,82 @@ class TestDecode(object):
         assert pkt.tcp._window_size == 512
         assert pkt.tcp._checksum == 0xb603
         assert pkt.tcp._urgent_pointer == 0
+
+    def test_lazy(self):
+        path = os.path.dirname(tests.a_unit.test_protocols.__file__)
+        for name, linktype in (('any.buf', _consts.DLT_LINUX_SLL),
+                               ('eth.buf', _consts.DLT_EN10MB)):
+            buf = open(os.path.join(path, name), 'rb').read()
+            pkt = decode(buf, linktype)
+            lazy = decode(buf, linktype, lazy=True)
+
+            # nothing is loaded before the first access
+            for proto in lazy.protos:
+                assert '__lazy' in proto.__dict__
+            assert isinstance(lazy.ip, IP)
+            assert lazy.tcp.dstport == 0
+            assert '__lazy' not in lazy.protos[2].__dict__
+            assert '__lazy' in lazy.protos[1].__dict__
+
+            assert [ p.name for p in lazy.protos ] == \
+                                        [ p.name for p in pkt.protos ]
+            assert _values(lazy) == _values(pkt)
+
+    def test_lazy_payload(self):
+        pkt = Packet(Ethernet(src="00:11:22:33:44:55", dst="00:11:22:33:44:55"),
+                     IPV6(src="0000:0000:0000:0000:0000:0000:0000:0001",
+                          dst="0000:0000:0000:0000:0000:0000:0000:0001"),
+                     UDP(srcport=1234, dstport=53), Payload("UMPA"))
+        raw = pkt.get_raw()
+        lazy = decode(raw, _consts.DLT_EN10MB, lazy=True)
+        assert [ p.name for p in lazy.protos ] == \
+                                        ['Ethernet', 'IPV6', 'UDP', 'Payload']
+        assert _values(lazy) == _values(decode(raw, _consts.DLT_EN10MB))
+        assert lazy.payload.data == "UMPA"
+
+        # fields can be changed and the packet built again
+        lazy = decode(raw, _consts.DLT_EN10MB, lazy=True)
+        lazy.udp.dstport = 54
+        pkt = decode(raw, _consts.DLT_EN10MB)
+        pkt.udp.dstport = 54
+        assert lazy.get_raw() == pkt.get_raw()
+
+    def test_decoder(self):
+        path = os.path.dirname(tests.a_unit.test_protocols.__file__)
+        buf = open(os.path.join(path, 'eth.buf'), 'rb').read()
+        for lazy in (False, True):
+            decoder = Decoder(_consts.DLT_EN10MB, lazy)
+            for i in xrange(3):
+                pkt = decoder.decode(buf)
+                assert pkt.ip.src == "192.168.10.108"
+                assert pkt.tcp.srcport == 2504
+
+        # unknown types are treated as payload
+        pkt = Decoder(_consts.DLT_NULL).decode("UMPA")
+        assert [ p.name for p in pkt.protos ] == ['Payload']
+        assert pkt.payload.data == "UMPA"
+
+    def test_local_protocols(self):
+        class Fake(Payload):
+            layer = 3
+            protocol_id = 0x1234
+            name = "Fake"
+            payload_fieldname = None
+            def load_raw(self, buffer):
+                self.data = buffer
+                return ""
+
+        path = os.path.dirname(tests.a_unit.test_protocols.__file__)
+        buf = open(os.path.join(path, 'eth.buf'), 'rb').read()
+        buf = buf[:12] + "\x12\x34" + buf[14:]
+        decoder = Decoder(_consts.DLT_EN10MB)
+        assert decoder.decode(buf).protos[1].name == "Payload"
+
+        # the dispatch table is rebuilt if local protocols change
+        local_protos = umit.umpa.protocols.get_locals()
+        local_protos['Fake'] = Fake
+        try:
+            assert decoder.decode(buf).protos[1].name == "Fake"
+        finally:
+            del local_protos['Fake']
+        assert decoder.decode(buf).protos[1].name == "Payload"
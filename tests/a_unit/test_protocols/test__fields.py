@@ -19,6 +19,8 @@
 # along with this library; if not, write to the Free Software Foundation, 
 # Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA 
 
+import copy
+
 import py.test
 from umit.umpa.protocols._fields import *
 from umit.umpa.utils.exceptions import UMPAException, UMPAAttributeException
@@ -62,6 +64,25 @@ class TestField(object):
         f = self.cls_field('foobar')
         py.test.raises(NotImplementedError, f._raw_value)
 
+    def test_slots(self):
+        f = self.cls_field('foobar')
+        assert not hasattr(f, '__dict__')
+        py.test.raises(AttributeError, setattr, f, 'xxx', 1)
+        assert self.cls_field.bits == f.bits
+
+    def test_copy(self):
+        f = self.cls_field('foobar')
+        f.set_doc('xxx')
+        for fill in (False, True):
+            if fill:
+                f._fill_slots()
+            g = copy.copy(f)
+            assert g is not f
+            assert type(g) is type(f)
+            assert g.name == f.name
+            assert g.bits == f.bits
+            assert g.__doc__ == 'xxx'
+
 class TestIntField(TestField):
     cls_field = IntField
 
@@ -328,6 +349,19 @@ class TestIPv4AddrField(TestIPAddrField):
         py.test.raises(UMPAAttributeException, f.set, (500,0,0,0))
         py.test.raises(UMPAAttributeException, f.set, ("10.0.0.0",))
 
+    def test_is_valid_cached(self):
+        f = self.cls_field('foobar')
+        assert f._is_valid("10.0.0.200")
+        assert f._is_valid("10.0.0.200")
+        assert not f._is_valid("10.0.0.256")
+        assert not f._is_valid("10.0.0.256")
+
+        # the format of the field is a part of the key
+        f.piece_size = 4
+        assert not f._is_valid("10.0.0.200")
+        f.piece_size = 8
+        assert f._is_valid("10.0.0.200")
+
 class TestIPv6AddrField(TestIPAddrField):
     #cls_field = IPv6AddrField
 
@@ -610,6 +644,19 @@ class TestFlags(TestField):
         f = self.cls_field('foobar', bits, a=True, b=True, c=True)
         py.test.raises(NotImplementedError, f._raw_value)
 
+    def test_slots(self):
+        f = self.cls_field('foobar', ['a', 'b'], b=True)
+        assert not hasattr(f, '__dict__')
+        assert f._value == {'a': False, 'b': True}
+        assert f.bits == 2
+
+    def test_copy(self):
+        f = self.cls_field('foobar', ['a', 'b'], b=True)
+        g = copy.copy(f)
+        g.set(True, 'a')
+        assert f.get('a', 'b') == [False, True]
+        assert g.get('a', 'b') == [True, True]
+
     def test_set_bit(self):
         bits = ['a', 'b', 'c']
         f = self.cls_field('foobar', bits)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2009 Adriano Monteiro Marques.
+#
+# Author: Bartosz SKOWRON <getxsick at gmail dot com>
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation; either version 2.1 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+
+import py.test
+
+from umit.umpa.protocols import IP, TCP
+from umit.umpa.protocols._layout import *
+from umit.umpa.utils.exceptions import UMPAException
+
+class TestLayout(object):
+    def test_offsets(self):
+        l = Layout(('a', 'b', 'c', 'd'), (4, 12, 48, 0))
+        assert l.offsets == {'a' : 0, 'b' : 4, 'c' : 16, 'd' : 64}
+        assert l.bits == 64
+        assert l.length == 8
+        assert l.struct.format == '!H6s'
+
+    def test_pack(self):
+        l = Layout(('a', 'b', 'c', 'd', 'e'), (4, 4, 16, 24, 3*8))
+        raw = l.pack([4, 5, 0x1234, 0xaabbcc, "xyz"])
+        assert raw == bytearray("\x45\x12\x34\xaa\xbb\xccxyz")
+
+        l = Layout(('a', 'b', 'c'), (3, 13, 16))
+        raw = l.pack([7, 1, "AB"])
+        assert raw == bytearray("\xe0\x01AB")
+
+    def test_odd_bits(self):
+        py.test.raises(UMPAException, Layout, ('a', 'b'), (8, 4))
+
+    def test_cache(self):
+        ip = IP()
+        ip.get_raw_buffer((ip,), 0)
+        layout = ip.__dict__['__layout']
+        assert layout in IP._layouts.values()
+        assert layout.offsets['_checksum'] == 80
+
+        # the same layout for the next instance
+        ip2 = IP(src="1.2.3.4")
+        ip2.get_raw_buffer((ip2,), 0)
+        assert ip2.__dict__['__layout'] is layout
+
+        # options change the size of the header
+        ip2.get_field('options').bits = 32
+        ip2.options = 1
+        ip2.get_raw_buffer((ip2,), 0)
+        assert ip2.__dict__['__layout'] is not layout
+        assert ip2.__dict__['__layout'].length == 24
+
+        # disabled field
+        ip.disable_fields('tos')
+        ip.get_raw_buffer((ip,), 0)
+        assert ip.__dict__['__layout'].offsets['_checksum'] == 72
+
+        # caches are not shared between classes
+        tcp = TCP()
+        tcp.get_raw_buffer((tcp,), 0)
+        assert tcp.__dict__['__layout'] not in IP._layouts.values()
@@ -22,8 +22,9 @@
 import types
 import py.test
 
-from umit.umpa.protocols._protocols import Protocol
+from umit.umpa.protocols._protocols import Protocol, _FieldProperty
 from umit.umpa.protocols._fields import IntField, Flags
+from umit.umpa.protocols.UDP import UDP
 from umit.umpa.utils.exceptions import UMPAException, UMPAAttributeException
 
 class TestProtocol(object):
@@ -48,6 +49,32 @@ class TestProtocol(object):
 
         assert p.get_field('a')._shortname == 'a'
 
+    def test_create_fields(self):
+        py.test.raises(NotImplementedError, Protocol)
+
+        calls = []
+        class FakeProto(Protocol):
+            _ordered_fields = ('a', 'b')
+
+            @classmethod
+            def _create_fields(cls):
+                calls.append(cls)
+                fields = [ IntField('foobar', 1, 8), Flags('bar', ['x', 'y']) ]
+                fields[0].set_doc('doc of a')
+                return fields
+
+        p = FakeProto(a=2)
+        q = FakeProto()
+        q.set_flags('b', x=True)
+        assert calls == [FakeProto]
+        assert p.a == 2
+        assert q.a == 1
+        assert p.get_flags('b', 'x') == [False]
+        assert q.get_flags('b', 'x') == [True]
+        assert p.get_field('a') is not q.get_field('a')
+        assert p.get_field('a').__doc__ == 'doc of a'
+        assert q.get_field('b')._shortname == 'b'
+
     def test_getattr(self):
         fake_fields = [IntField('foobar', 1, 8)]
         fake_ordered = ('a')
@@ -57,6 +84,37 @@ class TestProtocol(object):
         assert p.a == 1
         py.test.raises(UMPAAttributeException, "p.d")
 
+    def test_field_property(self):
+        class FakeProto(Protocol):
+            _ordered_fields = ('a', 'b')
+            b = 'class attribute'
+
+            @classmethod
+            def _create_fields(cls):
+                return [ IntField('foobar', 1, 8), IntField('bar', 2, 8) ]
+
+        assert isinstance(FakeProto.__dict__['a'], _FieldProperty)
+        assert FakeProto.b == 'class attribute'
+
+        p = FakeProto()
+        assert p.a == 1
+        p.a = 20
+        assert p.a == 20
+        assert p.get_field('a').get() == 20
+        py.test.raises(UMPAAttributeException, "p.a = 1000")
+        assert p.a == 20
+        py.test.raises(UMPAAttributeException, "p.c")
+
+        # fields of lazy objects are loaded on the first access
+        raw = "\x00" + "\x04\xd2\x00\x35\x00\x08\x00\x00"
+        lazy = UDP._new_lazy(raw, 1)
+        assert '_fields' not in lazy.__dict__
+        assert lazy.srcport == 1234
+        lazy = UDP._new_lazy(raw, 1)
+        lazy.dstport = 80
+        assert lazy.dstport == 80
+        assert lazy.srcport == 1234
+
     def test_setattr(self):
         fake_fields = [IntField('foobar', 1, 8)]
         fake_ordered = ('a')
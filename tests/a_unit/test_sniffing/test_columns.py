@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2009 Adriano Monteiro Marques.
+#
+# Author: Bartosz SKOWRON <getxsick at gmail dot com>
+#
+# This library is free software; you can redistribute it and/or modify 
+# it under the terms of the GNU Lesser General Public License as published 
+# by the Free Software Foundation; either version 2.1 of the License, or 
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but 
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public 
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License 
+# along with this library; if not, write to the Free Software Foundation, 
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA 
+
+import py.test
+
+from umit.umpa import Packet
+from umit.umpa.protocols import Ethernet, IP, IPV6, TCP, Payload
+from umit.umpa.protocols._consts import DLT_EN10MB
+from umit.umpa.sniffing import _columns
+from umit.umpa.utils.exceptions import UMPAException, UMPAAttributeException
+from tests.a_unit.test_sniffing.test_libpcap.test_pcapfile import _frames
+
+class TestPacketColumns(object):
+    def setup_method(self, method):
+        if _columns.numpy is None:
+            py.test.skip("NumPy is not installed")
+        self.store = _columns.PacketColumns(DLT_EN10MB)
+        for i, frame in enumerate(_frames() * 2):
+            self.store.append(1000.5 + i, frame)
+
+    def test_columns(self):
+        store = self.store
+        sizes = [ len(frame) for frame in _frames() ] * 2
+        assert len(store) == 6
+        assert store['ts'].tolist() == [ 1000.5 + i for i in xrange(6) ]
+        assert store['length'].tolist() == sizes
+        assert store['start'].tolist() == [ sum(sizes[:i]) for i in xrange(6) ]
+
+        assert store['ip.src'].tolist() == [0x01020304, 0x01020304,
+                                            0x05060708] * 2
+        assert store['ip._proto'].tolist() == [6, 17, 6] * 2
+        assert store['ip._hdr_len'].tolist() == [5] * 6
+        assert store['tcp.srcport'].tolist() == [2000, 0, 80] * 2
+        assert store['udp.dstport'].tolist() == [0, 53, 0] * 2
+        assert store['ethernet.src'].tolist() == [0x001122334455] * 6
+        assert store['tcp.dstport'].dtype == _columns.numpy.uint16
+        assert store['ipv6.src'].tolist() == [''] * 6
+
+        assert store.offsets('TCP').tolist() == [34, -1, 34] * 2
+        assert store.offsets('payload').tolist() == [54, 42, -1] * 2
+        assert store.has('udp').tolist() == [False, True, False] * 2
+
+        py.test.raises(UMPAAttributeException, store.__getitem__, 'ip')
+        py.test.raises(UMPAAttributeException, store.__getitem__, 'foo.bar')
+        py.test.raises(UMPAAttributeException, store.__getitem__, 'ip.xxx')
+        py.test.raises(UMPAAttributeException, store.__getitem__,
+                                                                'ip.options')
+        py.test.raises(UMPAAttributeException, store.offsets, 'foo')
+
+    def test_bits(self):
+        store = _columns.PacketColumns(DLT_EN10MB)
+        store.append(0, Packet(Ethernet(), IP(src="1.2.3.4", dst="5.6.7.8",
+                                flags=['df'], tos=0x10),
+                                TCP(srcport=20, flags=0x12),
+                                Payload("xx")).get_raw())
+        assert store['ip._version'].tolist() == [4]
+        assert store['ip.flags'].tolist() == [2]
+        assert store['ip._frag_offset'].tolist() == [0]
+        assert store['ip.tos'].tolist() == [0x10]
+        assert store['tcp.flags'].tolist() == [0x12]
+        assert store['tcp._hdr_len'].tolist() == [5]
+
+        # truncated headers are skipped
+        store.append(1, store.raw(0)[:40])
+        assert store['tcp.srcport'].tolist() == [20, 0]
+
+        src = "0000:0000:0000:0000:0000:0000:0000:0001"
+        store.append(2, Packet(Ethernet(), IPV6(src=src, dst=src)).get_raw())
+        assert store['ipv6.src'][2] == store.encode('ipv6.src', src)
+        assert store['ipv6.src'][0] == ''
+
+    def test_encode(self):
+        store = self.store
+        assert store.encode('ip.src', "1.2.3.4") == 0x01020304
+        assert store.encode('Ethernet.dst', "66:77:88:99:aa:bb") == \
+                                                            0x66778899aabb
+        assert store.encode('tcp.dstport', 80) == 80
+        assert store.encode('ipv6.src',
+                "0000:0000:0000:0000:0000:0000:0000:0001") == '\0' * 15 + '\1'
+
+    def test_where(self):
+        store = self.store
+        rows = store.where((store['tcp.dstport'] == 80) &
+                    (store['ip.src'] == store.encode('ip.src', "1.2.3.4")))
+        assert rows.tolist() == [0, 3]
+
+        packet = store.packet(rows[1])
+        assert packet.get_raw() == _frames()[0]
+        assert packet.tcp.dstport == 80
+        assert store.packet(1, lazy=True).udp.srcport == 53
+        assert store.raw(2) == _frames()[2]
+        assert store.payload(0) == "first"
+        assert store.payload(2) == ""
+
+        packets = list(store.packets(store.has('udp')))
+        assert [ ts for ts, packet in packets ] == [1001.5, 1004.5]
+        assert packets[0][1].udp.dstport == 53
+        assert len(list(store.packets())) == 6
+
+    def test_select(self):
+        store = self.store
+        tcp = store.select(store.has('tcp'))
+        assert len(tcp) == 4
+        assert tcp['tcp.srcport'].tolist() == [2000, 80] * 2
+        assert tcp['ts'].tolist() == [1000.5, 1002.5, 1003.5, 1005.5]
+        assert tcp.offsets('udp').tolist() == [-1] * 4
+        assert tcp.raw(1) == _frames()[2]
+
+        last = store.select([5])
+        assert last.raw(0) == _frames()[2]
+
+        empty = store.select([])
+        assert len(empty) == 0
+        assert empty['ip.src'].tolist() == []
+
+    def test_append(self):
+        store = self.store
+        ports = store['tcp.srcport']
+        store.append(2000, _frames()[0])
+        # columns hold copies
+        assert ports.tolist() == [2000, 0, 80] * 2
+        assert store['tcp.srcport'].tolist() == [2000, 0, 80] * 2 + [2000]
+        assert store.nbytes > sum([ len(frame) for frame in _frames() ]) * 2
+
+    def test_no_numpy(self):
+        numpy = _columns.numpy
+        _columns.numpy = None
+        try:
+            py.test.raises(UMPAException, _columns.PacketColumns, DLT_EN10MB)
+        finally:
+            _columns.numpy = numpy
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2009 Adriano Monteiro Marques.
+#
+# Author: Bartosz SKOWRON <getxsick at gmail dot com>
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation; either version 2.1 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+
+
+import ctypes.util
+
+import py.test
+
+from umit.umpa import Packet
+from umit.umpa.protocols import Ethernet, IP, TCP, UDP, Payload
+from umit.umpa.sniffing.libpcap._bpf import compile_filter, run_filter
+
+# udp and src port 1234 (tcpdump -dd)
+UDP_FILTER = [ (0x28, 0, 0, 12), (0x15, 0, 5, 0x800), (0x30, 0, 0, 23),
+               (0x15, 0, 3, 17), (0x28, 0, 0, 34), (0x15, 0, 1, 1234),
+               (0x6, 0, 0, 65535), (0x6, 0, 0, 0) ]
+
+# tcp dst port 80 (IP options are skipped with ldxb 4*([14]&0xf))
+PORT_FILTER = [ (0x28, 0, 0, 12), (0x15, 0, 6, 0x800), (0x30, 0, 0, 23),
+                (0x15, 0, 4, 6), (0xb1, 0, 0, 14), (0x48, 0, 0, 16),
+                (0x15, 0, 1, 80), (0x6, 0, 0, 96), (0x6, 0, 0, 0) ]
+
+def _frame(proto, srcport, dstport):
+    return Packet(Ethernet(src='00:11:22:33:44:55', dst='66:77:88:99:aa:bb'),
+                  IP(src="1.2.3.4", dst="5.6.7.8"),
+                  proto(srcport=srcport, dstport=dstport),
+                  Payload("x" * 100)).get_raw()
+
+class TestBPF(object):
+    def test_run_filter(self):
+        udp = _frame(UDP, 1234, 53)
+        assert run_filter(UDP_FILTER, udp) == 65535
+        assert run_filter(UDP_FILTER, _frame(UDP, 1235, 53)) == 0
+        assert run_filter(UDP_FILTER, _frame(TCP, 1234, 53)) == 0
+        assert run_filter(UDP_FILTER, buffer(udp)) == 65535
+
+        assert run_filter(PORT_FILTER, _frame(TCP, 2000, 80)) == 96
+        assert run_filter(PORT_FILTER, _frame(TCP, 80, 2000)) == 0
+
+        # out of bounds loads drop the packet
+        assert run_filter(UDP_FILTER, udp[:30]) == 0
+
+    def test_alu(self):
+        # A = len * 2 - 1; X = A; A = M[0] = X | 0x100; return A
+        insns = [ (0x80, 0, 0, 0), (0x24, 0, 0, 2), (0x14, 0, 0, 1),
+                  (0x07, 0, 0, 0), (0x87, 0, 0, 0), (0x44, 0, 0, 0x100),
+                  (0x02, 0, 0, 0), (0x60, 0, 0, 0), (0x16, 0, 0, 0) ]
+        assert run_filter(insns, "abc") == 0x105
+        assert run_filter(insns, "abc", 10) == 0x113
+
+        # division by zero drops the packet
+        assert run_filter([ (0x34, 0, 0, 0), (0x6, 0, 0, 1) ], "a") == 0
+
+    def test_compile_filter(self):
+        if ctypes.util.find_library('pcap') is None:
+            py.test.skip("libpcap library is not installed")
+        assert run_filter(compile_filter("udp and src port 1234"),
+                          _frame(UDP, 1234, 53)) > 0
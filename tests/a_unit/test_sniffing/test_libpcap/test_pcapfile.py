@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2009 Adriano Monteiro Marques.
+#
+# Author: Bartosz SKOWRON <getxsick at gmail dot com>
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation; either version 2.1 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+
+
+import os
+import struct
+import tempfile
+
+import py.test
+
+from umit.umpa import Packet
+from umit.umpa.protocols import Ethernet, IP, TCP, UDP, Payload
+from umit.umpa.protocols._consts import DLT_EN10MB, DLT_RAW
+from umit.umpa.sniffing.libpcap import pcapfile
+from umit.umpa.utils.exceptions import UMPASniffingException
+
+# tcp (tcpdump -dd)
+TCP_FILTER = [ (0x28, 0, 0, 12), (0x15, 0, 3, 0x800), (0x30, 0, 0, 23),
+               (0x15, 0, 1, 6), (0x6, 0, 0, 65535), (0x6, 0, 0, 0) ]
+
+def _frames():
+    ether = dict(src='00:11:22:33:44:55', dst='66:77:88:99:aa:bb')
+    return [ Packet(Ethernet(**ether), IP(src="1.2.3.4", dst="5.6.7.8"),
+                    TCP(srcport=2000, dstport=80), Payload("first")).get_raw(),
+             Packet(Ethernet(**ether), IP(src="1.2.3.4", dst="5.6.7.8"),
+                    UDP(srcport=53, dstport=53), Payload("2nd")).get_raw(),
+             Packet(Ethernet(**ether), IP(src="5.6.7.8", dst="1.2.3.4"),
+                    TCP(srcport=80, dstport=2000)).get_raw() ]
+
+def _write(data):
+    f = tempfile.NamedTemporaryFile()
+    f.write(data)
+    f.flush()
+    return f
+
+def _pcap(frames, order='<', nsec=False, linktype=DLT_EN10MB):
+    if nsec:
+        magic = pcapfile.PCAP_NSEC_MAGIC
+    else:
+        magic = pcapfile.PCAP_MAGIC
+    data = struct.pack(order + 'IHHiIII', magic, 2, 4, 0, 0, 65535, linktype)
+    for i, frame in enumerate(frames):
+        data += struct.pack(order + 'IIII', 1000 + i, 500, len(frame),
+                                                    len(frame)) + frame
+    return data
+
+def _block(order, block_type, body):
+    body += '\0' * (-len(body) % 4)
+    length = len(body) + 12
+    return struct.pack(order + 'II', block_type, length) + body + \
+                                            struct.pack(order + 'I', length)
+
+def _pcapng_section(frames, order, tsresol=None):
+    data = _block(order, pcapfile.PCAPNG_SHB,
+                    struct.pack(order + 'IHHq', pcapfile.PCAPNG_BYTE_ORDER_MAGIC,
+                                1, 0, -1))
+    options = ''
+    if tsresol is not None:
+        options = struct.pack(order + 'HHB3x', pcapfile.IF_TSRESOL, 1,
+                              tsresol) + struct.pack(order + 'HH', 0, 0)
+    data += _block(order, pcapfile.PCAPNG_IDB,
+                    struct.pack(order + 'HHI', DLT_EN10MB, 0, 0) + options)
+    # unknown blocks are skipped
+    data += _block(order, 0x0bad, "foo")
+    for i, frame in enumerate(frames[:-1]):
+        data += _block(order, pcapfile.PCAPNG_EPB,
+                    struct.pack(order + 'IIIII', 0, 0, 1000 + i, len(frame),
+                                                    len(frame)) + frame)
+    data += _block(order, pcapfile.PCAPNG_SPB,
+                    struct.pack(order + 'I', len(frames[-1])) + frames[-1])
+    return data
+
+class TestPcapFile(object):
+    def _check(self, data, linktype=DLT_EN10MB):
+        frames = _frames()
+        f = _write(data)
+        reader = pcapfile.open_pcap(f.name)
+        assert reader.datalink() == linktype
+        result = list(reader)
+        assert [ str(packet) for ts, packet in result ] == frames
+        reader.close()
+        return [ ts for ts, packet in result ]
+
+    def test_pcap(self):
+        for order in ('<', '>'):
+            ts = self._check(_pcap(_frames(), order))
+            assert ts == [1000.0005, 1001.0005, 1002.0005]
+            ts = self._check(_pcap(_frames(), order, nsec=True))
+            assert ts == [1000.0000005, 1001.0000005, 1002.0000005]
+        self._check(_pcap(_frames(), linktype=DLT_RAW), DLT_RAW)
+
+    def test_pcapng(self):
+        for order in ('<', '>'):
+            ts = self._check(_pcapng_section(_frames(), order))
+            assert ts == [0.001, 0.001001, 0]
+            ts = self._check(_pcapng_section(_frames(), order, 3))
+            assert ts == [1, 1.001, 0]
+            ts = self._check(_pcapng_section(_frames(), order, 0x80 | 10))
+            assert ts == [1000 / 1024.0, 1001 / 1024.0, 0]
+
+        # sections in different byte orders
+        f = _write(_pcapng_section(_frames(), '<') +
+                   _pcapng_section(_frames(), '>'))
+        reader = pcapfile.open_pcap(f.name)
+        assert [ str(p) for ts, p in reader ] == _frames() * 2
+
+    def test_zero_copy(self):
+        f = _write(_pcap(_frames()))
+        reader = pcapfile.open_pcap(f.name)
+        ts, packet = reader.next()
+        assert isinstance(packet, buffer)
+        reader.close()
+        py.test.raises(TypeError, str, packet)
+
+    def test_filter(self):
+        for data in (_pcap(_frames()), _pcapng_section(_frames(), '>')):
+            f = _write(data)
+            reader = pcapfile.open_pcap(f.name)
+            reader.setfilter(TCP_FILTER)
+            result = [ str(p) for ts, p in reader ]
+            assert result == [ _frames()[0], _frames()[2] ]
+
+    def test_dispatch(self):
+        def cbk(ts, packet, result):
+            result.append(str(packet))
+
+        f = _write(_pcap(_frames()))
+        reader = pcapfile.open_pcap(f.name)
+        result = []
+        assert reader.dispatch(2, cbk, result) == 2
+        assert reader.loop(-1, cbk, result) == 1
+        assert result == _frames()
+
+    def test_split(self):
+        frames = _frames() * 10
+        for data in (_pcap(frames, '>'), _pcapng_section(frames, '<') +
+                                    _pcapng_section(frames[:5], '>', 6)):
+            f = _write(data)
+            reader = pcapfile.open_pcap(f.name)
+            expected = [ (ts, str(packet)) for ts, packet in reader ]
+            reader.close()
+
+            for parts in (1, 3, 7, 100):
+                reader = pcapfile.open_pcap(f.name)
+                chunks = reader.split(parts)
+                assert 0 < len(chunks) <= parts
+                # the reader is not moved
+                assert len(list(reader)) == len(expected)
+
+                result = []
+                for chunk in chunks:
+                    # chunks are read by new readers as in other processes
+                    reader = pcapfile.open_pcap(f.name)
+                    reader.seek(chunk)
+                    result.extend([ (ts, str(packet))
+                                            for ts, packet in reader ])
+                    reader.close()
+                assert result == expected
+
+    def test_errors(self):
+        for data in ("", "foo", "\0" * 100, _pcap(_frames())[:-1],
+                     _pcapng_section(_frames(), '<')[:-1]):
+            f = _write(data)
+            try:
+                reader = pcapfile.open_pcap(f.name)
+            except UMPASniffingException:
+                continue
+            py.test.raises(UMPASniffingException, list, reader)
+        py.test.raises(UMPASniffingException, pcapfile.open_pcap,
+                                                        "/non/existing/file")
+        py.test.raises(UMPASniffingException, pcapfile.open_pcap)
+
+class TestPcapWriter(object):
+    def _read(self, filename):
+        reader = pcapfile.open_pcap(filename)
+        result = [ (ts, str(packet)) for ts, packet in reader ]
+        linktype = reader.datalink()
+        reader.close()
+        return linktype, result
+
+    def test_write(self):
+        frames = _frames()
+        for format in ('pcap', 'pcapng'):
+            for nsec in (False, True):
+                f = tempfile.NamedTemporaryFile()
+                writer = pcapfile.PcapWriter(f.name, format=format, nsec=nsec)
+                writer.write(frames[0], 1000.5)
+                writer.write((1001.25, buffer(frames[1])))
+                writer.write_many([ (1002.000001, frames[2]) ])
+                writer.close()
+                linktype, result = self._read(f.name)
+                assert linktype == DLT_EN10MB
+                assert result == [ (1000.5, frames[0]), (1001.25, frames[1]),
+                                   (1002.000001, frames[2]) ]
+
+    def test_write_packets(self):
+        packets = [ Packet(IP(src="1.2.3.4"), UDP(srcport=53)),
+                    Packet(IP(src="1.2.3.4"), TCP(srcport=80)) ]
+        f = tempfile.NamedTemporaryFile()
+        writer = pcapfile.PcapWriter(f.name)
+        for packet in packets:
+            writer.write(packet)
+        # only IP packets can be written to the file
+        py.test.raises(UMPASniffingException, writer.write,
+                       Packet(Ethernet(), IP()))
+        writer.close()
+
+        linktype, result = self._read(f.name)
+        assert linktype == DLT_RAW
+        # TCP sequence numbers are random, so compare IP headers
+        assert [ raw[:20] for ts, raw in result ] == \
+                                    [ p.get_raw()[:20] for p in packets ]
+        assert result[0][0] > 0
+        py.test.raises(UMPASniffingException, writer.write, packets[0])
+
+    def test_buffer(self):
+        f = tempfile.NamedTemporaryFile()
+        writer = pcapfile.PcapWriter(f.name, DLT_EN10MB, buffer_size=1000)
+        writer.write("x" * 100)
+        assert os.path.getsize(f.name) == 0
+        writer.write("x" * 1000)
+        assert os.path.getsize(f.name) == 24 + 2 * 16 + 1100
+
+        writer.write("x" * 10)
+        writer.flush()
+        assert os.path.getsize(f.name) == 24 + 3 * 16 + 1110
+        writer.close()
+
+        # truncated by snaplen
+        f = tempfile.NamedTemporaryFile()
+        writer = pcapfile.PcapWriter(f.name, DLT_EN10MB, snaplen=10)
+        writer.write("x" * 100)
+        writer.close()
+        assert self._read(f.name)[1][0][1] == "x" * 10
+
+    def test_rotate(self):
+        f = tempfile.NamedTemporaryFile()
+        writer = pcapfile.PcapWriter(f.name, DLT_EN10MB,
+                                     rotate_size=24 + 2 * (16 + 100))
+        for i in xrange(5):
+            writer.write(chr(i) * 100, i)
+        writer.close()
+        try:
+            assert writer.filenames == [ f.name, f.name + ".1",
+                                         f.name + ".2" ]
+            result = []
+            for filename in writer.filenames:
+                result.extend(self._read(filename)[1])
+            assert result == [ (i, chr(i) * 100) for i in xrange(5) ]
+        finally:
+            for filename in writer.filenames[1:]:
+                os.remove(filename)
+
+        f = tempfile.NamedTemporaryFile()
+        writer = pcapfile.PcapWriter(f.name, DLT_EN10MB, rotate_interval=0)
+        writer.write("foo")
+        writer.write("bar")
+        writer.close()
+        os.remove(writer.filenames[1])
+        assert len(writer.filenames) == 2
+
+    def test_errors(self):
+        py.test.raises(UMPASniffingException, pcapfile.PcapWriter, "foo",
+                                                        format="foo")
+        py.test.raises(UMPASniffingException, pcapfile.PcapWriter,
+                                        "/non/existing/file", DLT_EN10MB)
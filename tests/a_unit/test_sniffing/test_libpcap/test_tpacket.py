@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2009 Adriano Monteiro Marques.
+#
+# Author: Bartosz SKOWRON <getxsick at gmail dot com>
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation; either version 2.1 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+
+
+import ctypes.util
+import os
+import sys
+import threading
+import time
+
+import py.test
+
+from umit.umpa import Packet, SocketL2
+from umit.umpa.protocols import Ethernet, IP, UDP, Payload
+from umit.umpa.protocols._consts import DLT_EN10MB, DLT_LINUX_SLL
+from umit.umpa.protocols._decoder import decode
+from umit.umpa.utils.exceptions import UMPASniffingException
+
+from umit.umpa.sniffing.libpcap import tpacket
+
+# udp and src port 1234 (tcpdump -dd)
+FILTER = [ (0x28, 0, 0, 12), (0x15, 0, 5, 0x800), (0x30, 0, 0, 23),
+           (0x15, 0, 3, 17), (0x28, 0, 0, 34), (0x15, 0, 1, 1234),
+           (0x6, 0, 0, 65535), (0x6, 0, 0, 0) ]
+
+def _frame(i):
+    return Packet(Ethernet(src='00:11:22:33:44:55', dst='00:11:22:33:44:55'),
+                  IP(src="127.0.0.1", dst="127.0.0.1"),
+                  UDP(srcport=1234, dstport=4321),
+                  Payload('x' * i))
+
+class _Send(threading.Thread):
+    def __init__(self, packets):
+        super(_Send, self).__init__()
+        self._packets = packets
+    def run(self):
+        time.sleep(0.5)
+        SocketL2(iface='lo').send(*self._packets)
+
+class TestTpacket(object):
+    def setup_method(self, method):
+        if not sys.platform.startswith('linux'):
+            py.test.skip('PACKET_MMAP is available under Linux only')
+        if os.geteuid() != 0:
+            py.test.skip('root-privileges are needed')
+
+    def test_findalldevs(self):
+        devices = tpacket.findalldevs()
+        assert 'lo' in devices
+        assert 'any' in devices
+        assert tpacket.lookupdev() not in ('lo', 'any')
+
+    def test_next_block(self):
+        p = tpacket.open_pcap('lo', to_ms=50)
+        assert p.datalink() == DLT_EN10MB
+        p.setfilter(FILTER)
+
+        packets = [ _frame(i) for i in xrange(1, 11) ]
+        th = _Send(packets)
+        th.start()
+        frames = []
+        # every frame is seen twice on the loopback (outgoing and incoming)
+        while len(frames) < 2 * len(packets):
+            frames.extend(p.next_block(2000))
+        th.join()
+
+        raws = [ str(frame) for ts, frame in frames ]
+        assert raws[::2] == [ packet.get_raw() for packet in packets ]
+        assert frames[0][0] > 0
+        p.close()
+
+    def test_next_and_loop(self):
+        p = tpacket.open_pcap('lo', to_ms=50)
+        p.setfilter(FILTER)
+
+        th = _Send([ _frame(1), _frame(2) ])
+        th.start()
+        ts, raw = p.next()
+        assert isinstance(raw, str)
+        assert decode(raw, p.datalink()).udp.srcport == 1234
+
+        result = []
+        def cbk(ts, frame, *args):
+            result.append((args, len(frame)))
+        assert p.loop(3, cbk, "foobar") == 3
+        th.join()
+        assert result == [ (("foobar",), 43), (("foobar",), 44),
+                           (("foobar",), 44) ]
+        p.close()
+
+    def test_any(self):
+        p = tpacket.open_pcap('any', to_ms=50)
+        assert p.datalink() == DLT_LINUX_SLL
+        p.setfilter(FILTER)
+
+        th = _Send([ _frame(3) ])
+        th.start()
+        packet = decode(p.next()[1], p.datalink())
+        th.join()
+        assert packet.sll._etype == 0x800
+        assert packet.udp.srcport == 1234
+        assert packet.payload.data == 'xxx'
+        p.close()
+
+    def test_compile_filter(self):
+        if ctypes.util.find_library('pcap') is None:
+            py.test.raises(UMPASniffingException, tpacket.compile_filter,
+                                                                "udp")
+        else:
+            insns = tpacket.compile_filter("udp and src port 1234")
+            assert len(insns[0]) == 4
+            assert insns[-1][0] == 0x6
+
+    def test_offline(self):
+        py.test.raises(UMPASniffingException, tpacket.open_pcap, __file__)
@@ -27,9 +27,16 @@ from umit.umpa.protocols import IP, TCP
 from umit.umpa.protocols._decoder import decode
 from umit.umpa.utils.exceptions import UMPASniffingException
 from tests.utils import SendPacket
+from tests.a_unit.test_sniffing.test_libpcap.test_pcapfile import _frames, \
+                                    _pcap, _pcapng_section, _write
 
 import py.test
 
+def _tcp_source(ts, packet):
+    if 'TCP' in [ proto.name for proto in packet.protos ]:
+        return packet.ip.src, packet.tcp.srcport
+    return None
+
 class TestSniffing(object):
     def test_import_backend(self):
         assert hasattr(umit.umpa.sniffing, 'lpcap')
@@ -184,3 +191,162 @@ class TestSniffing(object):
         for packet in result:
             assert packet.ip.src == "1.2.3.4"
             assert packet.tcp.srcport == 99
+
+    def test_iter_file(self):
+        dump_file = tempfile.NamedTemporaryFile(mode="w")
+        th = SendPacket(umit.umpa.Packet(IP(src="1.2.3.6"),
+                                    TCP(srcport=99)), 3)
+        th.start()
+        umit.umpa.sniffing.sniff(3, device="any", dump=dump_file.name,
+                            filter="src host 1.2.3.6 and src port 99")
+        th.join()
+
+        result = list(umit.umpa.sniffing.iter_file(dump_file.name))
+        assert len(result) == 3
+        for ts, packet in result:
+            assert ts > 0
+            assert packet.ip.src == "1.2.3.6"
+            assert packet.tcp.srcport == 99
+
+        for mode in ('full', 'raw'):
+            result = list(umit.umpa.sniffing.iter_file(dump_file.name,
+                                                        decode=mode))
+            assert len(result) == 3
+        assert isinstance(result[0][1], str)
+
+        # early termination
+        for i, (ts, packet) in enumerate(
+                            umit.umpa.sniffing.iter_file(dump_file.name)):
+            break
+        assert i == 0
+
+        py.test.raises(UMPASniffingException, umit.umpa.sniffing.iter_file,
+                                            dump_file.name, decode="foo")
+        py.test.raises(UMPASniffingException, umit.umpa.sniffing.iter_file,
+                                            dump_file.name + "foo")
+
+    def test_from_file_native(self):
+        # pcapng files are read without the libpcap's wrapper
+        for data in (_pcap(_frames()), _pcapng_section(_frames(), '>')):
+            dump_file = _write(data)
+            result = umit.umpa.sniffing.from_file(dump_file.name)
+            assert [ p.get_raw() for p in result ] == _frames()
+            assert result[1].udp.srcport == 53
+
+            result = list(umit.umpa.sniffing.iter_file(dump_file.name))
+            assert len(result) == 3
+            assert result[0][1].ip.dst == "5.6.7.8"
+            assert result[2][1].tcp.srcport == 80
+
+    def test_map_file(self):
+        frames = _frames() * 20
+        for data in (_pcap(frames), _pcapng_section(frames, '<')):
+            dump_file = _write(data)
+            result = umit.umpa.sniffing.map_file(dump_file.name, _tcp_source,
+                                                        processes=2)
+            serial = [ (ts, _tcp_source(ts, packet)) for ts, packet
+                            in umit.umpa.sniffing.iter_file(dump_file.name) ]
+            # Simple Packet Blocks of pcapng have no timestamps
+            serial.sort(key=lambda item: item[0])
+            assert result == [ item for item in serial if item[1] ]
+            assert len(result) == 40
+            assert ("1.2.3.4", 2000) in [ source for ts, source in result ]
+
+        # packets are merged in the order of timestamps
+        dump_file = _write(_pcap(list(reversed(frames))))
+        result = umit.umpa.sniffing.map_file(dump_file.name, _tcp_source,
+                                                        processes=2)
+        timestamps = [ ts for ts, source in result ]
+        assert len(timestamps) == 40
+        assert timestamps == sorted(timestamps)
+
+        py.test.raises(UMPASniffingException, umit.umpa.sniffing.map_file,
+                                dump_file.name, _tcp_source, decode="foo")
+        py.test.raises(UMPASniffingException, umit.umpa.sniffing.map_file,
+                                dump_file.name + "foo", _tcp_source)
+
+    def test_file_stats(self):
+        frames = _frames() * 20
+        dump_file = _write(_pcap(frames))
+        parts = list(umit.umpa.sniffing.iter_file_stats(dump_file.name,
+                                                        processes=2))
+        assert len(parts) > 1
+        assert sum([ part.packets for part in parts ]) == 60
+
+        stats = umit.umpa.sniffing.file_stats(dump_file.name, processes=2)
+        assert stats.packets == 60
+        assert stats.bytes == sum([ len(frame) for frame in frames ])
+        assert stats.start == 1000.0005
+        assert stats.end == 1059.0005
+        assert stats.protocols == {'Ethernet': 60, 'IP': 60, 'TCP': 40,
+                                   'UDP': 20, 'Payload': 40}
+        sizes = [ len(frame) for frame in _frames() ]
+        assert stats.top_talkers() == [
+                    (("1.2.3.4", "5.6.7.8"), 20 * (sizes[0] + sizes[1])),
+                    (("5.6.7.8", "1.2.3.4"), 20 * sizes[2]) ]
+        assert stats.top_talkers(1) == stats.top_talkers()[:1]
+
+    def test_file_columns(self):
+        if umit.umpa.sniffing._columns.numpy is None:
+            py.test.skip("NumPy is not installed")
+
+        frames = _frames() * 20
+        dump_file = _write(_pcapng_section(frames, '<'))
+        store = umit.umpa.sniffing.file_columns(dump_file.name)
+        assert len(store) == 60
+        assert store['tcp.srcport'].tolist() == [2000, 0, 80] * 20
+        assert store.has('udp').sum() == 20
+        assert store.packet(2).get_raw() == frames[2]
+
+        store = umit.umpa.sniffing.file_columns(dump_file.name, count=4)
+        assert store['ip._proto'].tolist() == [6, 17, 6, 6]
+
+        py.test.raises(UMPASniffingException, umit.umpa.sniffing.file_columns,
+                                            dump_file.name + "foo")
+
+    def test_iter_live(self):
+        th = SendPacket(umit.umpa.Packet(IP(src="1.2.3.6"),
+                                    TCP(srcport=99)), 2)
+        th.start()
+        result = list(umit.umpa.sniffing.iter_live(2, "src port 99", 'any'))
+        th.join()
+
+        assert len(result) == 2
+        for ts, packet in result:
+            assert packet.ip.src == "1.2.3.6"
+            assert packet.tcp.srcport == 99
+
+    def test_iter_session_count(self):
+        class FakeSession(object):
+            closed = False
+            def setfilter(self, filter):
+                pass
+            def datalink(self):
+                return 1
+            def __iter__(self):
+                yield 1.0, "a"
+                yield 2.0, "b"
+                raise AssertionError("too many packets read")
+            def close(self):
+                self.closed = True
+
+        session = FakeSession()
+        result = list(umit.umpa.sniffing._iter_session(lambda: session, 2,
+                                                            None, 'raw'))
+        assert result == [(1.0, "a"), (2.0, "b")]
+        assert session.closed
+
+        session = FakeSession()
+        result = list(umit.umpa.sniffing._iter_session(lambda: session, 1,
+                                                            None, 'raw'))
+        assert result == [(1.0, "a")]
+        assert session.closed
+
+    def test_iter_session_lazy(self):
+        opened = []
+        def open_session():
+            opened.append(True)
+            raise AssertionError("the session shouldn't be opened")
+
+        umit.umpa.sniffing._iter_session(open_session, 0, None, 'raw')
+        assert opened == []
@@ -21,10 +21,13 @@
 # Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA 
 
 import os
+import socket
+import struct
 import py.test
 
 from umit.umpa import Socket, SocketL2, Packet
 import umit.umpa.sniffing
+from umit.umpa import _sockets
 from umit.umpa.protocols import Ethernet, IP, TCP, UDP, Payload ,IPV6 , TCP6
 from umit.umpa.utils.exceptions import UMPAException, UMPANotPermittedException
 from tests.utils import SendPacket, SendPacketL2
@@ -108,3 +111,235 @@ class TestUMPASockets(object):
         raw2 = umit.umpa._sockets._ntohs_quirk(raw1)
 
         assert raw2 == "ABDCEFHG"
+
+    def test_send_batches(self):
+        if os.name == 'posix' and os.geteuid() != 0:
+            py.test.skip('root-privileges are needed')
+
+        packets = [ Packet(IP(src="127.0.0.1", dst="127.0.0.1"),
+                           UDP(srcport=1234, dstport=4321),
+                           Payload('x' * i)) for i in xrange(1, 11) ]
+
+        s = umit.umpa._sockets.INET(batch_size=3)
+        assert s.send(*packets) == range(29, 39)
+
+        # the order of results is kept for mixed packets
+        p = Packet(Ethernet(src='00:11:22:33:44:55', dst='00:11:22:33:44:55'),
+                   IP(src="127.0.0.1", dst="127.0.0.1"),
+                   UDP(srcport=1234, dstport=4321),
+                   Payload('xyz'))
+        size = umit.umpa._sockets.send(packets[0], p, packets[1], iface='lo')
+        assert size == [29, 45, 30]
+
+    def test_send_many_error(self):
+        if os.name == 'posix' and os.geteuid() != 0:
+            py.test.skip('root-privileges are needed')
+        if umit.umpa._sockets._sendmmsg is None:
+            py.test.skip('sendmmsg() is not available')
+
+        # the third frame is too long, the first two are sent
+        raw = '\x00' * 60
+        s = SocketL2('lo')
+        try:
+            umit.umpa._sockets._send_many(s._sock,
+                            [raw, raw, '\x00' * 70000, raw], batch_size=2)
+        except socket.error, msg:
+            assert msg.sent_bytes == [60, 60]
+        else:
+            assert False, "socket.error expected"
+        s.close()
+
+    def test_sockaddr(self):
+        if umit.umpa._sockets._sendmmsg is None:
+            py.test.skip('sendmmsg() is not available')
+
+        addr = umit.umpa._sockets._sockaddr(socket.AF_INET, "1.2.3.4")
+        assert len(addr) == 16
+        assert addr[2:8] == "\x00\x00\x01\x02\x03\x04"
+        addr = umit.umpa._sockets._sockaddr(socket.AF_INET6, "::1")
+        assert len(addr) == 28
+        assert addr[8:24] == "\x00" * 15 + "\x01"
+
+    def test_close(self):
+        if os.name == 'posix' and os.geteuid() != 0:
+            py.test.skip('root-privileges are needed')
+
+        p = Packet(IP(src="127.0.0.1", dst="127.0.0.1"), UDP())
+        with Socket() as s:
+            assert s.send(p) == [28]
+        py.test.raises(socket.error, s.send, p)
+
+    def test_pool(self):
+        if os.name == 'posix' and os.geteuid() != 0:
+            py.test.skip('root-privileges are needed')
+
+        pool = umit.umpa._sockets._pool
+        pool.close()
+        p1 = Packet(IP(src="127.0.0.1", dst="127.0.0.1"), UDP())
+        p2 = Packet(Ethernet(src='00:11:22:33:44:55', dst='00:11:22:33:44:55'),
+                    IP(src="127.0.0.1", dst="127.0.0.1"), UDP())
+        umit.umpa._sockets.send(p1, p2, iface='lo')
+        sockets = pool._sockets.values()
+        assert len(sockets) == 2
+        umit.umpa._sockets.send(p1, p2, iface='lo')
+        assert pool._sockets.values() == sockets
+
+        size = umit.umpa.config['pool_size']
+        umit.umpa.config['pool_size'] = 1
+        try:
+            umit.umpa._sockets.send(p1)
+            assert pool._sockets.keys() == [(3, socket.AF_INET, None)]
+        finally:
+            umit.umpa.config['pool_size'] = size
+
+        umit.umpa._sockets.close_sockets()
+        assert len(pool._sockets) == 0
+        for sock in sockets:
+            py.test.raises(socket.error, sock.send, p1)
+
+    def test_send_raw_L3(self):
+        if os.name == 'posix' and os.geteuid() != 0:
+            py.test.skip('root-privileges are needed')
+
+        raw = Packet(IP(src="127.0.0.1", dst="127.0.0.1"),
+                     UDP(srcport=1234, dstport=4321),
+                     Payload('x')).get_raw()
+        s = Socket()
+        assert s.send_raw(raw, raw) == [len(raw), len(raw)]
+        s.close()
+
+    def test_pool_leases(self):
+        if os.name == 'posix' and os.geteuid() != 0:
+            py.test.skip('root-privileges are needed')
+
+        p1 = Packet(IP(src="127.0.0.1", dst="127.0.0.1"), UDP())
+        pool = umit.umpa._sockets._SocketPool()
+        size = umit.umpa.config['pool_size']
+        umit.umpa.config['pool_size'] = 1
+        try:
+            sock = pool.get(3, socket.AF_INET)
+            # the leased socket is evicted, but not closed
+            sock6 = pool.get(3, socket.AF_INET6)
+            assert pool._sockets.values() == [sock6]
+            sock.send(p1)
+            pool.release(sock)
+            py.test.raises(socket.error, sock.send, p1)
+
+            pool.release(sock6)
+            assert pool.get(3, socket.AF_INET6) is sock6
+            pool.close()
+            pool.release(sock6)
+            assert pool._leases == {}
+            assert pool._closing == set()
+        finally:
+            umit.umpa.config['pool_size'] = size
+            pool.close()
+
+    def test_send_tx_ring(self):
+        if os.name == 'posix' and os.geteuid() != 0:
+            py.test.skip('root-privileges are needed')
+        if umit.umpa._sockets._l2model != 'AF_PACKET':
+            py.test.skip('PACKET_TX_RING is not supported')
+
+        packets = [ Packet(Ethernet(src='00:11:22:33:44:55',
+                                    dst='00:11:22:33:44:55'),
+                           IP(src="127.0.0.1", dst="127.0.0.1"),
+                           UDP(srcport=1234, dstport=4321),
+                           Payload('x' * i)) for i in xrange(1, 21) ]
+
+        sniffer = socket.socket(socket.AF_PACKET, socket.SOCK_RAW,
+                                socket.htons(umit.umpa._sockets.ETH_P_ALL))
+        sniffer.bind(('lo', 0))
+        sniffer.settimeout(1)
+
+        # more packets than frames of the ring
+        s = SocketL2(iface='lo', tx_ring=8)
+        assert s._tx_ring.frame_nr == 8
+        assert s.send(*packets) == range(43, 63)
+        s.close()
+
+        raws = [ p.get_raw() for p in packets ]
+        received = []
+        while len(received) < len(raws):
+            raw = sniffer.recv(2048)
+            if raw in raws and raw not in received:
+                received.append(raw)
+        assert received == raws
+
+        s = SocketL2(iface='lo', tx_ring=8, frame_size=64)
+        py.test.raises(UMPAException, s.send, packets[-1])
+        s.close()
+        py.test.raises(UMPAException, SocketL2, iface='lo', tx_ring=8,
+                                                        frame_size=100)
+
+class FakeKernel(object):
+    """
+    Socket which "sends" frames of the ring like the kernel.
+    """
+
+    def __init__(self, ring, reject=0, error=False):
+        self.ring = ring
+        self.reject = reject
+        self.error = error
+        self.frames = []
+
+    def send(self, data):
+        if self.error:
+            raise socket.error(100, 'Network is down')
+        for index in xrange(self.ring.frame_nr):
+            offset = self.ring._frame(index)
+            if self.ring._status(offset) != _sockets.TP_STATUS_SEND_REQUEST:
+                continue
+            length = struct.unpack_from("I", self.ring._ring, offset + 4)[0]
+            if length == self.reject:
+                status = _sockets.TP_STATUS_WRONG_FORMAT
+            else:
+                status = _sockets.TP_STATUS_AVAILABLE
+                start = offset + _sockets.TPACKET2_HDRLEN
+                self.frames.append(str(self.ring._ring[start:start + length]))
+            struct.pack_into("I", self.ring._ring, offset, status)
+        return 0
+
+class TestTxRing(object):
+    def _ring(self, **kwargs):
+        ring = _sockets._TxRing.__new__(_sockets._TxRing)
+        ring.block_size = 256
+        ring.frame_size = 64
+        ring.frames_per_block = 4
+        ring.frame_nr = 4
+        ring._ring = bytearray(256)
+        ring._index = 0
+        ring._sock = FakeKernel(ring, **kwargs)
+        return ring
+
+    def _available(self, ring):
+        for index in xrange(ring.frame_nr):
+            if ring._status(ring._frame(index)) != \
+                                            _sockets.TP_STATUS_AVAILABLE:
+                return False
+        return True
+
+    def test_send(self):
+        ring = self._ring()
+        raws = [ 'x' * i for i in xrange(1, 11) ]
+        assert ring.send(raws) == range(1, 11)
+        assert ring._sock.frames == raws
+        assert self._available(ring)
+
+    def test_send_rejected(self):
+        ring = self._ring(reject=2)
+        py.test.raises(UMPAException, ring.send, ['a', 'bb', 'c'])
+        assert ring._sock.frames == ['a', 'c']
+        assert self._available(ring)
+
+        # slots of rejected frames are used again
+        ring._sock.reject = 0
+        assert ring.send([ 'x' * i for i in xrange(1, 7) ]) == range(1, 7)
+
+    def test_send_error(self):
+        ring = self._ring(error=True)
+        py.test.raises(socket.error, ring.send, ['a', 'b'])
+        assert self._available(ring)
+
+        ring._sock.error = False
+        assert ring.send(['a', 'b', 'c', 'd', 'e']) == [1] * 5
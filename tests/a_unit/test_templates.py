@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2009 Adriano Monteiro Marques.
+#
+# Author: Bartosz SKOWRON <getxsick at gmail dot com>
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation; either version 2.1 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+
+from umit.umpa import Packet
+from umit.umpa.protocols import IP, TCP, UDP, ICMP, Payload
+from umit.umpa._templates import PacketTemplate
+from umit.umpa.utils.exceptions import UMPAException, UMPAAttributeException
+
+import py.test
+
+def _tcp(dst="5.6.7.8", dstport=80, seq=1):
+    return Packet(IP(src="1.2.3.4", dst=dst),
+                  TCP(srcport=2000, dstport=dstport, _seq=seq, flags='syn'),
+                  Payload("UMPA"))
+
+class TestPacketTemplate(object):
+    def test_compile(self):
+        t = _tcp().compile('ip.dst', 'tcp.dstport')
+        assert isinstance(t, PacketTemplate)
+        assert t.get_raw() == _tcp().get_raw()
+        assert t.protos[0].layer == 3
+
+    def test_render(self):
+        t = _tcp().compile('ip.dst', 'tcp.dstport', seq='tcp._seq')
+        for dst, port, seq in (("10.0.0.1", 8080, 2), ("1.1.1.1", 1, 2**32-1),
+                               ("255.255.255.255", 0, 0)):
+            raw = t.render(dstport=port, seq=seq, **{'ip.dst' : dst})
+            assert raw == _tcp(dst, port, seq).get_raw()
+            assert t.get_raw() == raw
+            assert t._get_destination(3) == dst
+
+        # other fields keep last values
+        assert t.render(dst="4.4.4.4") == _tcp("4.4.4.4", 0, 0).get_raw()
+
+    def test_render_udp(self):
+        def packet(srcport):
+            return Packet(IP(), UDP(srcport=srcport, dstport=53),
+                          Payload("odd"))
+        t = packet(1).compile('udp.srcport')
+        for port in (2, 1000, 65535):
+            assert t.render(srcport=port) == packet(port).get_raw()
+
+    def test_render_icmp(self):
+        def packet(ident):
+            return Packet(IP(), ICMP(type='ECHO', ident=ident, seq=1),
+                                                                strict=False)
+        t = packet(1).compile('icmp.ident')
+        for ident in (0, 255, 4096, 65535):
+            assert t.render(ident=ident) == packet(ident).get_raw()
+
+    def test_user_checksum(self):
+        p = _tcp()
+        p.ip._checksum = 0x1234
+        t = p.compile('ip.dst', 'ip._checksum')
+        raw = t.render(dst="4.3.2.1")
+        assert raw[10:12] == "\x12\x34"
+        raw = t.render(_checksum=0x4321)
+        assert raw[10:12] == "\x43\x21"
+
+    def test_wrong_fields(self):
+        p = _tcp()
+        py.test.raises(UMPAAttributeException, p.compile, 'dst')
+        py.test.raises(UMPAAttributeException, p.compile, 'udp.dst')
+        py.test.raises(UMPAAttributeException, p.compile, 'ip.foo')
+
+        t = p.compile('ip.dst', 'payload.data')
+        py.test.raises(UMPAAttributeException, t.render, srcport=1)
+        py.test.raises(UMPAAttributeException, t.render, dst="1.2.3")
+        py.test.raises(UMPAException, t.render, data="longer")
+        assert t.render(data="ABCD")[-4:] == "ABCD"
@@ -49,3 +49,52 @@ class TestUtilBitsChunks(object):
         assert split_number_into_chunks(0xFFFF, 16, 2) == [0, 0xFFFF]
 
         py.test.raises(UMPAException, split_number_into_chunks, 0xF, 1, 1)
+
+class TestUtilBitsBytes(object):
+    def test_number_to_bytes(self):
+        assert number_to_bytes(0x0102, 2) == "\x01\x02"
+        assert number_to_bytes(0x0102, 4) == "\x00\x00\x01\x02"
+        assert number_to_bytes(0, 0) == ""
+        assert number_to_bytes(2**800, 101)[0] == "\x01"
+
+        py.test.raises(UMPAException, number_to_bytes, 0x010203, 2)
+        py.test.raises(UMPAException, number_to_bytes, 1, 0)
+
+    def test_bytes_to_number(self):
+        assert bytes_to_number("\x01\x02") == 0x0102
+        assert bytes_to_number(bytearray("\x00\x01\x02")) == 0x0102
+        assert bytes_to_number("") == 0
+
+class TestUtilBitsBuffer(object):
+    def test_pack_aligned(self):
+        buf = bytearray(8)
+        pack_bits(buf, 0, 16, 0x0102)
+        pack_bits(buf, 16, 8, 0x03)
+        pack_bits(buf, 24, 24, 0x040506)
+        pack_bits(buf, 48, 16, "\x07\x08")
+        assert buf == bytearray("\x01\x02\x03\x04\x05\x06\x07\x08")
+
+    def test_pack_unaligned(self):
+        buf = bytearray(4)
+        pack_bits(buf, 0, 4, 4)
+        pack_bits(buf, 4, 4, 5)
+        pack_bits(buf, 8, 3, 2)
+        pack_bits(buf, 11, 13, 0x1234)
+        pack_bits(buf, 24, 1, 1)
+        assert buf == bytearray("\x45\x52\x34\x80")
+
+        # overwrite keeps neighbours untouched
+        pack_bits(buf, 8, 3, 7)
+        assert buf == bytearray("\x45\xf2\x34\x80")
+        pack_bits(buf, 11, 13, 0)
+        assert buf == bytearray("\x45\xe0\x00\x80")
+
+    def test_unpack(self):
+        buf = bytearray("\x45\x52\x34\x80")
+        assert unpack_bits(buf, 0, 4) == 4
+        assert unpack_bits(buf, 4, 4) == 5
+        assert unpack_bits(buf, 8, 3) == 2
+        assert unpack_bits(buf, 11, 13) == 0x1234
+        assert unpack_bits(buf, 16, 16) == 0x3480
+        assert unpack_bits(str(buf), 0, 32) == 0x45523480
+        assert unpack_bits(buf, 0, 0) == 0
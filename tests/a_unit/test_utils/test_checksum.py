@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2009 Adriano Monteiro Marques.
+#
+# Author: Bartosz SKOWRON <getxsick at gmail dot com>
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation; either version 2.1 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+
+import struct
+
+from umit.umpa.utils.checksum import *
+
+class TestUtilChecksum(object):
+    def test_in_cksum(self):
+        for data, cksum in (
+                    ("\x01\x00\xf2\x03\xf4\xf5\xf6\xf7\x00\x00", 0x210E),
+                    ("\xe3\x4f\x23\x96\x44\x27\x99\xf3", 0x1aff),
+                    ("\x00\x00\x00\x01", 0xfffe),
+                    ):
+            assert in_cksum(data) == cksum
+            assert in_cksum(bytearray(data)) == cksum
+            assert in_cksum(data + struct.pack('!H', cksum)) == 0
+            assert in_cksum(data, cksum) == 0
+
+    def test_odd_length(self):
+        assert in_cksum("\x01") == 0xfeff
+        assert in_cksum("\x01\x02\x03") == in_cksum("\x01\x02\x03\x00")
+        assert in_cksum("") == 0xffff
+
+    def test_chunks(self):
+        data = "".join([ chr(i) for i in xrange(101) ])
+        cksum = in_cksum(data)
+        for i in xrange(len(data)):
+            assert in_cksum([data[:i], bytearray(data[i:])]) == cksum
+        assert in_cksum([data[:3], "", data[3:4], data[4:]]) == cksum
+        assert in_cksum(data[50:], cksum_add(data[:50])) == cksum
+
+    def test_update_cksum(self):
+        data = bytearray("\x45\x00\x00\x1c\x00\x00\x00\x00\x40\x01"
+                         "\x00\x00\x7f\x00\x00\x01\x7f\x00\x00\x01")
+        cksum = in_cksum(data)
+
+        # 16-bit word
+        new = update_cksum(cksum, 0x4001, 0x3f01)
+        data[8:10] = "\x3f\x01"
+        assert new == in_cksum(data)
+
+        # longer data
+        new = update_cksum(new, str(data[12:16]), "\x0a\x00\x00\x02")
+        data[12:16] = "\x0a\x00\x00\x02"
+        assert new == in_cksum(data)
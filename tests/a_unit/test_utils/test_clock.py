@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2009 Adriano Monteiro Marques.
+#
+# Author: Bartosz SKOWRON <getxsick at gmail dot com>
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation; either version 2.1 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+
+
+import threading
+import time
+
+from umit.umpa.utils.clock import *
+
+class TestUtilClock(object):
+    def test_monotonic(self):
+        t = monotonic()
+        time.sleep(0.01)
+        assert 0.01 <= monotonic() - t < 0.05
+
+    def test_monotonic_ns(self):
+        t = monotonic_ns()
+        assert isinstance(t, (int, long))
+        time.sleep(0.01)
+        assert 10000000 <= monotonic_ns() - t < 50000000
+        assert abs(monotonic_ns() / 1e9 - monotonic()) < 0.001
+
+    def test_wait_until(self):
+        for delay in (0.0005, 0.01):
+            t = monotonic()
+            wait_until(t + delay)
+            assert delay <= monotonic() - t < delay + 0.005
+        # past targets return immediately
+        t = monotonic()
+        wait_until(t - 1)
+        assert monotonic() - t < 0.001
+
+    def test_threads(self):
+        errors = []
+        def check():
+            last = monotonic_ns()
+            for i in xrange(20000):
+                now = monotonic_ns()
+                if now < last:
+                    errors.append((last, now))
+                last = now
+
+        threads = [ threading.Thread(target=check) for i in xrange(4) ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert errors == []
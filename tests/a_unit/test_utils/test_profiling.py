@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2009 Adriano Monteiro Marques.
+#
+# Author: Bartosz SKOWRON <getxsick at gmail dot com>
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation; either version 2.1 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+
+
+from __future__ import with_statement
+
+import py.test
+
+import umit.umpa
+import umit.umpa.sniffing
+from umit.umpa import Packet
+from umit.umpa.protocols import Ethernet, IP, TCP, Payload
+from umit.umpa.protocols._consts import DLT_EN10MB
+from umit.umpa.protocols._decoder import decode
+from umit.umpa.utils import profiling
+from tests.a_unit.test_sniffing.test_libpcap.test_pcapfile import _frames, \
+                                                            _pcap, _write
+
+def _packet():
+    return Packet(Ethernet(), IP(src="1.2.3.4", dst="5.6.7.8"),
+                  TCP(srcport=2000, dstport=80), Payload("UMPA"))
+
+class TestProfiling(object):
+    def teardown_method(self, method):
+        profiling.disable()
+        profiling.reset()
+
+    def test_enable(self):
+        get_raw = Packet.__dict__['get_raw']
+        post_raw = TCP.__dict__['_post_raw_buffer']
+        assert not profiling.is_enabled()
+
+        profiling.enable()
+        assert profiling.is_enabled()
+        assert Packet.__dict__['get_raw'] is not get_raw
+        assert TCP.__dict__['_post_raw_buffer'] is not post_raw
+        # inherited methods are not copied to subclasses
+        assert '_fillout_buffer' not in TCP.__dict__
+        profiling.enable()
+
+        profiling.disable()
+        assert not profiling.is_enabled()
+        assert Packet.__dict__['get_raw'] is get_raw
+        assert TCP.__dict__['_post_raw_buffer'] is post_raw
+        assert profiling.snapshot() == {}
+
+    def test_stages(self):
+        packet = _packet()
+        profiling.enable()
+        raw = packet.get_raw()
+        packet.get_raw()
+        decode(raw, DLT_EN10MB)
+        profiling.disable()
+        # not counted
+        packet.get_raw()
+
+        stats = profiling.snapshot()
+        assert stats[('Packet', 'get_raw')][0] == 2
+        for name in ('Ethernet', 'IP', 'TCP', 'Payload'):
+            for stage in ('build', 'pre_raw', 'fillout', 'post_raw'):
+                calls, elapsed = stats[(name, stage)]
+                # _post_raw_buffer() calls _post_raw() only once
+                assert calls == 2
+                assert elapsed > 0
+        assert stats[('Decoder', 'decode')][0] == 1
+        assert stats[('IP', 'load_raw')][0] == 1
+
+        total = stats[('Packet', 'get_raw')][1]
+        assert stats[('TCP', 'build')][1] < total
+        assert stats[('TCP', 'post_raw')][1] < stats[('TCP', 'build')][1]
+
+        assert 'Packet' in profiling.report()
+        profiling.reset()
+        assert profiling.snapshot() == {}
+
+    def test_profile(self):
+        packet = _packet()
+        profiling.enable()
+        packet.get_raw()
+        with profiling.profile() as prof:
+            packet.get_raw()
+        # enabled before the block
+        assert profiling.is_enabled()
+        assert prof.stats[('Packet', 'get_raw')][0] == 1
+        assert profiling.snapshot()[('Packet', 'get_raw')][0] == 2
+        profiling.disable()
+
+        with profiling.profile() as prof:
+            packet.get_raw()
+            packet.get_raw()
+        assert not profiling.is_enabled()
+        assert prof.stats[('Packet', 'get_raw')][0] == 2
+        assert prof.report().splitlines()[1].startswith('Packet')
+
+        def broken():
+            with profiling.profile():
+                raise ValueError
+        py.test.raises(ValueError, broken)
+        assert not profiling.is_enabled()
+
+    def test_sniffing(self):
+        dump_file = _write(_pcap(_frames()))
+        with profiling.profile() as prof:
+            for ts, packet in umit.umpa.sniffing.iter_file(dump_file.name):
+                pass
+            umit.umpa.sniffing.from_file(dump_file.name)
+        assert prof.stats[('sniffing', 'iter')][0] == 4
+        assert prof.stats[('sniffing', 'from_file')][0] == 1
+        assert prof.stats[('Decoder', 'decode')][0] == 6
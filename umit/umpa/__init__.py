@@ -41,6 +41,8 @@ import sys
 from umit.umpa._config import config
 from umit.umpa._packets import Packet
 from umit.umpa._sockets import Socket, SocketL2
+from umit.umpa._async import AsyncSocket
+from umit.umpa._parallel import build_parallel
 
 # UMPA handles with the local directory $HOME/.umpa
 # especially with the $HOME/.umpa/umpa_plugins
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2008-2009 Adriano Monteiro Marques.
+#
+# Author: Bartosz SKOWRON <getxsick at gmail dot com>
+#
+# This library is free software; you can redistribute it and/or modify 
+# it under the terms of the GNU Lesser General Public License as published 
+# by the Free Software Foundation; either version 2.1 of the License, or 
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but 
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public 
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License 
+# along with this library; if not, write to the Free Software Foundation, 
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA 
+
+
+"""
+Asynchronous sending of packets.
+
+Sockets are non-blocking and they are driven by asyncore's loop,
+so one thread can send through many sockets (and sniff with
+umit.umpa.sniffing.AsyncSession) at the same time.
+
+>>> sock = AsyncSocket(SocketL2('eth0'))
+>>> sock.send_many(packets, callback=sent)
+>>> asyncore.loop(use_poll=True)
+"""
+
+import asyncore
+import collections
+import itertools
+import socket
+from errno import EAGAIN
+
+from umit.umpa._config import config
+from umit.umpa.utils.exceptions import UMPAException
+
+class _Request(object):
+    """
+    Packets queued by one send_many() call.
+    """
+
+    def __init__(self, amount, callback):
+        self.amount = amount
+        self.callback = callback
+        self.sent_bytes = []
+
+    def add(self, sent_bytes):
+        """
+        Add a sent packet; call the callback if all packets are sent.
+        """
+
+        self.sent_bytes.append(sent_bytes)
+        if len(self.sent_bytes) == self.amount and self.callback is not None:
+            self.callback(self.sent_bytes)
+
+class AsyncSocket(asyncore.dispatcher):
+    """
+    Non-blocking socket registered in asyncore's loop.
+
+    Packets are queued by send_many() and sent in batches when the socket
+    is writable.
+    """
+
+    def __init__(self, sock, map=None, batch_size=None):
+        """
+        Create a new AsyncSocket().
+
+        @type sock: C{SocketL2} or C{SocketL3}
+        @param sock: UMPA's socket (SocketL2 without the transmit ring)
+
+        @type map: C{dict}
+        @param map: asyncore's map of channels (default: the global one)
+
+        @type batch_size: C{int}
+        @param batch_size: maximum number of packets sent at once
+                           (default: config['batch_size'])
+        """
+
+        if getattr(sock, '_tx_ring', None) is not None:
+            raise UMPAException("the transmit ring can't be used "
+                                "asynchronously")
+        if not isinstance(sock._sock, socket.socket):
+            raise NotImplementedError("asynchronous sending unsupported "
+                                      "on your platform")
+
+        asyncore.dispatcher.__init__(self, map=map)
+        self.umpa_socket = sock
+        if batch_size is None:
+            batch_size = config['batch_size']
+        self.batch_size = batch_size
+        self._queue = collections.deque()
+        # raw sockets don't need to be connected
+        sock._sock.setblocking(0)
+        self.set_socket(sock._sock, map)
+        self.connected = True
+
+    def send_many(self, packets, callback=None):
+        """
+        Queue packets for sending.
+
+        @type packets: C{list}
+        @param packets: packets for sending
+
+        @type callback: C{func}
+        @param callback: function called with the list of sent bytes
+                         when all packets are sent
+        """
+
+        packets = list(packets)
+        request = _Request(len(packets), callback)
+        if not packets and callback is not None:
+            callback([])
+        for packet in packets:
+            self._queue.append((packet, request))
+
+    def pending(self):
+        """
+        Return number of packets waiting for sending.
+
+        @rtype: C{int}
+        @return: number of packets.
+        """
+
+        return len(self._queue)
+
+    def readable(self):
+        return False
+
+    def writable(self):
+        return bool(self._queue)
+
+    def handle_write(self):
+        batch = [ packet for packet, request in
+                        itertools.islice(self._queue, self.batch_size) ]
+        try:
+            sent_bytes = self.umpa_socket.send(*batch)
+        except socket.error, msg:
+            # packets sent before the error aren't sent again
+            self._done(getattr(msg, 'sent_bytes', []))
+            if msg.args[0] == EAGAIN:
+                return
+            raise
+        self._done(sent_bytes)
+
+    def _done(self, sent_bytes):
+        """
+        Remove sent packets from the queue and report them.
+
+        @type sent_bytes: C{list}
+        @param sent_bytes: byte counts of sent packets.
+        """
+
+        for count in sent_bytes:
+            packet, request = self._queue.popleft()
+            request.add(count)
@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2008-2009 Adriano Monteiro Marques.
+#
+# Author: Bartosz SKOWRON <getxsick at gmail dot com>
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation; either version 2.1 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+
+"""
+Batch generation of packets with NumPy.
+
+Packets are generated from a template (see Packet.compile()) and arrays
+of values for its mutable fields. The result is a 2-dimensional array
+of bytes (uint8), one packet per row. Fields are written and checksums
+are calculated for all packets at once by NumPy operations.
+
+NumPy is an optional dependency. It's required by this module only.
+
+>>> template = Packet(IP(), TCP(srcport=2000)).compile('ip.dst', 'tcp.dstport')
+>>> batch = template.render_batch(dstport=numpy.arange(1, 1025),
+...                               **{'ip.dst' : "10.0.0.1"})
+>>> batch.shape
+(1024, 40)
+"""
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from umit.umpa.protocols._consts import BYTE
+from umit.umpa.utils.exceptions import UMPAException, UMPAAttributeException
+import umit.umpa.utils.bits as _bits
+
+# the longest field which can be stored in uint64
+_MAX_INT_BITS = 64
+
+def _convert(mutable, key, values):
+    """
+    Convert values of the field with the field's definition.
+
+    Values which are not numbers (e.g. addresses as strings) are validated
+    and converted by a copy of the original field (one by one).
+
+    @type mutable: C{_Mutable}
+    @param mutable: mutable field of the template.
+
+    @type key: C{str}
+    @param key: name of the field (for error messages).
+
+    @type values: C{numpy.ndarray}
+    @param values: 1-dimensional array of values.
+
+    @rtype: C{numpy.ndarray}
+    @return: raw values as uint64 array or uint8 array of bytes
+    (one row per value) for longer fields.
+    """
+
+    bits = mutable.bits
+    if values.dtype.kind in 'biu' and bits <= _MAX_INT_BITS:
+        if values.dtype.kind == 'i' and (values < 0).any():
+            raise UMPAAttributeException("negative value of " + key)
+        values = values.astype(numpy.uint64)
+        if bits < _MAX_INT_BITS and (values >> numpy.uint64(bits)).any():
+            raise UMPAAttributeException("value of %s exceeds %d bits"
+                                                            % (key, bits))
+        return values
+
+    raws = []
+    field = mutable.field
+    for value in values.tolist():
+        field.clear()
+        field.set(value)
+        raw = field.fillout_raw()
+        if field.bits != bits:
+            raise UMPAException("%s can't change the length (%d bits)"
+                                                            % (key, bits))
+        raws.append(raw)
+
+    if bits <= _MAX_INT_BITS:
+        for i, raw in enumerate(raws):
+            if isinstance(raw, str):
+                raws[i] = _bits.bytes_to_number(raw)
+        return numpy.array(raws, dtype=numpy.uint64)
+
+    if mutable.offset % BYTE or bits % BYTE:
+        raise UMPAException("%s is too long to be unaligned" % key)
+    length = bits / BYTE
+    chunks = [ isinstance(raw, str) and raw or
+                                _bits.number_to_bytes(raw, length)
+                                for raw in raws ]
+    return numpy.frombuffer(''.join(chunks),
+                            dtype=numpy.uint8).reshape(len(chunks), length)
+
+def _write(batch, offset, bits, values):
+    """
+    Write raw values of the field into every packet of the batch.
+
+    @type batch: C{numpy.ndarray}
+    @param batch: packets (one per row).
+
+    @type offset: C{int}
+    @param offset: offset of the field in bits.
+
+    @type bits: C{int}
+    @param bits: length of the field in bits.
+
+    @type values: C{numpy.ndarray}
+    @param values: values returned by _convert().
+    """
+
+    start = offset / BYTE
+    end = (offset + bits + BYTE - 1) / BYTE
+
+    if values.dtype == numpy.uint8:
+        batch[:, start:end] = values
+        return
+
+    shift = end * BYTE - offset - bits
+    if end - start > _MAX_INT_BITS / BYTE:
+        # unaligned and too long for a single number, so split it
+        low_bits = (end - start - 1) * BYTE - shift
+        _write(batch, offset + bits - low_bits, low_bits,
+                        values & numpy.uint64((1 << low_bits) - 1))
+        _write(batch, offset, bits - low_bits,
+                        values >> numpy.uint64(low_bits))
+        return
+
+    values = values << numpy.uint64(shift)
+    mask = ((1 << bits) - 1) << shift
+    for i in xrange(end - start):
+        byte_shift = (end - start - 1 - i) * BYTE
+        byte_mask = (mask >> byte_shift) & 0xff
+        byte = ((values >> numpy.uint64(byte_shift)) &
+                                        numpy.uint64(0xff)).astype(numpy.uint8)
+        if byte_mask == 0xff:
+            batch[:, start + i] = byte
+        else:
+            batch[:, start + i] &= ~byte_mask & 0xff
+            batch[:, start + i] |= byte
+
+def _sum(batch, regions):
+    """
+    Return one's complement sums of the regions for every packet.
+
+    @type batch: C{numpy.ndarray}
+    @param batch: packets (one per row).
+
+    @type regions: C{list}
+    @param regions: (start, end, base) regions of packets in bytes.
+
+    @rtype: C{numpy.ndarray}
+    @return: 16-bit sums (uint64).
+    """
+
+    total = numpy.zeros(batch.shape[0], dtype=numpy.uint64)
+    for start, end, base in regions:
+        data = batch[:, start:end].astype(numpy.uint64)
+        # odd length is padded with zero byte
+        total += (data[:, 0::2] << numpy.uint64(8)).sum(axis=1,
+                                                        dtype=numpy.uint64)
+        total += data[:, 1::2].sum(axis=1, dtype=numpy.uint64)
+    return _fold(total)
+
+def _fold(total):
+    """
+    Fold sums to 16 bits with end-around carry.
+
+    @type total: C{numpy.ndarray}
+    @param total: sums (uint64).
+
+    @rtype: C{numpy.ndarray}
+    @return: 16-bit sums (uint64).
+    """
+
+    mask = numpy.uint64(0xffff)
+    sixteen = numpy.uint64(16)
+    while (total >> sixteen).any():
+        total = (total & mask) + (total >> sixteen)
+    return total
+
+def render_batch(template, **changes):
+    """
+    Generate packets from the template and arrays of values.
+
+    Values may be NumPy arrays, sequences or single values (which are used
+    for every packet). All sequences have to be the same length.
+    Numbers are treated as raw values of fields, others are converted
+    by fields of the template (e.g. addresses as strings).
+
+    @type template: C{PacketTemplate}
+    @param template: template of packets (see Packet.compile()).
+
+    @param changes: key=values of fields to change (as for render()).
+
+    @rtype: C{numpy.ndarray}
+    @return: packets as uint8 array (one per row).
+    """
+
+    if numpy is None:
+        raise UMPAException("NumPy is required for batch generation")
+
+    # broadcast values to the same length
+    arrays = {}
+    amount = None
+    for key in changes:
+        if key not in template._keys:
+            raise UMPAAttributeException(key + ' is not a mutable field')
+        values = changes[key]
+        if isinstance(values, (str, unicode, tuple)) or \
+                                            numpy.ndim(values) == 0:
+            # a single value (addresses can be passed as tuples)
+            single = numpy.empty(1, dtype=object)
+            single[0] = values
+            values = single
+        else:
+            values = numpy.asarray(values)
+            if values.ndim != 1:
+                raise UMPAException("1-dimensional values expected for "
+                                                                    + key)
+            if amount is not None and len(values) != amount:
+                raise UMPAException("different lengths of values")
+            amount = len(values)
+        arrays[key] = values
+    if amount is None:
+        amount = 1
+
+    raw = numpy.frombuffer(str(template._raw), dtype=numpy.uint8)
+    batch = numpy.tile(raw, (amount, 1))
+
+    for key in arrays:
+        mutable = template._keys[key]
+        values = _convert(mutable, key, arrays[key])
+        if len(values) != amount:
+            # single value for every packet
+            values = numpy.repeat(values, amount, axis=0)
+        _write(batch, mutable.offset, mutable.bits, values)
+
+    # checksums are updated against the template (RFC 1624);
+    # upper protocols first because their checksums may be covered
+    # by checksums of lower ones
+    checksums = sorted(template._checksums, key=lambda cksum: cksum.offset,
+                                                                reverse=True)
+    template_batch = raw.reshape(1, len(raw))
+    for cksum in checksums:
+        old = int(_sum(template_batch, cksum.regions)[0])
+        new = _sum(batch, cksum.regions)
+        current = _bits.unpack_bits(template._raw, cksum.offset, 16)
+        total = (~current & 0xffff) + (~old & 0xffff)
+        value = ~_fold(new + numpy.uint64(total)) & numpy.uint64(0xffff)
+        _write(batch, cksum.offset, 16, value)
+
+    return batch
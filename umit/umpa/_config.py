@@ -39,6 +39,10 @@ except ImportError:
 
 config = {
     'libpcap' : libpcap,
+    # maximum number of packets sent by one system call (sendmmsg)
+    'batch_size' : 64,
+    # maximum number of sockets kept open by umit.umpa._sockets.send()
+    'pool_size' : 8,
 }
 
 del libpcap
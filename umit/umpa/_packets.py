@@ -26,10 +26,8 @@ Packet class is a protocol container.
 Use it to build a packet which contains several protocols.
 """
 
-import struct
 import warnings
 
-import umit.umpa.utils.bits
 from umit.umpa.utils.exceptions import UMPAException, UMPAStrictException
 
 BYTE = 8
@@ -102,16 +100,36 @@ class Packet(object):
         """
         Return the protocol with the name
 
+        Protocols are found by the index of lowercase names. The index
+        is built again if the list of protocols changes (it may be changed
+        directly, e.g. packet.protos.pop(0)).
+
         @type name: C{str}
         @param name: name of the protocol
         
         @return: protocol object
         """
 
-        for proto in self.protos:
-            if proto.name.lower() == name.lower():
-                return proto
-        raise AttributeError(name)
+        # look up in __dict__, otherwise missing attributes would call
+        # __getattr__ again (e.g. while unpickling)
+        attrs = self.__dict__
+        protos = attrs.get('protos')
+        if protos is None:
+            raise AttributeError(name)
+        index = attrs.get('_index')
+        if index is None or index[0] != tuple(protos):
+            names = {}
+            for proto in reversed(protos):
+                names[proto.name.lower()] = proto
+            index = (tuple(protos), names)
+            attrs['_index'] = index
+        try:
+            return index[1][name]
+        except KeyError:
+            try:
+                return index[1][name.lower()]
+            except KeyError:
+                raise AttributeError(name)
 
     def __str__(self):
         """
@@ -185,27 +203,58 @@ class Packet(object):
         """
         Return raw packet in the bit-mode (big-endian).
 
-        Call every protocols to get the raw bits of them,
+        Call every protocols to get the raw bytes of them,
         collect the results and return the raw packet.
 
-        @return: Struct packed bits of every protocols in big-endian order.
+        @return: raw bytes of every protocols in big-endian order.
         """
 
-        self.raw = 0
+        protos = tuple(self.protos)
+        headers = []
         self.bits = 0
-        for proto in reversed(self.protos):
+        for proto in reversed(protos):
             # unfortunately we must pass list of protocols to every protocol
             # because some fields handle with other protocols, so they need
             # an access to them
-            raw_proto, bit_proto = proto.get_raw(tuple(self.protos), self.bits)
-            self.raw |= raw_proto << self.bits
-            self.bits += bit_proto
-        # split into chunks
+            header = proto.get_raw_buffer(protos, self.bits)
+            headers.append(header)
+            self.bits += len(header) * BYTE
+
+        # copy headers into the preallocated buffer
         # we make it because we need string for socket object
-        # so after that we pack it by struct module.pack()
-        byte_chunks = umit.umpa.utils.bits.split_number_into_chunks(
-                                        self.raw, chunk_amount=self.bits/BYTE)
-        return struct.pack('!' + 'B'*(self.bits/BYTE), *byte_chunks)
+        raw = bytearray(self.bits / BYTE)
+        offset = len(raw)
+        for header in headers:
+            raw[offset-len(header):offset] = header
+            offset -= len(header)
+
+        self.raw = str(raw)
+        return self.raw
+
+    def compile(self, *fields, **aliases):
+        """
+        Return a template of the packet.
+
+        The packet is serialized once and only passed fields can be changed
+        later by render() method of the template. It's much faster than
+        building the whole packet again if only some fields differ.
+        Checksums are updated automatically.
+
+        @type fields: C{str}
+        @param fields: names of mutable fields as 'proto.field'
+        (e.g. 'ip.dst', 'tcp.dstport').
+
+        @type aliases: C{str}
+        @param aliases: alias='proto.field' for mutable fields.
+
+        @rtype: C{PacketTemplate}
+        @return: the template.
+        """
+
+        # imported here to avoid loading protocols with the umit.umpa package
+        from umit.umpa._templates import PacketTemplate
+
+        return PacketTemplate(self, fields, aliases)
 
     def _getwarn(self):
         """
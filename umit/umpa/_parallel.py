@@ -0,0 +1,333 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2008-2009 Adriano Monteiro Marques.
+#
+# Author: Bartosz SKOWRON <getxsick at gmail dot com>
+#
+# This library is free software; you can redistribute it and/or modify 
+# it under the terms of the GNU Lesser General Public License as published 
+# by the Free Software Foundation; either version 2.1 of the License, or 
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but 
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public 
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License 
+# along with this library; if not, write to the Free Software Foundation, 
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA 
+
+
+"""
+Parallel generation of packets with multiprocessing.
+
+Work is split into shards (ranges of packet indexes) which are built
+by a pool of processes. Packet objects are never pickled:
+
+ - templates (see Packet.compile()) render packets of the same length,
+   so workers write them directly into the shared memory buffer
+   (PacketTemplate.render_parallel()),
+ - packets built by a factory function are returned as raw strings
+   (build_parallel()).
+
+Workers can also send their shards through their own SocketL2
+(iface argument), otherwise packets are returned to the caller
+for sending (e.g. by SocketL2.send_raw()). Raw packets are sent
+as they are, so they have to start with the Ethernet header.
+
+The pool is forked, so templates and values are inherited by workers.
+
+>>> template = Packet(Ethernet(), IP(), TCP(srcport=2000)).compile(
+...                                                         'tcp.dstport')
+>>> packets = template.render_parallel(dstport=xrange(1, 65536))
+>>> SocketL2('eth0').send_raw(*packets)
+"""
+
+import multiprocessing
+import multiprocessing.sharedctypes
+
+from umit.umpa._config import config
+from umit.umpa.utils.exceptions import UMPAException, UMPAAttributeException
+
+# state of the worker process (inherited from the parent by fork)
+_worker = {}
+
+def _shards(count, processes, chunks=4):
+    """
+    Split indexes into shards.
+
+    There are a few shards per process, so faster processes take
+    more of them.
+
+    @type count: C{int}
+    @param count: number of packets
+
+    @type processes: C{int}
+    @param processes: number of processes
+
+    @type chunks: C{int}
+    @param chunks: number of shards per process
+
+    @rtype: C{list}
+    @return: (start, end) ranges of indexes.
+    """
+
+    amount = max(min(count, processes * chunks), 1)
+    step = count // amount
+    extra = count % amount
+    shards = []
+    start = 0
+    for i in xrange(amount):
+        end = start + step + (i < extra)
+        if end > start:
+            shards.append((start, end))
+        start = end
+    return shards
+
+def _send(iface, raws):
+    """
+    Send raw frames through a new SocketL2.
+
+    @rtype: C{int}
+    @return: number of sent bytes.
+    """
+
+    # imported here, because the module is imported by umit.umpa
+    from umit.umpa._sockets import SocketL2
+
+    sock = SocketL2(iface)
+    try:
+        sent = 0
+        batch_size = config['batch_size']
+        for start in xrange(0, len(raws), batch_size):
+            sent += sum(sock.send_raw(*raws[start:start + batch_size]))
+        return sent
+    finally:
+        sock.close()
+
+def _pool(processes, initializer, args):
+    """
+    Return a new pool of processes.
+    """
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if processes < 1:
+        raise UMPAException("number of processes has to be positive")
+    return multiprocessing.Pool(processes, initializer, args), processes
+
+def _run(pool, worker, shards):
+    """
+    Run the worker for every shard and return results in order.
+    """
+
+    try:
+        results = pool.map(worker, shards, 1)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return results
+
+class RenderedPackets(object):
+    """
+    Packets of the same length stored in a shared memory buffer.
+
+    Items are raw packets (str). The whole buffer is available
+    as the raw attribute (a buffer object, nothing is copied).
+    """
+
+    def __init__(self, output, count, length, sent=None):
+        """
+        @type output: C{ctypes.Array}
+        @param output: shared memory buffer
+
+        @type count: C{int}
+        @param count: number of packets
+
+        @type length: C{int}
+        @param length: length of each packet
+
+        @type sent: C{int}
+        @param sent: number of bytes sent by workers (or None)
+        """
+
+        self._output = output
+        self.count = count
+        self.length = length
+        self.sent = sent
+        self.raw = buffer(output)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("packet index out of range")
+        start = index * self.length
+        return self._output[start:start + self.length]
+
+    def __iter__(self):
+        output = self._output
+        length = self.length
+        for start in xrange(0, self.count * length, length):
+            yield output[start:start + length]
+
+def _init_render(template, changes, output, iface):
+    _worker['template'] = template
+    _worker['changes'] = changes
+    _worker['output'] = output
+    _worker['iface'] = iface
+
+def _render_shard(shard):
+    """
+    Render packets of the shard into the shared buffer.
+    """
+
+    template = _worker['template']
+    changes = _worker['changes']
+    output = _worker['output']
+    length = len(template.raw)
+    start, end = shard
+
+    for i in xrange(start, end):
+        values = {}
+        for key in changes:
+            values[key] = changes[key][i]
+        offset = i * length
+        output[offset:offset + length] = template.render(**values)
+
+    if _worker['iface'] is None:
+        return 0
+    raws = [ output[offset:offset + length]
+                    for offset in xrange(start * length, end * length, length) ]
+    return _send(_worker['iface'], raws)
+
+def render_parallel(template, processes=None, iface=None, **changes):
+    """
+    Render many packets of the template by a pool of processes.
+
+    Values of fields are sequences (indexed by the number of the packet,
+    e.g. lists or xrange objects) or single values (used for every
+    packet). All sequences have to be the same length.
+
+    @type template: C{PacketTemplate}
+    @param template: template of packets (see Packet.compile()).
+
+    @type processes: C{int}
+    @param processes: number of processes (default: number of CPUs)
+
+    @type iface: C{str}
+    @param iface: if passed, every worker sends its packets through its
+                  own SocketL2 on this interface
+
+    @param changes: key=values of fields to change (as for render()).
+
+    @rtype: C{RenderedPackets}
+    @return: rendered packets.
+    """
+
+    sequences = {}
+    count = None
+    for key in changes:
+        if key not in template._keys:
+            raise UMPAAttributeException(key + ' is not a mutable field')
+        values = changes[key]
+        if isinstance(values, (str, unicode, tuple)) or \
+                                        not hasattr(values, '__getitem__'):
+            # a single value (addresses can be passed as tuples)
+            values = _Repeat(values)
+        elif count is None:
+            count = len(values)
+        elif len(values) != count:
+            raise UMPAException("different lengths of values")
+        sequences[key] = values
+    if count is None:
+        count = 1
+
+    length = len(template.raw)
+    output = multiprocessing.sharedctypes.RawArray('c', count * length)
+
+    pool, processes = _pool(processes, _init_render,
+                            (template, sequences, output, iface))
+    sent = _run(pool, _render_shard, _shards(count, processes))
+
+    if iface is None:
+        return RenderedPackets(output, count, length)
+    return RenderedPackets(output, count, length, sum(sent))
+
+class _Repeat(object):
+    """
+    The same value for every index.
+    """
+
+    def __init__(self, value):
+        self.value = value
+
+    def __getitem__(self, index):
+        return self.value
+
+def _init_build(factory, args, iface):
+    _worker['factory'] = factory
+    _worker['args'] = args
+    _worker['iface'] = iface
+
+def _build_shard(shard):
+    """
+    Build packets of the shard and return them as a single string.
+    """
+
+    factory = _worker['factory']
+    args = _worker['args']
+    start, end = shard
+    raws = [ factory(i, *args).get_raw() for i in xrange(start, end) ]
+
+    if _worker['iface'] is not None:
+        return _send(_worker['iface'], raws), None, None
+    return 0, ''.join(raws), [ len(raw) for raw in raws ]
+
+def build_parallel(factory, count, processes=None, iface=None, args=()):
+    """
+    Build packets by a factory function in a pool of processes.
+
+    The factory is called as factory(index, *args) and has to return
+    a Packet object (or anything with get_raw() method).
+
+    @type factory: C{func}
+    @param factory: function which builds the packet of the index
+
+    @type count: C{int}
+    @param count: number of packets
+
+    @type processes: C{int}
+    @param processes: number of processes (default: number of CPUs)
+
+    @type iface: C{str}
+    @param iface: if passed, every worker sends its packets through its
+                  own SocketL2 on this interface and nothing is returned
+
+    @type args: C{tuple}
+    @param args: additional arguments for the factory
+
+    @rtype: C{list} or C{int}
+    @return: raw packets in order or number of sent bytes if iface is passed.
+    """
+
+    pool, processes = _pool(processes, _init_build, (factory, args, iface))
+    results = _run(pool, _build_shard, _shards(count, processes))
+
+    if iface is not None:
+        return sum([ sent for sent, data, lengths in results ])
+    raws = []
+    for sent, data, lengths in results:
+        offset = 0
+        for length in lengths:
+            raws.append(data[offset:offset + length])
+            offset += length
+    return raws
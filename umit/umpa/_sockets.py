@@ -29,17 +29,30 @@ a platform-independent manner. The standard Python socket module can be used
 instead if advanced functionalities are needed.
 """
 
+import collections
+import mmap
 import socket
 import struct
 import sys
 import os
-from errno import EBUSY
+import threading
+from errno import EAGAIN, EBUSY
 
+from umit.umpa._config import config
 from umit.umpa.utils.exceptions import UMPAException, UMPANotPermittedException
 
 # constants from various header files not available under Python
 ETH_P_ALL = 3                     # from linux/if_ether.h
 BIOCSETIF = 2149597804            # from net/bpf.h
+SOL_PACKET = 263                  # from linux/socket.h
+PACKET_VERSION = 10               # from linux/if_packet.h
+PACKET_TX_RING = 13
+TPACKET_V2 = 1
+TP_STATUS_AVAILABLE = 0
+TP_STATUS_SEND_REQUEST = 1
+TP_STATUS_SENDING = 2
+TP_STATUS_WRONG_FORMAT = 4
+TPACKET2_HDRLEN = 32              # TPACKET_ALIGN(sizeof(struct tpacket2_hdr))
 
 # Detect socket programming model. This greatly simplifies socket code.
 if sys.platform == 'linux2':
@@ -68,6 +81,289 @@ else:
 # load additional modules conditionally depending on programming models
 if _l2model == 'bpf':
     from fcntl import ioctl
+elif _l2model == 'AF_PACKET':
+    import ctypes
+    import ctypes.util
+    from errno import EINTR
+
+    class _iovec(ctypes.Structure):
+        """
+        struct iovec from sys/uio.h
+        """
+
+        _fields_ = [('iov_base', ctypes.c_char_p),
+                    ('iov_len', ctypes.c_size_t)]
+
+    class _msghdr(ctypes.Structure):
+        """
+        struct msghdr from sys/socket.h
+        """
+
+        _fields_ = [('msg_name', ctypes.c_char_p),
+                    ('msg_namelen', ctypes.c_uint32),
+                    ('msg_iov', ctypes.POINTER(_iovec)),
+                    ('msg_iovlen', ctypes.c_size_t),
+                    ('msg_control', ctypes.c_void_p),
+                    ('msg_controllen', ctypes.c_size_t),
+                    ('msg_flags', ctypes.c_int)]
+
+    class _mmsghdr(ctypes.Structure):
+        """
+        struct mmsghdr from sys/socket.h
+        """
+
+        _fields_ = [('msg_hdr', _msghdr),
+                    ('msg_len', ctypes.c_uint)]
+
+    # sendmmsg() is available since Linux 3.0 and glibc 2.14
+    try:
+        _libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        _sendmmsg = _libc.sendmmsg
+        _sendmmsg.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint,
+                              ctypes.c_int]
+        _sendmmsg.restype = ctypes.c_int
+    except (OSError, AttributeError):
+        _sendmmsg = None
+else:
+    _sendmmsg = None
+
+def _sockaddr(family, address):
+    """
+    Return the address as a raw sockaddr structure for sendmmsg().
+
+    @type family: C{int}
+    @param family: socket.AF_INET or socket.AF_INET6.
+
+    @type address: C{str}
+    @param address: IP address or hostname.
+
+    @rtype: C{str}
+    @return: struct sockaddr_in or struct sockaddr_in6.
+    """
+
+    try:
+        packed = socket.inet_pton(family, address)
+    except socket.error:
+        # hostnames are resolved like sendto() does
+        address = socket.getaddrinfo(address, 0, family)[0][4][0]
+        packed = socket.inet_pton(family, address)
+
+    if family == socket.AF_INET:
+        return struct.pack("=HH4s8x", family, 0, packed)
+    return struct.pack("=HHI16sI", family, 0, 0, packed, 0)
+
+def _send_many(sock, raws, names=None, batch_size=None):
+    """
+    Send many raw packets with as few sendmmsg() calls as possible.
+
+    Packets are sent in batches of batch_size packets. If the kernel
+    accepts only some of them, the rest is sent with the next call.
+    Non-blocking sockets return byte counts of packets sent before
+    the socket was full (EAGAIN), so the result may be shorter.
+    Other errors raise socket.error with the sent_bytes attribute
+    (byte counts of packets sent before the error).
+
+    @type sock: C{socket.socket}
+    @param sock: the socket.
+
+    @type raws: C{list}
+    @param raws: raw packets.
+
+    @type names: C{list}
+    @param names: raw destination addresses (see _sockaddr()) or None
+    for connected/bound sockets.
+
+    @type batch_size: C{int}
+    @param batch_size: maximum number of packets per one system call.
+
+    @rtype: C{list}
+    @return: byte counts of sent packets.
+    """
+
+    if batch_size is None:
+        batch_size = config['batch_size']
+
+    fd = sock.fileno()
+    sent_bytes = []
+    for start in xrange(0, len(raws), batch_size):
+        amount = min(batch_size, len(raws) - start)
+        msgs = (_mmsghdr * amount)()
+        iovs = (_iovec * amount)()
+        for i in xrange(amount):
+            raw = raws[start + i]
+            iovs[i].iov_base = raw
+            iovs[i].iov_len = len(raw)
+            hdr = msgs[i].msg_hdr
+            hdr.msg_iov = ctypes.pointer(iovs[i])
+            hdr.msg_iovlen = 1
+            if names is not None:
+                hdr.msg_name = names[start + i]
+                hdr.msg_namelen = len(names[start + i])
+
+        done = 0
+        while done < amount:
+            result = _sendmmsg(fd, ctypes.addressof(msgs) +
+                        done * ctypes.sizeof(_mmsghdr), amount - done, 0)
+            if result < 0:
+                errno = ctypes.get_errno()
+                if errno == EINTR:
+                    continue
+                if errno == EAGAIN and (sent_bytes or done):
+                    # non-blocking socket is full, the rest is sent later
+                    sent_bytes.extend([ int(msg.msg_len)
+                                                for msg in msgs[:done] ])
+                    return sent_bytes
+                error = socket.error(errno, os.strerror(errno))
+                # packets sent before the error are counted by callers
+                error.sent_bytes = sent_bytes + [ int(msg.msg_len)
+                                                for msg in msgs[:done] ]
+                raise error
+            done += result
+
+        sent_bytes.extend([ int(msg.msg_len) for msg in msgs ])
+    return sent_bytes
+
+class _SocketPool(object):
+    """
+    Process-wide pool of sockets used by send().
+
+    Sockets are created lazily and reused by next calls. They are keyed
+    by (layer, family, iface). If there are more than config['pool_size']
+    sockets, the least recently used one is closed.
+
+    Sockets returned by get() are leased until release() is called.
+    Leased sockets which are removed from the pool (by other threads)
+    are closed when the last lease is released.
+    """
+
+    def __init__(self):
+        """
+        Create a new empty _SocketPool.
+        """
+
+        self._sockets = collections.OrderedDict()
+        # number of leases of sockets
+        self._leases = {}
+        # leased sockets which are closed by release()
+        self._closing = set()
+        self._lock = threading.Lock()
+
+    def get(self, layer, family=None, iface=None):
+        """
+        Return a socket for the key, create it if needed.
+
+        The socket is leased, call release() when it's not used anymore.
+
+        @type layer: C{int}
+        @param layer: 2 for link-layer sockets, 3 for network layer ones.
+
+        @type family: C{int}
+        @param family: socket.AF_INET or socket.AF_INET6 (layer 3 only).
+
+        @type iface: C{str}
+        @param iface: interface (layer 2 only).
+
+        @rtype: C{_Socket}
+        @return: the socket.
+        """
+
+        key = (layer, family, iface)
+        self._lock.acquire()
+        try:
+            try:
+                sock = self._sockets.pop(key)
+            except KeyError:
+                if layer == 2:
+                    sock = SocketL2(iface=iface)
+                elif family == socket.AF_INET6:
+                    sock = INET6()
+                else:
+                    sock = INET()
+            # the most recently used socket is the last one
+            self._sockets[key] = sock
+            self._leases[sock] = self._leases.get(sock, 0) + 1
+            while len(self._sockets) > max(config['pool_size'], 1):
+                self._close(self._sockets.popitem(last=False)[1])
+            return sock
+        finally:
+            self._lock.release()
+
+    def release(self, sock):
+        """
+        Release the lease of the socket returned by get().
+
+        @type sock: C{_Socket}
+        @param sock: the socket.
+        """
+
+        self._lock.acquire()
+        try:
+            self._leases[sock] -= 1
+            if self._leases[sock] == 0:
+                del self._leases[sock]
+                if sock in self._closing:
+                    self._closing.remove(sock)
+                    sock.close()
+        finally:
+            self._lock.release()
+
+    def _close(self, sock):
+        """
+        Close the socket removed from the pool or defer it until
+        the socket is released.
+
+        The lock has to be acquired.
+
+        @type sock: C{_Socket}
+        @param sock: the socket.
+        """
+
+        if sock in self._leases:
+            self._closing.add(sock)
+        else:
+            sock.close()
+
+    def discard(self, sock):
+        """
+        Remove the socket from the pool and close it.
+
+        @type sock: C{_Socket}
+        @param sock: the socket.
+        """
+
+        self._lock.acquire()
+        try:
+            for key in self._sockets.keys():
+                if self._sockets[key] is sock:
+                    del self._sockets[key]
+            self._close(sock)
+        finally:
+            self._lock.release()
+
+    def close(self):
+        """
+        Close all sockets of the pool.
+
+        Leased sockets are closed when they are released.
+        """
+
+        self._lock.acquire()
+        try:
+            while self._sockets:
+                self._close(self._sockets.popitem()[1])
+        finally:
+            self._lock.release()
+
+_pool = _SocketPool()
+
+def close_sockets():
+    """
+    Close sockets opened by send().
+
+    They are reopened by next calls of send() if needed.
+    """
+
+    _pool.close()
 
 def send(*packets, **kwargs):
     """
@@ -75,6 +371,8 @@ def send(*packets, **kwargs):
 
     The function creates sockets of proper level as needed. The 'iface'
     named argument must be supplied for L2 (link-layer) sockets.
+    Sockets are kept open and reused by next calls, so the function
+    can be called in a loop. Use close_sockets() to close them.
 
     @type packets: C{Packet}
     @param packets: list of umit.umpa.Packet objects to send.
@@ -82,14 +380,33 @@ def send(*packets, **kwargs):
     @returns: List of return values (byte counts) from the send() function.
     """
 
-    sent_bytes = []
-    for packet in packets:
-        # create appropriate socket based on packet's lowermost layer
+    # group packets by the socket which sends them, but keep the order
+    # of results
+    groups = {}
+    for index, packet in enumerate(packets):
+        # choose appropriate socket based on packet's lowermost layer
         if packet.protos[0].layer == 2:
-            sock = SocketL2(iface=kwargs.get('iface'))
+            key = (2, None, kwargs.get('iface'))
+        elif packet.protos[0].name == 'IPV6':
+            key = (3, socket.AF_INET6, None)
         else:
-            sock = SocketL3()
-        sent_bytes.extend(sock.send(packet))
+            key = (3, socket.AF_INET, None)
+        groups.setdefault(key, []).append(index)
+
+    sent_bytes = [None] * len(packets)
+    for key in groups:
+        sock = _pool.get(*key)
+        indexes = groups[key]
+        try:
+            results = sock.send(*[ packets[i] for i in indexes ])
+        except (socket.error, IOError):
+            # the socket may be broken (e.g. the interface is down)
+            _pool.discard(sock)
+            raise
+        finally:
+            _pool.release(sock)
+        for index, result in zip(indexes, results):
+            sent_bytes[index] = result
     return sent_bytes
 
 class _Socket(object):
@@ -102,14 +419,202 @@ class _Socket(object):
     def __init__(self, **kwargs):
         raise NotImplementedError("this is an abstract class")
 
+    def close(self):
+        """
+        Close the socket.
+
+        The socket can't be used to send packets anymore.
+        """
+
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class _TxRing(object):
+    """
+    Memory-mapped transmit ring of AF_PACKET sockets (PACKET_TX_RING).
+
+    Frames are copied directly into the ring shared with the kernel and
+    sent by one send() call per batch. TPACKET_V2 frame format is used.
+    """
+
+    def __init__(self, sock, frames, frame_size):
+        """
+        Create a new _TxRing and attach it to the socket.
+
+        @type sock: C{socket.socket}
+        @param sock: AF_PACKET socket.
+
+        @type frames: C{int}
+        @param frames: minimal number of frames in the ring.
+
+        @type frame_size: C{int}
+        @param frame_size: size of the frame slot (with the header)
+        in bytes. It has to be a multiple of 16.
+        """
+
+        if frame_size % 16 or frame_size <= TPACKET2_HDRLEN:
+            raise UMPAException("wrong frame size of the ring: %d"
+                                                            % frame_size)
+
+        # blocks are multiples of pages, frames can't cross blocks
+        self.block_size = mmap.PAGESIZE
+        while self.block_size < frame_size:
+            self.block_size *= 2
+        self.frame_size = frame_size
+        self.frames_per_block = self.block_size / frame_size
+        block_nr = (frames + self.frames_per_block - 1) / \
+                                                self.frames_per_block
+        self.frame_nr = block_nr * self.frames_per_block
+
+        sock.setsockopt(SOL_PACKET, PACKET_VERSION, TPACKET_V2)
+        sock.setsockopt(SOL_PACKET, PACKET_TX_RING,
+                        struct.pack("IIII", self.block_size, block_nr,
+                                    frame_size, self.frame_nr))
+        self._ring = mmap.mmap(sock.fileno(), self.block_size * block_nr,
+                               mmap.MAP_SHARED,
+                               mmap.PROT_READ | mmap.PROT_WRITE)
+        self._sock = sock
+        self._index = 0
+
+    def _frame(self, index):
+        """
+        Return the offset of the frame in the ring.
+
+        @type index: C{int}
+        @param index: index of the frame.
+
+        @rtype: C{int}
+        @return: offset in bytes.
+        """
+
+        return index / self.frames_per_block * self.block_size + \
+                            index % self.frames_per_block * self.frame_size
+
+    def _status(self, offset):
+        """
+        Return tp_status of the frame.
+
+        @type offset: C{int}
+        @param offset: offset of the frame.
+
+        @rtype: C{int}
+        @return: status of the frame.
+        """
+
+        return struct.unpack_from("I", self._ring, offset)[0]
+
+    def send(self, raws):
+        """
+        Send raw frames through the ring.
+
+        The kernel is notified once per filled ring, so many frames are
+        sent by one system call.
+
+        @type raws: C{list}
+        @param raws: raw frames.
+
+        @rtype: C{list}
+        @return: byte counts of sent frames.
+        """
+
+        max_length = self.frame_size - TPACKET2_HDRLEN
+        sent_bytes = []
+        queued = []
+        for raw in raws:
+            if len(raw) > max_length:
+                raise UMPAException("frame is too long for the ring "
+                                    "(%d > %d bytes)" % (len(raw), max_length))
+
+            offset = self._frame(self._index)
+            if self._status(offset) & (TP_STATUS_SEND_REQUEST |
+                                                        TP_STATUS_SENDING):
+                # the ring is full, blocking send() waits for all frames
+                sent_bytes.extend(self._flush(queued))
+                queued = []
+                if self._status(offset) & (TP_STATUS_SEND_REQUEST |
+                                                        TP_STATUS_SENDING):
+                    raise UMPAException("the transmit ring is busy")
+
+            start = offset + TPACKET2_HDRLEN
+            self._ring[start:start + len(raw)] = raw
+            # tp_len and tp_snaplen
+            struct.pack_into("II", self._ring, offset + 4, len(raw), len(raw))
+            # the status is set at the end, the frame is ready then
+            struct.pack_into("I", self._ring, offset, TP_STATUS_SEND_REQUEST)
+
+            self._index = (self._index + 1) % self.frame_nr
+            queued.append((offset, len(raw)))
+
+        if queued:
+            sent_bytes.extend(self._flush(queued))
+        return sent_bytes
+
+    def _flush(self, queued):
+        """
+        Send queued frames and check their statuses.
+
+        Slots of frames which weren't sent are made available again,
+        so the ring can be used after errors.
+
+        @type queued: C{list}
+        @param queued: (offset, length) tuples of queued frames.
+
+        @rtype: C{list}
+        @return: byte counts of sent frames.
+        """
+
+        try:
+            self.flush()
+        except socket.error:
+            for offset, length in queued:
+                struct.pack_into("I", self._ring, offset, TP_STATUS_AVAILABLE)
+            raise
+
+        sent_bytes = []
+        rejected = 0
+        for offset, length in queued:
+            status = self._status(offset)
+            if status == TP_STATUS_AVAILABLE:
+                sent_bytes.append(length)
+            elif status & TP_STATUS_WRONG_FORMAT:
+                struct.pack_into("I", self._ring, offset, TP_STATUS_AVAILABLE)
+                rejected += 1
+        if rejected:
+            raise UMPAException("the kernel rejected %d frame(s)" % rejected)
+        return sent_bytes
+
+    def flush(self):
+        """
+        Ask the kernel to send all frames which are ready.
+        """
+
+        self._sock.send("")
+
+    def close(self):
+        """
+        Unmap the ring.
+        """
+
+        self._ring.close()
+
 class SocketL2(_Socket):
     """
     Level 2 (link-layer) socket class.
 
     Supported platforms: Linux (AF_PACKET), BSD (bpf).
+
+    On Linux, frames can be sent through the memory-mapped transmit ring
+    (PACKET_TX_RING) shared with the kernel. Use the tx_ring argument
+    to enable it.
     """
 
-    def __init__(self, iface=None):
+    def __init__(self, iface=None, batch_size=None, tx_ring=None,
+                                                        frame_size=2048):
         """
         Create a new SocketL2 instance.
 
@@ -117,7 +622,21 @@ class SocketL2(_Socket):
 
         @type iface: C{str}
         @param iface: Interface to use for sending the packets.
+
+        @type batch_size: C{int}
+        @param batch_size: maximum number of packets sent by one system call
+        (default: config['batch_size']).
+
+        @type tx_ring: C{int}
+        @param tx_ring: number of frames of the transmit ring
+        (Linux only, the ring is disabled by default).
+
+        @type frame_size: C{int}
+        @param frame_size: size of the frame in the transmit ring
+        (with the 32-byte header).
         """
+        self.batch_size = batch_size
+        self._tx_ring = None
         if iface is None:
             # TODO: port interface detection from the link-layer branch
             raise NotImplementedError("You need to specify iface")
@@ -132,7 +651,16 @@ class SocketL2(_Socket):
 
             self._sock.bind((iface, ETH_P_ALL))
             self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 2**20)
+            if tx_ring:
+                try:
+                    self._tx_ring = _TxRing(self._sock, tx_ring, frame_size)
+                except (socket.error, EnvironmentError), msg:
+                    self._sock.close()
+                    raise UMPAException(msg)
         elif _l2model == 'bpf':
+            if tx_ring:
+                raise NotImplementedError("TX ring unsupported on your "
+                                                                "platform")
             # Loop over /dev/bpf* devices, looking for a free one.
             self._sock = None
             suffix = 0
@@ -153,22 +681,58 @@ class SocketL2(_Socket):
         """
         Send packets through the socket.
 
+        Packets are sent in batches through the transmit ring (if it's
+        enabled) or by sendmmsg() (if it's available).
+
         @type packets: C{Packet}
         @param packets: List of umit.umpa.Packet objects to send.
 
         @returns: List of return values (byte counts) from the send() function.
         """
 
+        return self.send_raw(*[ packet.get_raw() for packet in packets ])
+
+    def send_raw(self, *raws):
+        """
+        Send raw frames (e.g. captured ones) through the socket.
+
+        @type raws: C{str}
+        @param raws: List of raw frames to send.
+
+        @returns: List of return values (byte counts) from the send() function.
+        """
+
+        if self._tx_ring is not None:
+            return self._tx_ring.send(raws)
+        if _sendmmsg is not None:
+            return _send_many(self._sock, raws, batch_size=self.batch_size)
+
         sent_bytes = []
-        for packet in packets:
+        for raw in raws:
             if _l2model == 'AF_PACKET':
-                sent_bytes.append(self._sock.send(packet.get_raw()))
+                try:
+                    sent_bytes.append(self._sock.send(raw))
+                except socket.error, msg:
+                    if msg.args[0] != EAGAIN or not sent_bytes:
+                        raise
+                    # non-blocking socket is full
+                    break
             elif _l2model == 'bpf':
-                sent_bytes.append(self._sock.write(packet.get_raw()))
+                sent_bytes.append(self._sock.write(raw))
             else:
                 raise NotImplementedError("L2 send unsupported on your platform")
         return sent_bytes
 
+    def close(self):
+        """
+        Close the socket (and unmap the transmit ring).
+        """
+
+        if self._tx_ring is not None:
+            self._tx_ring.close()
+            self._tx_ring = None
+        super(SocketL2, self).close()
+
 class SocketL3(_Socket):
     """
     Level 3 (network layer) socket class.
@@ -188,13 +752,18 @@ class SocketL3(_Socket):
     them to be too limiting, consider using Layer 2 sockets (SocketL2 class) instead.
     """
 
-    def __init__(self,self_sock,L3model):
+    def __init__(self, self_sock, L3model, batch_size=None):
         """
         Create a new SocketL3 instance.
 
         Requires root/administrator rights and/or CAP_NET_RAW capability.
+
+        @type batch_size: C{int}
+        @param batch_size: maximum number of packets sent by one system call
+        (default: config['batch_size']).
         """
         self.model = L3model
+        self.batch_size = batch_size
 
         if self.model == 'AF_INET6':
             self._sock = self_sock
@@ -215,68 +784,140 @@ class SocketL3(_Socket):
         @type packets: C{Packet}
         @param packets: List of umit.umpa.Packet objects to send.
 
+        Packets are sent in batches by sendmmsg() if it's available.
+
         @returns: List of return values (byte counts) from the send() function.
         """
-        #print "in send of sock send"
 
-        sent_bytes = []
+        if self.model == 'AF_INET':
+            separator = "."
+        elif self.model == 'AF_INET6':
+            separator = ":"
+        else:
+            raise NotImplementedError("L3 send unsupported on your platform")
+
+        raws = []
+        destinations = []
         for packet in packets:
-            if self.model == 'AF_INET':
-                # get destination address and convert it to IPv4 notation
-                # TODO: move this to utils.net
-                dst_addr = packet._get_destination(layer=3)
-                if type(dst_addr) is tuple:
-                    dst_addr = ".".join(str(y) for y in dst_addr)
+            # get destination address and convert it to the proper notation
+            # TODO: move this to utils.net
+            dst_addr = packet._get_destination(layer=3)
+            if type(dst_addr) is tuple:
+                dst_addr = separator.join(str(y) for y in dst_addr)
+            destinations.append(dst_addr)
+            raws.append(packet.get_raw())
 
-                raw = packet.get_raw()
+        return self._send_raws(raws, destinations)
 
-                if _l3quirk == 'ntohs':
-                    raw = _ntohs_quirk(raw)
+    def send_raw(self, *raws):
+        """
+        Send raw packets (e.g. already built ones) through the socket.
 
-                sent_bytes.append(self._sock.sendto(raw, (dst_addr, 0)))
-            elif self.model == 'AF_INET6':
-                dst_addr = packet._get_destination(layer=3)
-                #print "in send of sock send"
-                #print "In elif case of send packet with dest address",
-                #print(dst_addr)
-                if type(dst_addr) is tuple:
-                    dst_addr = ":".join(str(y) for y in dst_addr)
-                    
-                raw = packet.get_raw()
-                if _l3quirk == 'ntohs':
-                    #print "in send of sock send ntohs quirk"
-                    raw = _ntohs_quirk(raw)
-                sent_bytes.append(self._sock.sendto(raw, (dst_addr, 0)))
+        Destinations are read from IP headers of packets.
+
+        @type raws: C{str}
+        @param raws: List of raw packets to send.
+
+        @returns: List of return values (byte counts) from the send() function.
+        """
+
+        if self.model == 'AF_INET':
+            destinations = [ socket.inet_ntoa(raw[16:20]) for raw in raws ]
+        elif self.model == 'AF_INET6':
+            destinations = [ socket.inet_ntop(socket.AF_INET6, raw[24:40])
+                                                            for raw in raws ]
+        else:
+            raise NotImplementedError("L3 send unsupported on your platform")
+
+        return self._send_raws(raws, destinations)
+
+    def _send_raws(self, raws, destinations):
+        """
+        Send raw packets to the destinations.
+
+        @type raws: C{list}
+        @param raws: raw packets.
+
+        @type destinations: C{list}
+        @param destinations: destination addresses of packets.
+
+        @returns: List of return values (byte counts) from the send() function.
+        """
+
+        if _l3quirk == 'ntohs':
+            raws = [ _ntohs_quirk(raw) for raw in raws ]
+
+        if _sendmmsg is not None:
+            if self.model == 'AF_INET':
+                family = socket.AF_INET
             else:
-                raise NotImplementedError("L3 send unsupported on your platform")
+                family = socket.AF_INET6
+            # destinations are usually repeated, so convert them once
+            names = {}
+            for dst_addr in destinations:
+                if dst_addr not in names:
+                    names[dst_addr] = _sockaddr(family, dst_addr)
+            return _send_many(self._sock, raws,
+                              [ names[dst_addr] for dst_addr in destinations ],
+                              self.batch_size)
+
+        sent_bytes = []
+        for raw, dst_addr in zip(raws, destinations):
+            try:
+                sent_bytes.append(self._sock.sendto(raw, (dst_addr, 0)))
+            except socket.error, msg:
+                if msg.args[0] != EAGAIN or not sent_bytes:
+                    raise
+                # non-blocking socket is full
+                break
         return sent_bytes
 
 class INET6(SocketL3):
-	"""
-	"""
-	def __init__(self):
-		try:
-			 self._sock = socket.socket(socket.AF_INET6,socket.SOCK_RAW, socket.IPPROTO_RAW)
-		except socket.error, msg:
-			raise UMPANotPermittedException(msg)
-			
-		#self._sock.setsockopt(socket.IPPROTO_IPV6, socket.IP_HDRINCL, 1)
-		
-		super(INET6, self).__init__(self._sock, "AF_INET6")	
-	
+    """
+    Level 3 socket for IPv6 packets.
+    """
+
+    def __init__(self, batch_size=None):
+        """
+        Create a new INET6 instance.
+
+        Requires root/administrator rights and/or CAP_NET_RAW capability.
+
+        @type batch_size: C{int}
+        @param batch_size: maximum number of packets sent by one system call.
+        """
+
+        try:
+            sock = socket.socket(socket.AF_INET6, socket.SOCK_RAW,
+                                 socket.IPPROTO_RAW)
+        except socket.error, msg:
+            raise UMPANotPermittedException(msg)
+
+        super(INET6, self).__init__(sock, "AF_INET6", batch_size)
+
 class INET(SocketL3):
-	"""
-	"""
-	def __init__(self):
-		try:
-			 self._sock = socket.socket(socket.AF_INET,socket.SOCK_RAW, socket.IPPROTO_RAW)
-		except socket.error, msg:
-			raise UMPANotPermittedException(msg)
-			
-		#self._sock.setsockopt(socket.IPPROTO_IP, socket.IP_HDRINCL, 1)
-		
-		super(INET, self).__init__(self._sock, "AF_INET")	
-					
+    """
+    Level 3 socket for IPv4 packets.
+    """
+
+    def __init__(self, batch_size=None):
+        """
+        Create a new INET instance.
+
+        Requires root/administrator rights and/or CAP_NET_RAW capability.
+
+        @type batch_size: C{int}
+        @param batch_size: maximum number of packets sent by one system call.
+        """
+
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_RAW,
+                                 socket.IPPROTO_RAW)
+        except socket.error, msg:
+            raise UMPANotPermittedException(msg)
+
+        super(INET, self).__init__(sock, "AF_INET", batch_size)
+
 def _ntohs_quirk(raw):
     """
     FreeBSD raw socket endianness quirk support.
@@ -303,4 +944,4 @@ def _ntohs_quirk(raw):
     return raw
 
 # XXX API compatibility hack for Milestone 0.3 release
-Socket = SocketL3
+Socket = INET
@@ -0,0 +1,438 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2008-2009 Adriano Monteiro Marques.
+#
+# Author: Bartosz SKOWRON <getxsick at gmail dot com>
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation; either version 2.1 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+
+"""
+Packet templates.
+
+A template is a packet which is serialized only once. Only selected fields
+can be changed later and they are patched directly in the raw packet.
+Checksums (IP, TCP, UDP, ICMP, ICMPv6) which depend on patched bytes are
+updated incrementally (RFC 1624), so rendering of a new packet doesn't
+depend on the length of the packet.
+
+Use Packet.compile() to create a template.
+
+>>> packet = Packet(IP(src="1.2.3.4"), TCP(srcport=2000, dstport=80))
+>>> template = packet.compile('ip.dst', 'tcp._seq', port='tcp.dstport')
+>>> raw = template.render(port=8080, **{'ip.dst' : "4.3.2.1"})
+"""
+
+import copy
+
+from umit.umpa.protocols._consts import BYTE
+from umit.umpa.protocols.IP import IP
+from umit.umpa.protocols.IPV6 import IPV6
+from umit.umpa.protocols.ICMP import ICMP
+from umit.umpa.protocols.ICMPV6 import ICMPV6
+from umit.umpa.protocols.TCP import TCP
+from umit.umpa.protocols.TCP6 import TCP6
+from umit.umpa.protocols.UDP import UDP
+from umit.umpa.protocols.UDP6 import UDP6
+from umit.umpa.utils.exceptions import UMPAException, UMPAAttributeException
+import umit.umpa.utils.bits as _bits
+import umit.umpa.utils.checksum as _cksum
+from umit.umpa import _batch
+from umit.umpa import _parallel
+
+class _Checksum(object):
+    """
+    Automatically calculated checksum of the template.
+
+    Regions are described as (start, end, base) in bytes. The base is
+    the offset where 16-bit words of the checksummed data are aligned to.
+    """
+
+    def __init__(self, offset, regions):
+        """
+        Create a new _Checksum().
+
+        @type offset: C{int}
+        @param offset: offset of the checksum field in bits.
+
+        @type regions: C{list}
+        @param regions: regions of the raw packet covered by the checksum.
+        """
+
+        self.offset = offset
+        self.regions = regions
+
+class _Mutable(object):
+    """
+    Field of the template which can be changed.
+    """
+
+    def __init__(self, index, name, field, offset):
+        """
+        Create a new _Mutable().
+
+        @type index: C{int}
+        @param index: index of the protocol in the packet.
+
+        @type name: C{str}
+        @param name: name of the field.
+
+        @type field: C{Field}
+        @param field: original field (a copy is used to convert values).
+
+        @type offset: C{int}
+        @param offset: offset of the field in the raw packet in bits.
+        """
+
+        self.index = index
+        self.name = name
+        self.offset = offset
+        self.bits = field.bits
+        self.field = copy.deepcopy(field)
+        self.value = field.get()
+
+def _address_regions(proto, start, names):
+    """
+    Return regions of addresses of the IP header (for pseudo headers).
+
+    @type proto: C{Protocol}
+    @param proto: IP/IPV6 protocol.
+
+    @type start: C{int}
+    @param start: offset of the protocol in the raw packet in bytes.
+
+    @type names: C{tuple}
+    @param names: names of the fields.
+
+    @rtype: C{list}
+    @return: list of regions.
+    """
+
+    regions = []
+    offsets = proto.__dict__['__layout'].offsets
+    for name in names:
+        offset = start + offsets[name] / BYTE
+        regions.append((offset, offset + proto.get_field(name).bits / BYTE,
+                                                                    offset))
+    return regions
+
+def _get_checksum(protos, starts, index, length):
+    """
+    Return automatically calculated checksum of the protocol.
+
+    @type protos: C{tuple}
+    @param protos: protocols of the packet.
+
+    @type starts: C{list}
+    @param starts: offsets of the protocols in the raw packet in bytes.
+
+    @type index: C{int}
+    @param index: index of the protocol.
+
+    @type length: C{int}
+    @param length: length of the raw packet in bytes.
+
+    @rtype: C{_Checksum}
+    @return: the checksum or None if the protocol doesn't calculate it.
+    """
+
+    proto = protos[index]
+    if not proto._is_valid('_checksum'):
+        return None
+    field = proto.get_field('_checksum')
+    # a checksum supplied by user is not calculated
+    if not field.active or field.fillout() != 0:
+        return None
+
+    start = starts[index]
+    end = start + len(proto.__dict__['__raw_buffer'])
+    offset = start * BYTE + proto.__dict__['__layout'].offsets['_checksum']
+
+    if isinstance(proto, IP):
+        return _Checksum(offset, [ (start, end, start) ])
+    if isinstance(proto, ICMP):
+        return _Checksum(offset, [ (start, length, start) ])
+
+    # Pseudo Header is included
+    if isinstance(proto, (TCP6, UDP6, ICMPV6)):
+        network = (IPV6,)
+    elif isinstance(proto, (TCP, UDP)):
+        network = (IP, IPV6)
+    else:
+        return None
+
+    for i, lower in enumerate(protos):
+        if isinstance(lower, network):
+            regions = _address_regions(lower, starts[i], ('src', 'dst'))
+            break
+    else:
+        if network == (IPV6,):
+            # localhost addresses are used, so they never change
+            regions = []
+        else:
+            # there is none IP instance, so the checksum wasn't calculated
+            return None
+
+    regions.append((start, length, start))
+    return _Checksum(offset, regions)
+
+class PacketTemplate(object):
+    """
+    Packet which is serialized once and then only some fields are patched.
+
+    It can be sent by sockets like a regular Packet object.
+    """
+
+    def __init__(self, packet, fields, aliases):
+        """
+        Create a new PacketTemplate().
+
+        Use Packet.compile() instead.
+
+        @type packet: C{Packet}
+        @param packet: the packet.
+
+        @type fields: C{tuple}
+        @param fields: names of mutable fields (as 'proto.field').
+
+        @type aliases: C{dict}
+        @param aliases: alias=name of mutable fields.
+        """
+
+        self.protos = tuple(packet.protos)
+        self._raw = bytearray(packet.get_raw())
+        self.raw = str(self._raw)
+
+        starts = []
+        offset = 0
+        for proto in self.protos:
+            starts.append(offset)
+            offset += len(proto.__dict__['__raw_buffer'])
+
+        self._mutables = {}
+        for name in fields + tuple(aliases.values()):
+            if name not in self._mutables:
+                self._mutables[name] = self._get_mutable(name, starts)
+
+        # keys for render(); short names are allowed if they are unique
+        self._keys = {}
+        short = {}
+        for name in self._mutables:
+            self._keys[name] = self._mutables[name]
+            field_name = self._mutables[name].name
+            short[field_name] = short.get(field_name, 0) + 1
+        for name in self._mutables:
+            field_name = self._mutables[name].name
+            if short[field_name] == 1:
+                self._keys.setdefault(field_name, self._mutables[name])
+        for alias in aliases:
+            self._keys[alias] = self._mutables[aliases[alias]]
+
+        self._checksums = []
+        for i in xrange(len(self.protos)):
+            cksum = _get_checksum(self.protos, starts, i, len(self._raw))
+            if cksum is None:
+                continue
+            # user wants to change the checksum, so don't touch it
+            for mutable in self._mutables.values():
+                if mutable.offset < cksum.offset + 16 and \
+                        mutable.offset + mutable.bits > cksum.offset:
+                    break
+            else:
+                self._checksums.append(cksum)
+
+    def _get_mutable(self, name, starts):
+        """
+        Find the field and return it as a mutable field.
+
+        @type name: C{str}
+        @param name: name of the field (as 'proto.field').
+
+        @type starts: C{list}
+        @param starts: offsets of the protocols in the raw packet in bytes.
+
+        @rtype: C{_Mutable}
+        @return: the mutable field.
+        """
+
+        try:
+            proto_name, field_name = name.split('.')
+        except ValueError:
+            raise UMPAAttributeException(name + " is not in 'proto.field' "
+                                                                    "format")
+
+        for index, proto in enumerate(self.protos):
+            if proto.name.lower() == proto_name.lower():
+                break
+        else:
+            raise UMPAAttributeException("no %s protocol in the packet"
+                                                                % proto_name)
+
+        field = proto.get_field(field_name)
+        if not field.active:
+            raise UMPAException(name + ' is not active')
+
+        offset = starts[index] * BYTE + \
+                        proto.__dict__['__layout'].offsets[field_name]
+        return _Mutable(index, field_name, field, offset)
+
+    def _patch(self, offset, bits, value, skip=None):
+        """
+        Write the value into the raw packet and update checksums.
+
+        @type offset: C{int}
+        @param offset: offset in the raw packet in bits.
+
+        @type bits: C{int}
+        @param bits: number of bits to write.
+
+        @param value: raw value (as returned by fillout_raw()).
+
+        @type skip: C{_Checksum}
+        @param skip: checksum which is not updated.
+        """
+
+        raw = self._raw
+        start = offset / BYTE
+        end = (offset + bits + BYTE - 1) / BYTE
+
+        # save old words of checksummed data before the change
+        affected = []
+        for cksum in self._checksums:
+            if cksum is skip:
+                continue
+            for region_start, region_end, base in cksum.regions:
+                if start >= region_end or end <= region_start:
+                    continue
+                word_start = max(start, region_start)
+                word_end = min(end, region_end)
+                word_start -= (word_start - base) % 2
+                word_end += (word_end - base) % 2
+                affected.append((cksum, word_start, word_end,
+                                            str(raw[word_start:word_end])))
+
+        _bits.pack_bits(raw, offset, bits, value)
+
+        for cksum, word_start, word_end, old in affected:
+            current = _bits.unpack_bits(raw, cksum.offset, 16)
+            new = _cksum.update_cksum(current, old,
+                                            str(raw[word_start:word_end]))
+            # the checksum may be covered by other checksums
+            self._patch(cksum.offset, 16, new, cksum)
+
+    def render(self, **changes):
+        """
+        Change fields of the template and return the raw packet.
+
+        Keys are names of fields passed to Packet.compile() (as 'proto.field'),
+        aliases or short names of fields (if they are unique).
+        Not passed fields keep their last values.
+
+        @param changes: key=value of fields to change.
+
+        @rtype: C{str}
+        @return: raw packet.
+        """
+
+        for key in changes:
+            try:
+                mutable = self._keys[key]
+            except KeyError:
+                raise UMPAAttributeException(key + ' is not a mutable field')
+
+            # fields validate and convert new values
+            field = mutable.field
+            field.clear()
+            field.set(changes[key])
+            value = field.fillout_raw()
+            if field.bits != mutable.bits:
+                raise UMPAException("%s can't change the length (%d bits)"
+                                            % (key, mutable.bits))
+
+            self._patch(mutable.offset, mutable.bits, value)
+            mutable.value = changes[key]
+
+        self.raw = str(self._raw)
+        return self.raw
+
+    def render_batch(self, **changes):
+        """
+        Generate many packets at once with NumPy.
+
+        Pass arrays (or sequences) of values instead of single values.
+        Fields of the template are not changed.
+        See umit.umpa._batch.render_batch() for details.
+
+        @param changes: key=values of fields to change.
+
+        @rtype: C{numpy.ndarray}
+        @return: packets as uint8 array (one per row).
+        """
+
+        return _batch.render_batch(self, **changes)
+
+    def render_parallel(self, processes=None, iface=None, **changes):
+        """
+        Generate many packets at once by a pool of processes.
+
+        Pass sequences of values instead of single values.
+        Fields of the template are not changed.
+        See umit.umpa._parallel.render_parallel() for details.
+
+        @type processes: C{int}
+        @param processes: number of processes (default: number of CPUs)
+
+        @type iface: C{str}
+        @param iface: if passed, workers send packets on this interface
+
+        @param changes: key=values of fields to change.
+
+        @rtype: C{umit.umpa._parallel.RenderedPackets}
+        @return: rendered packets.
+        """
+
+        return _parallel.render_parallel(self, processes, iface, **changes)
+
+    def get_raw(self):
+        """
+        Return the last rendered raw packet.
+
+        @rtype: C{str}
+        @return: raw packet.
+        """
+
+        return self.raw
+
+    def _get_destination(self, layer):
+        """
+        Get packet's destination address.
+
+        @type layer: C{int}
+        @param layer: Protocol layer.
+
+        @return: destination address from the selected layer.
+        """
+
+        for index, proto in enumerate(self.protos):
+            if proto.layer == layer:
+                break
+        else:
+            raise UMPAException("The packet does not contain a layer %d "
+                                                        "protocol." % layer)
+
+        for mutable in self._mutables.values():
+            if mutable.index == index and mutable.name == 'dst':
+                return mutable.value
+        return proto.dst
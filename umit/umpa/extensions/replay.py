@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2008-2009 Adriano Monteiro Marques.
+#
+# Author: Bartosz SKOWRON <getxsick at gmail dot com>
+#
+# This library is free software; you can redistribute it and/or modify 
+# it under the terms of the GNU Lesser General Public License as published 
+# by the Free Software Foundation; either version 2.1 of the License, or 
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but 
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public 
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License 
+# along with this library; if not, write to the Free Software Foundation, 
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA 
+
+
+"""
+Replay feature is for sending captured packets again.
+
+Packets of pcap/pcapng files are sent through umit.umpa.SocketL2
+with the original timing, faster/slower or as fast as possible.
+
+Sending is scheduled by the monotonic clock (see umit.umpa.utils.clock).
+Long gaps are slept, the last part of each gap (and sub-millisecond gaps)
+is busy-waited.
+If the replay is behind the schedule, late packets are sent in batches
+(see SocketL2 and config['batch_size']).
+
+>>> stats = replay("dump.pcap", iface="eth0", speed=2)
+>>> print stats
+"""
+
+import math
+import os
+from socket import error as socket_error
+
+import umit.umpa
+from umit.umpa.extensions.schedule import SendStats
+from umit.umpa.protocols._consts import DLT_EN10MB
+from umit.umpa.sniffing.libpcap import pcapfile
+from umit.umpa.utils.clock import monotonic, wait_until
+from umit.umpa.utils.exceptions import UMPAException
+
+class ReplayStats(SendStats):
+    """
+    Statistics of the replay.
+
+    Lateness is the difference between the real and the scheduled time
+    of sending of a packet. Jitter is standard deviation of lateness.
+    """
+
+    def __init__(self):
+        super(ReplayStats, self).__init__()
+        self.lateness_max = 0.0
+        self._lateness_sum = 0.0
+        self._lateness_sq = 0.0
+
+    def _add(self, sent_bytes, lateness):
+        """
+        Add a sent packet.
+
+        @type sent_bytes: C{int}
+        @param sent_bytes: number of sent bytes
+
+        @type lateness: C{float}
+        @param lateness: lateness of the packet in seconds
+        """
+
+        self.packets += 1
+        self.bytes += sent_bytes
+        self._lateness_sum += lateness
+        self._lateness_sq += lateness * lateness
+        if lateness > self.lateness_max:
+            self.lateness_max = lateness
+
+    def _get_lateness_avg(self):
+        if not self.packets:
+            return 0.0
+        return self._lateness_sum / self.packets
+
+    def _get_jitter(self):
+        if not self.packets:
+            return 0.0
+        avg = self._lateness_sum / self.packets
+        return math.sqrt(max(self._lateness_sq / self.packets - avg * avg, 0))
+
+    lateness_avg = property(_get_lateness_avg, doc="average lateness")
+    jitter = property(_get_jitter, doc="standard deviation of lateness")
+
+    def __str__(self):
+        return "%s; lateness avg %.6fs, max %.6fs, jitter %.6fs" % (
+                    super(ReplayStats, self).__str__(), self.lateness_avg,
+                    self.lateness_max, self.jitter)
+
+def _frames(reader):
+    """
+    Yield (timestamp, raw frame) tuples of the file and close it at the end.
+
+    @type reader: C{open_pcap}
+    @param reader: the opened file
+
+    @rtype: C{generator}
+    @return: packets of the file (frames are copied).
+    """
+
+    try:
+        for ts, frame in reader:
+            yield ts, str(frame)
+    finally:
+        reader.close()
+
+def _read(filename):
+    """
+    Open the capture file and return its packets.
+
+    @type filename: C{str}
+    @param filename: path to a file in pcap or pcapng format
+
+    @rtype: C{generator}
+    @return: packets of the file (see _frames()).
+    """
+
+    reader = pcapfile.open_pcap(filename)
+    if reader.datalink() != DLT_EN10MB:
+        reader.close()
+        raise UMPAException("only Ethernet frames can be replayed "
+                            "(datalink %d)" % reader.datalink())
+    return _frames(reader)
+
+def _replay_once(packets, socket, speed, batch_size, stats):
+    """
+    Send packets of one loop of the replay.
+
+    @type packets: C{iterable}
+    @param packets: (timestamp, raw frame) tuples
+
+    @type socket: C{SocketL2}
+    @param socket: socket for sending
+
+    @type speed: C{float}
+    @param speed: multiple of the original timing (0 means no waiting)
+
+    @type batch_size: C{int}
+    @param batch_size: maximum number of late packets sent at once
+
+    @type stats: C{ReplayStats}
+    @param stats: statistics to update
+    """
+
+    batch = []
+    targets = []
+    start = None
+    for ts, raw in packets:
+        if not speed:
+            target = None
+        else:
+            if start is None:
+                start = monotonic()
+                first = ts
+            target = start + (ts - first) / speed
+            if target > monotonic():
+                # send late packets before waiting for the next one
+                if batch:
+                    _send_batch(socket, batch, targets, stats)
+                    batch = []
+                    targets = []
+                wait_until(target)
+        batch.append(raw)
+        targets.append(target)
+        if len(batch) >= batch_size:
+            _send_batch(socket, batch, targets, stats)
+            batch = []
+            targets = []
+    if batch:
+        _send_batch(socket, batch, targets, stats)
+
+def _send_batch(socket, raws, targets, stats):
+    """
+    Send packets at once and update statistics.
+    """
+
+    try:
+        sent_bytes = socket.send_raw(*raws)
+    except socket_error, msg:
+        # count packets sent before the error
+        _add_sent(getattr(msg, 'sent_bytes', []), targets, stats)
+        raise
+    _add_sent(sent_bytes, targets, stats)
+
+def _add_sent(sent_bytes, targets, stats):
+    """
+    Update statistics with sent bytes of packets.
+    """
+
+    now = monotonic()
+    for count, target in zip(sent_bytes, targets):
+        if target is None:
+            lateness = 0.0
+        else:
+            lateness = now - target
+        stats._add(count, lateness)
+
+def replay(filename, iface=None, speed=1.0, loop=1, preload=True,
+                                        socket=None, batch_size=None):
+    """
+    Replay packets of the capture file.
+
+    @type filename: C{str}
+    @param filename: path to a file in pcap or pcapng format
+                     (with Ethernet frames)
+
+    @type iface: C{str}
+    @param iface: interface for sending (if socket is not passed)
+
+    @type speed: C{float}
+    @param speed: multiple of the original timing, e.g. 2 means twice
+                  as fast; 0 means as fast as possible (default: I{1.0})
+
+    @type loop: C{int}
+    @param loop: how many times the file is replayed; 0 means infinity
+                 (default: I{1})
+
+    @type preload: C{bool}
+    @param preload: load all packets before sending; otherwise packets are
+                    read from the file while sending (default: I{True})
+
+    @type socket: C{SocketL2}
+    @param socket: socket for sending; otherwise umit.umpa.SocketL2(iface)
+                   is created and closed at the end
+
+    @type batch_size: C{int}
+    @param batch_size: maximum number of packets sent at once when the replay
+                       is behind the schedule (default: config['batch_size'])
+
+    @rtype: C{ReplayStats}
+    @return: statistics of the replay.
+    """
+
+    if speed is None or speed < 0:
+        raise UMPAException("wrong speed: %s" % speed)
+    if not os.path.isfile(filename):
+        raise UMPAException("can't open file: %s" % filename)
+    if batch_size is None:
+        batch_size = umit.umpa.config['batch_size']
+
+    packets = None
+    if preload:
+        packets = list(_read(filename))
+    else:
+        # check the file before sending
+        packets = _read(filename)
+
+    own_socket = socket is None
+    if own_socket:
+        socket = umit.umpa.SocketL2(iface)
+
+    stats = ReplayStats()
+    start = monotonic()
+    try:
+        i = 0
+        while i < loop or loop == 0:
+            if not preload and i > 0:
+                packets = _read(filename)
+            _replay_once(packets, socket, speed, batch_size, stats)
+            i += 1
+    finally:
+        stats.elapsed = monotonic() - start
+        if own_socket:
+            socket.close()
+    return stats
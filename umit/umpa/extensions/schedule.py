@@ -19,54 +19,330 @@
 # along with this library; if not, write to the Free Software Foundation, 
 # Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA 
 
+
 """
 Schedule feature is for sending packets.
 
-2 features are provided:
+3 features are provided:
  1. delay before start sending
  2. interval before each packet
+ 3. rate control (packets/bits per second) with bursts
+
+Rates are controlled by a token bucket. The bucket holds up to `burst`
+packets; sending is scheduled by the monotonic clock against the ideal
+schedule, so time spent by sending and late wake-ups don't accumulate
+(lateness up to SLACK is caught up). Packets which are due at once
+are sent by one socket's call.
 
-send() function is provided and new method
+send() function and Scheduler class are provided and new method
 for umit.umpa.Socket objects is added.
+
+>>> scheduler = Scheduler(pps=10000, burst=32)
+>>> scheduler.start(packets, loop=0)
+>>> scheduler.stop()
+>>> print scheduler.stats
 """
 
-import time
 import threading
+from socket import error as socket_error
 
 import umit.umpa
+import umit.umpa._sockets
+from umit.umpa.utils.clock import monotonic, wait_until
 from umit.umpa.utils.exceptions import UMPAException
 
-def _sleep(delay):
-    """
-    Call system sleep() function.
+# lateness (in seconds) which is caught up by the token bucket
+SLACK = 0.001
 
-    @type delay: C{int}
-    @param delay: time in seconds for the sleeping.
+class SendStats(object):
+    """
+    Statistics of sending.
     """
 
-    time.sleep(delay)
+    def __init__(self):
+        self.packets = 0
+        self.bytes = 0
+        self.elapsed = 0.0
+
+    def _get_pps(self):
+        if self.elapsed <= 0:
+            return 0.0
+        return self.packets / self.elapsed
+
+    def _get_bps(self):
+        if self.elapsed <= 0:
+            return 0.0
+        return self.bytes * 8 / self.elapsed
 
-def _send_packets(packets, delay, interval, socket):
-    # delay before start
-    _sleep(delay)
-    sent_bits = []
-    for packet in packets:
-        sent_bits.append(socket.send(packet))
-        if interval:
-            _sleep(interval)
-    return sent_bits
+    pps = property(_get_pps, doc="achieved packets per second")
+    bps = property(_get_bps, doc="achieved bits per second")
+
+    def __str__(self):
+        return "%d packets, %d bytes in %.6fs (%.1f pps, %.1f bps)" % (
+                    self.packets, self.bytes, self.elapsed, self.pps,
+                    self.bps)
 
 class _DetachThread(threading.Thread):
-    def __init__(self, delay, packets, interval, socket):
-        super(DetachThread, self).__init__()
-        self._delay = delay
+    def __init__(self, scheduler, packets, delay, loop):
+        super(_DetachThread, self).__init__()
+        self.daemon = True
+        self._scheduler = scheduler
         self._packets = packets
-        self._interval = interval
-        self._socket = socket
+        self._delay = delay
+        self._loop = loop
 
     def run(self):
-        _send_packets(self._delay, self._packets, self._interval, self._socket)
+        self._scheduler._run(self._packets, self._delay, self._loop)
+
+class Scheduler(object):
+    """
+    Rate-controlled sending of packets.
+
+    Without any limit packets are sent as fast as possible.
+    """
+
+    def __init__(self, pps=None, bps=None, burst=1, interval=None,
+                                            socket=None, batch_size=None):
+        """
+        Create a new Scheduler().
+
+        @type pps: C{float}
+        @param pps: maximum packets per second
+
+        @type bps: C{float}
+        @param bps: maximum bits per second (packets' raw lengths)
+
+        @type burst: C{int}
+        @param burst: maximum number of packets sent at once after
+                      a break (size of the token bucket) (default: I{1})
+
+        @type interval: C{float}
+        @param interval: time in seconds after each packet
+
+        @type socket: C{umit.umpa.Socket}
+        @param socket: socket for sending, otherwise new umit.umpa.Socket()
+                       object is created (and closed at the end); packets
+                       are built once and passed to its send_raw() method
+                       if it has one
+
+        @type batch_size: C{int}
+        @param batch_size: maximum number of packets sent by one call
+                           (default: config['batch_size'])
+        """
+
+        for name, value in (('pps', pps), ('bps', bps),
+                            ('interval', interval)):
+            if value is not None and value <= 0:
+                raise UMPAException("%s has to be positive" % name)
+        if burst < 1:
+            raise UMPAException("burst has to be positive")
+
+        self.pps = pps
+        self.bps = bps
+        self.burst = burst
+        self.interval = interval
+        self.socket = socket
+        if batch_size is None:
+            batch_size = umit.umpa.config['batch_size']
+        self.batch_size = batch_size
+
+        self.stats = SendStats()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _cost(self, packet):
+        """
+        Return time in seconds which the packet (or the raw packet)
+        takes from the schedule.
+        """
+
+        cost = 0.0
+        if self.pps:
+            cost = 1.0 / self.pps
+        if self.bps:
+            if not isinstance(packet, str):
+                packet = packet.get_raw()
+            cost = max(cost, len(packet) * 8.0 / self.bps)
+        if self.interval:
+            cost = max(cost, self.interval)
+        return cost
+
+    def _send(self, send, batch, results):
+        """
+        Send packets at once and update statistics.
+        """
+
+        try:
+            sent_bytes = send(*batch)
+        except socket_error, msg:
+            # count packets sent before the error
+            self._count(getattr(msg, 'sent_bytes', []), results)
+            raise
+        self._count(sent_bytes, results)
+
+    def _count(self, sent_bytes, results):
+        """
+        Update statistics with sent bytes of packets.
+        """
+
+        self.stats.packets += len(sent_bytes)
+        self.stats.bytes += sum(sent_bytes)
+        if results is not None:
+            results.extend(sent_bytes)
+
+    def _iter(self, packets, loop):
+        """
+        Yield packets loop times (0 means infinity).
+        """
 
+        i = 0
+        while i < loop or loop == 0:
+            empty = True
+            for packet in packets:
+                empty = False
+                yield packet
+            if empty:
+                # nothing to repeat (e.g. an exhausted generator)
+                break
+            i += 1
+
+    def run(self, packets, delay=0, loop=1, results=None):
+        """
+        Send packets (blocking).
+
+        Statistics (the stats attribute) are reset by every run() and start().
+
+        @type packets: C{list}
+        @param packets: packets for sending (any iterable)
+
+        @type delay: C{float}
+        @param delay: delay before first sending (default: I{0})
+
+        @type loop: C{int}
+        @param loop: how many times packets are sent; 0 means until stop()
+                     is called (default: I{1})
+
+        @type results: C{list}
+        @param results: if passed, sent bytes of each packet are appended
+
+        @rtype: C{SendStats}
+        @return: statistics of sending.
+        """
+
+        self._stop.clear()
+        self.stats = SendStats()
+        return self._run(packets, delay, loop, results)
+
+    def _run(self, packets, delay=0, loop=1, results=None):
+        """
+        Send packets (blocking) with the current stop event and statistics.
+
+        It's called by run() and by the background thread of start().
+        """
+
+        socket = self.socket
+        if socket is None:
+            socket = umit.umpa.Socket()
+
+        # packets are built once (for the bps limit and for sending)
+        # if the socket can send raw packets
+        build = hasattr(socket, 'send_raw')
+        if build:
+            send = socket.send_raw
+        else:
+            send = socket.send
+
+        start = monotonic()
+        wait_until(start + delay)
+        stats = self.stats
+        batch = []
+        # theoretical arrival time of the next packet
+        tat = None
+        try:
+            for packet in self._iter(packets, loop):
+                if self._stop.isSet():
+                    break
+                if build:
+                    packet = packet.get_raw()
+                cost = self._cost(packet)
+                if cost:
+                    now = monotonic()
+                    tau = (self.burst - 1) * cost
+                    if tat is None:
+                        tat = now
+                    elif tat - tau > now:
+                        # not allowed yet, send due packets first
+                        if batch:
+                            self._send(send, batch, results)
+                            batch = []
+                        wait_until(tat - tau)
+                    else:
+                        # unused tokens are lost (except SLACK)
+                        tat = max(tat, now - tau - SLACK)
+                    tat += cost
+                batch.append(packet)
+                if len(batch) >= self.batch_size:
+                    self._send(send, batch, results)
+                    batch = []
+            if batch:
+                self._send(send, batch, results)
+            if self.interval and tat is not None and not self._stop.isSet():
+                # interval after the last packet too
+                wait_until(tat)
+        finally:
+            stats.elapsed = monotonic() - start
+            if self.socket is None:
+                socket.close()
+        return stats
+
+    def start(self, packets, delay=0, loop=0):
+        """
+        Send packets in the background.
+
+        @type packets: C{list}
+        @param packets: packets for sending (any iterable)
+
+        @type delay: C{float}
+        @param delay: delay before first sending (default: I{0})
+
+        @type loop: C{int}
+        @param loop: how many times packets are sent; 0 means until stop()
+                     is called (default: I{0})
+        """
+
+        if self.running:
+            raise UMPAException("the scheduler is already running")
+        self._stop.clear()
+        self.stats = SendStats()
+        self._thread = _DetachThread(self, packets, delay, loop)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Stop sending in the background and wait for the end.
+
+        @type timeout: C{float}
+        @param timeout: maximum time of waiting in seconds
+        """
+
+        self._stop.set()
+        self.join(timeout)
+
+    def join(self, timeout=None):
+        """
+        Wait until sending in the background is finished.
+
+        @type timeout: C{float}
+        @param timeout: maximum time of waiting in seconds
+        """
+
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _get_running(self):
+        return self._thread is not None and self._thread.isAlive()
+
+    running = property(_get_running, doc="True if sending in the background")
 
 def send(delay, packets=None, *args, **kwargs):
     """
@@ -84,16 +360,23 @@ def send(delay, packets=None, *args, **kwargs):
     @param kwargs: extra options, currently available are:
       - detach - send packets in the background (B{type}: C{bool})
       - interval - set interval between packets (B{type}: C{int}),
+      - pps - maximum packets per second (B{type}: C{float}),
+      - bps - maximum bits per second (B{type}: C{float}),
+      - burst - maximum number of packets sent at once (B{type}: C{int}),
       - socket - use passed socket, otherwise create new umit.umpa.Socket()
         object (B{type}: C{umit.umpa.Socket})
 
-    @rtype: C{list}
-    @return: sent bits of each packet (@note: only if detach=False).
+    @rtype: C{list} or C{Scheduler}
+    @return: sent bytes of each packet (one-element lists) or the running
+    scheduler if detach=True (use stop() or join() then).
     """
     # parsing passed options
     options = { 'detach'    : False,
                 'interval'  : None,
-                'socket'    : umit.umpa.Socket(),
+                'pps'       : None,
+                'bps'       : None,
+                'burst'     : 1,
+                'socket'    : None,
                 }
     for opt in kwargs:
         if opt not in options:
@@ -110,16 +393,22 @@ def send(delay, packets=None, *args, **kwargs):
         packets = [packets]
     packets.extend(args)
 
+    scheduler = Scheduler(options['pps'], options['bps'], options['burst'],
+                          options['interval'], options['socket'])
     # use threads if detach
     if options['detach']:
-        t = _DetachThread(packets, delay, options['interval'], options['socket'])
-        t.start()
+        scheduler.start(packets, delay, 1)
+        return scheduler
     else:
-        return _send_packets(packets, delay, options['interval'], options['socket'])
+        results = []
+        scheduler.run(packets, delay, results=results)
+        # a list for each packet, as returned by socket's send() before
+        # packets were sent in batches
+        return [ [sent] for sent in results ]
 
 def _send_schedule(self, delay, *packets, **options):
     """
-    Send packets with some delays (initial, interval).
+    Send packets with some delays (initial, interval) or rates.
 
     @type delay: C{int}
     @param delay: delay before first sending.
@@ -127,11 +416,7 @@ def _send_schedule(self, delay, *packets, **options):
     @type packets: C{Packet}
     @param packets: list of packets for sending.
 
-    @param options: extra options, currently available are:
-      - detach - send packets in the background (B{type}: C{bool})
-      - interval - set interval between packets (B{type}: C{int}),
-      - socket - use passed socket, otherwise create new umit.umpa.Socket()
-        object (B{type}: C{umit.umpa.Socket})
+    @param options: extra options as for send().
 
     @rtype: C{list}
     @return: sent bits of each packet.
@@ -139,4 +424,5 @@ def _send_schedule(self, delay, *packets, **options):
 
     return send(delay, socket=self, *packets, **options)
 
-umit.umpa.Socket.send_schedule = _send_schedule
+# every kind of sockets (INET, INET6, SocketL2) gets the method
+umit.umpa._sockets._Socket.send_schedule = _send_schedule
@@ -100,9 +100,12 @@ class ARP(_protocols.Protocol):
                     'opcode', 'srchw_mac', 'srcproto_ipv4', 'dsthw_mac',
                     'dstproto_ipv4',)
 
-    def __init__(self, **kwargs):
+    @classmethod
+    def _create_fields(cls):
         """
-        Create a new ARP().
+        Return new fields of the header.
+
+        See Protocol._create_fields() for details.
         """
 
         fields_list = [ _HHWType("Hardware Type"),
@@ -119,20 +122,19 @@ class ARP(_protocols.Protocol):
                         _fields.IPv4AddrField("Target IP Address",
                                             "127.0.0.1"),
                 ]
-
-        # call super.__init__ after prepared necessary data
-        super(ARP, self).__init__(fields_list, **kwargs)
+        fields = dict(zip(cls._ordered_fields, fields_list))
 
         # set __doc__ for fields - it's important if you want to get hints
         # in some frontends. E.g. Umit Project provides one...
-        self.get_field('srchw_mac').set_doc("Sender MAC address. "
+        fields['srchw_mac'].set_doc("Sender MAC address. "
                                         "See RFC 826 for more.")
-        self.get_field('srcproto_ipv4').set_doc("Sender IP address. "
+        fields['srcproto_ipv4'].set_doc("Sender IP address. "
                                             "See RFC 826 for more.")
-        self.get_field('dsthw_mac').set_doc("Target MAC address. "
+        fields['dsthw_mac'].set_doc("Target MAC address. "
                                         "See RFC 826 for more.")
-        self.get_field('dstproto_ipv4').set_doc("Target IP address. "
+        fields['dstproto_ipv4'].set_doc("Target IP address. "
                                             "See RFC 826 for more.")
+        return fields_list
 
     def _pre_raw(self, raw_value, bit, protocol_container, protocol_bits):
         """
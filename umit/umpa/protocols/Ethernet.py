@@ -70,13 +70,19 @@ class Ethernet(_protocols.Protocol):
 
     _ordered_fields = ('dst', 'src', '_type')
 
-    def __init__(self, **kwargs):
+    @classmethod
+    def _create_fields(cls):
+        """
+        Return new fields of the header.
+
+        See Protocol._create_fields() for details.
+        """
+
         fields_list = [ _fields.MACAddrField('Destination',
                                                         '00:00:00:00:00:00'),
                         _fields.MACAddrField('Source', '00:00:00:00:00:00'),
                         _HType('Type') ]
-
-        super(Ethernet, self).__init__(fields_list, **kwargs)
+        return fields_list
 
     def _pre_raw(self, raw_value, bit, protocol_container, protocol_bits):
         """
@@ -133,6 +139,18 @@ class Ethernet(_protocols.Protocol):
 
         return raw_value, bit
 
+    @classmethod
+    def _peek_raw(cls, buffer, offset):
+        """
+        Return the length of the header and the next protocol's type.
+
+        See Protocol._peek_raw() for details.
+        """
+
+        if len(buffer) < offset + 14:
+            return None
+        return 14, struct.unpack_from('!H', buffer, offset + 12)[0]
+
     def load_raw(self, buffer):
         """
         Load raw and update a protocol's fields.
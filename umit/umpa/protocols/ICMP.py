@@ -6,7 +6,7 @@ from umit.umpa.protocols import _consts
 from umit.umpa.protocols import _fields
 from umit.umpa.protocols import _protocols
 from umit.umpa.protocols import _layer4
-import umit.umpa.utils.net as _net
+import umit.umpa.utils.checksum as _cksum
 import umit.umpa.utils.bits as _bits
 
 __all__ = [ "ICMP", ]
@@ -372,9 +372,12 @@ class ICMP(_protocols.Protocol):
                        'data',
                        )
 
-    def __init__(self, **kwargs):
+    @classmethod
+    def _create_fields(cls):
         """
-        Create a new ICMP().
+        Return new fields of the header.
+
+        See Protocol._create_fields() for details.
         """
 
         fields_list = [ ### Fixed header part:
@@ -397,18 +400,17 @@ class ICMP(_protocols.Protocol):
                                               '0.0.0.0', active=False),
                         _fields.DataField("Data", ''),
                         ]
-
-        # we call super.__init__ after prepared necessary data
-        super(ICMP, self).__init__(fields_list, **kwargs)
+        fields = dict(zip(cls._ordered_fields, fields_list))
 
         # set __doc__ for fields - it's important if you want to get hints
         # in some frontends. E.g. Umit Project provides one...
-        self.get_field('_checksum').set_doc("Checksum of ICMP packet. "
+        fields['_checksum'].set_doc("Checksum of ICMP packet. "
             "See RFC 792 for more info.")
-        self.get_field('redir_gw').set_doc("ICMP Redirect destination. "
+        fields['redir_gw'].set_doc("ICMP Redirect destination. "
             "See RFC 792 for more info.")
-        self.get_field('addressmask').set_doc("Address Mask."
+        fields['addressmask'].set_doc("Address Mask."
             "See RFC 950 for more info.")
+        return fields_list
 
     def __setattr__(self, attr, value):
         """
@@ -461,21 +463,57 @@ class ICMP(_protocols.Protocol):
 
     def _post_raw(self, raw_value, bit, protocol_container, protocol_bits):
         """
+        Handle with fields after calling fillout() for them.
+
+        Calculate checksum (see _post_raw_buffer()).
+
+        @type raw_value: C{int}
+        @param raw_value: currently raw value for the packet.
+
+        @type bit: C{int}
+        @param bit: currently length of the protocol.
+
+        @type protocol_container: C{tuple}
+        @param protocol_container: tuple of protocols included in the packet.
+
+        @type protocol_bits: C{int}
+        @param protocol_bits: currently length of the packet.
+
+        @return: C{raw_value, bit}
         """
-        print "proto bit "
-        print protocol_bits
 
-        # Fill checksum only if it's zero (not supplied by user)
-        cksum_offset = bit - self.get_offset('_checksum') - \
-                       self.get_field('_checksum').bits
+        return self._post_raw_by_buffer(raw_value, bit, protocol_container,
+                                                                protocol_bits)
 
-        if _bits.get_bits(raw_value,self.get_field('_checksum').bits,cksum_offset,rev_offset=True) == 0:
+    def _post_raw_buffer(self, buffer, protocol_container, protocol_bits):
+        """
+        Handle with fields after packing them into the buffer.
 
-            # calculate checksum and place it at the correct offset in raw_value
-            cksum = _net.in_cksum(raw_value)
-            raw_value |= cksum << cksum_offset
+        Calculate checksum of the header and payloads of upper protocols.
 
-        return raw_value, bit
+        @type buffer: C{bytearray}
+        @param buffer: raw header of the protocol.
+
+        @type protocol_container: C{tuple}
+        @param protocol_container: tuple of protocols included in the packet.
+
+        @type protocol_bits: C{int}
+        @param protocol_bits: currently length of the packet.
+
+        @rtype: C{bytearray}
+        @return: raw header of the protocol.
+        """
+
+        cksum_offset = self._raw_offset('_checksum')
+        cksum_bits = self.get_field('_checksum').bits
+        # Fill checksum only if it's zero (not supplied by user)
+        if _bits.unpack_bits(buffer, cksum_offset, cksum_bits) == 0:
+            # the checksum covers the whole ICMP message
+            data = [ buffer ] + self._get_payload_buffers()
+            _bits.pack_bits(buffer, cksum_offset, cksum_bits,
+                                                    _cksum.in_cksum(data))
+
+        return buffer
 
     def load_raw(self, buffer):
         """
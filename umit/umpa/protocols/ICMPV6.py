@@ -30,7 +30,7 @@ from umit.umpa.protocols import _fields
 from umit.umpa.protocols import _protocols
 from umit.umpa.protocols import _layer4
 from umit.umpa.protocols import _layer4_ipv6
-import umit.umpa.utils.net as _net
+import umit.umpa.utils.checksum as _cksum
 import umit.umpa.utils.bits as _bits
 
 __all__ = [ "ICMPV6", ]
@@ -230,8 +230,12 @@ class ICMPV6(_protocols.Protocol):
                        'target_addr','dest_addr',
                        'data',
                        )
-    def __init__(self, **kwargs):
+    @classmethod
+    def _create_fields(cls):
         """
+        Return new fields of the header.
+
+        See Protocol._create_fields() for details.
         """
 
         fields_list = [ ### Fixed header part:
@@ -261,13 +265,13 @@ class ICMPV6(_protocols.Protocol):
                         _fields.IPv6AddrField("Destination IP Address",'0:0:0:0:0:0:0:1', active=False),                      
                         _fields.DataField("Data", ''),
                         ]
-
-        super(ICMPV6, self).__init__(fields_list, **kwargs)
+        fields = dict(zip(cls._ordered_fields, fields_list))
 
 
-        self.get_field('_checksum').set_doc("Checksum of ICMP packet. "
+        fields['_checksum'].set_doc("Checksum of ICMP packet. "
             "See RFC 2443 for more info.")
-            
+        return fields_list
+
     def __setattr__(self, attr, value):        
         """
         """
@@ -311,40 +315,61 @@ class ICMPV6(_protocols.Protocol):
 
     def _post_raw(self, raw_value, bit, protocol_container, protocol_bits):
         """
+        Handle with fields after calling fillout() for them.
+
+        Calculate checksum (see _post_raw_buffer()).
+
+        @type raw_value: C{int}
+        @param raw_value: currently raw value for the packet.
+
+        @type bit: C{int}
+        @param bit: currently length of the protocol.
+
+        @type protocol_container: C{tuple}
+        @param protocol_container: tuple of protocols included in the packet.
+
+        @type protocol_bits: C{int}
+        @param protocol_bits: currently length of the packet.
+
+        @return: C{raw_value, bit}
         """
-        
-        # Fill checksum only if it's zero (not supplied by user)
-        cksum_offset = bit - self.get_offset('_checksum') - \
-                       self.get_field('_checksum').bits
 
-        #self.get_field('_checksum')._tmp_value  = 32699
-        if _bits.get_bits(raw_value,self.get_field('_checksum').bits,cksum_offset,rev_offset=True) == 0:
+        return self._post_raw_by_buffer(raw_value, bit, protocol_container,
+                                                                protocol_bits)
 
-            # Payload
-            if self.payload:
-                cksum = self.payload.__dict__['__raw_value']
-            else:
-                cksum = 0
-            offset = protocol_bits
+    def _post_raw_buffer(self, buffer, protocol_container, protocol_bits):
+        """
+        Handle with fields after packing them into the buffer.
 
-            # TCP Header
-            cksum |= raw_value << offset
-            offset += bit
-            
-            # calculate checksum and place it at the correct offset in raw_value
-            total_length = offset
-            total_length /= 8
-            pheader = _layer4_ipv6.PseudoHeader6(self.protocol_id, total_length)
-            pheader_raw = pheader.get_raw(protocol_container, protocol_bits)[0]
-            cksum |= pheader_raw << offset
-            raw_cksum = _net.in_cksum(cksum)
-            cksum_cal = ((raw_cksum << 8) | (raw_cksum >> 8)) & 0xFFFF
-            raw_value |= cksum_cal << cksum_offset
-            #cksum = _net.in_cksum(raw_value)
-            #raw_value |= cksum << cksum_offset
-            #self.get_field('_checksum')._tmp_value  = 32699
-
-        return raw_value, bit
+        Calculate checksum of Pseudo Header, the header and payloads
+        of upper protocols.
+
+        @type buffer: C{bytearray}
+        @param buffer: raw header of the protocol.
+
+        @type protocol_container: C{tuple}
+        @param protocol_container: tuple of protocols included in the packet.
+
+        @type protocol_bits: C{int}
+        @param protocol_bits: currently length of the packet.
+
+        @rtype: C{bytearray}
+        @return: raw header of the protocol.
+        """
+
+        cksum_offset = self._raw_offset('_checksum')
+        cksum_bits = self.get_field('_checksum').bits
+        # Fill checksum only if it's zero (not supplied by user)
+        if _bits.unpack_bits(buffer, cksum_offset, cksum_bits) == 0:
+            # the checksum covers Pseudo Header and the whole ICMP message
+            total_length = len(buffer) + protocol_bits / _consts.BYTE
+            pheader = _layer4_ipv6.pseudo_header6(self.protocol_id,
+                                        total_length, protocol_container)
+            data = [ pheader, buffer ] + self._get_payload_buffers()
+            _bits.pack_bits(buffer, cksum_offset, cksum_bits,
+                                                    _cksum.in_cksum(data))
+
+        return buffer
 
     def load_raw(self, buffer):
         """
@@ -29,7 +29,7 @@ import struct
 from umit.umpa.protocols import _consts
 from umit.umpa.protocols import _fields
 from umit.umpa.protocols import _protocols
-import umit.umpa.utils.net as _net
+import umit.umpa.utils.checksum as _cksum
 import umit.umpa.utils.bits as _bits
 
 __all__ = [ "IP", ]
@@ -295,9 +295,12 @@ class IP(_protocols.Protocol):
                     '_frag_offset', 'ttl', '_proto', '_checksum', 'src', 'dst',
                     'options', '_padding',)
 
-    def __init__(self, **kwargs):
+    @classmethod
+    def _create_fields(cls):
         """
-        Create a new IP().
+        Return new fields of the header.
+
+        See Protocol._create_fields() for details.
         """
 
         tos = ('precedence0', 'precedence1', 'precedence2', 'delay',
@@ -327,32 +330,25 @@ class IP(_protocols.Protocol):
                                                                 "127.0.0.1"),
                         _fields.IntField("Options", 0),
                         _fields.PaddingField("Padding") ]
-
-        # we call super.__init__ after prepared necessary data
-        #
-        ##
-        #
-        #This the protocols.protocol
-        #
-        #
-        super(IP, self).__init__(fields_list, **kwargs)
+        fields = dict(zip(cls._ordered_fields, fields_list))
 
         # set __doc__ for fields - it's important if you want to get hints
         # in some frontends. E.g. Umit Project provides one...
-        self.get_field('tos').set_doc("The Type of Service "
+        fields['tos'].set_doc("The Type of Service "
             "provides an indication of the abstract parameters of the quality "
             "of service desired. See RFC 791 for more.")
-        self.get_field('flags').set_doc("Various Control Flags. See RFC 791 " 
+        fields['flags'].set_doc("Various Control Flags. See RFC 791 " 
             "for more.")
-        self.get_field('src').set_doc("The source address. "
+        fields['src'].set_doc("The source address. "
             "See RFC 791 for more.")
-        self.get_field('dst').set_doc("The destination "
+        fields['dst'].set_doc("The destination "
             "address. See RFC 791 for more.")
-        self.get_field('options').set_doc("The options may appear or not in "
+        fields['options'].set_doc("The options may appear or not in "
             "datagrams. See RFC 791 for more.")
-        self.get_field('_padding').set_doc("The internet header padding is "
+        fields['_padding'].set_doc("The internet header padding is "
             "used to ensure that the internet header ends on a 32 bit "
             "boundary. See RFC 791 for more.")
+        return fields_list
 
     def _pre_raw(self, raw_value, bit, protocol_container, protocol_bits):
         """
@@ -406,7 +402,7 @@ class IP(_protocols.Protocol):
         """
         Handle with fields after calling fillout() for them.
 
-        Calculate header checksum.
+        Calculate header checksum (see _post_raw_buffer()).
 
         @type raw_value: C{int}
         @param raw_value: currently raw value for the packet.
@@ -423,20 +419,55 @@ class IP(_protocols.Protocol):
         @return: C{raw_value, bit}
         """
 
+        return self._post_raw_by_buffer(raw_value, bit, protocol_container,
+                                                                protocol_bits)
+
+    def _post_raw_buffer(self, buffer, protocol_container, protocol_bits):
+        """
+        Handle with fields after packing them into the buffer.
+
+        Calculate header checksum.
+
+        @type buffer: C{bytearray}
+        @param buffer: raw header of the protocol.
+
+        @type protocol_container: C{tuple}
+        @param protocol_container: tuple of protocols included in the packet.
+
+        @type protocol_bits: C{int}
+        @param protocol_bits: currently length of the packet.
+
+        @rtype: C{bytearray}
+        @return: raw header of the protocol.
+        """
+
         # Header Checksum
         # a checksum on the header only.
-        cksum_offset = bit - self.get_offset('_checksum') - \
-                                    self.get_field('_checksum').bits
+        cksum_offset = self._raw_offset('_checksum')
+        cksum_bits = self.get_field('_checksum').bits
         # check if user doesn't provide own values of bits
-        if _bits.get_bits(raw_value,
-                        self.get_field('_checksum').bits,
-                        cksum_offset,
-                        rev_offset=True) == 0:
-            # calculate and add checksum to the raw_value
-            cksum = _net.in_cksum(raw_value)
-            raw_value |= cksum << cksum_offset
+        if _bits.unpack_bits(buffer, cksum_offset, cksum_bits) == 0:
+            # calculate and add checksum to the buffer
+            _bits.pack_bits(buffer, cksum_offset, cksum_bits,
+                                                    _cksum.in_cksum(buffer))
 
-        return raw_value, bit
+        return buffer
+
+    @classmethod
+    def _peek_raw(cls, buffer, offset):
+        """
+        Return the length of the header and the next protocol's type.
+
+        See Protocol._peek_raw() for details.
+        """
+
+        if len(buffer) < offset + 20:
+            return None
+        first, proto = struct.unpack_from('!B8xB', buffer, offset)
+        length = (first & 0x0f) * 4
+        if length < 20 or len(buffer) < offset + length:
+            return None
+        return length, proto
 
     def load_raw(self, buffer):
         """
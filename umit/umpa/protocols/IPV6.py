@@ -161,15 +161,18 @@ class IPV6(_protocols.Protocol):
 
 	layer = 3      # layer of OSI
 	protocol_id = _consts.ETHERTYPE_IPV6
-	payload_fieldname = '_proto'
+	payload_fieldname = '_nxt_hdr'
 	name = "IPV6"
 
 	_ordered_fields = ('_version','dscp','ds','_flow_label','_payload','_nxt_hdr','_hop_limit','src','dst',)
 
 
-	def __init__(self, **kwargs):
+	@classmethod
+	def _create_fields(cls):
 		"""
-		Create a new IPV6().
+		Return new fields of the header.
+
+		See Protocol._create_fields() for details.
 		"""
 
 		tos = ('ect','ecn_ce')
@@ -190,17 +193,18 @@ class IPV6(_protocols.Protocol):
 		
 		
 		#
-		super(IPV6, self).__init__(fields_list, **kwargs)
+		fields = dict(zip(cls._ordered_fields, fields_list))
 
 		# set __doc__ for fields - it's important if you want to get hints
 		# in some frontends. E.g. Umit Project provides one...
-		self.get_field('dscp').set_doc("This 6-bit field is similar in spirit to the ToS field in IPv4 but it is part 8 bit traffic class field")
-		self.get_field('_flow_label').set_doc("Used for specifying special router handling from source to destination(s) for a sequence of packets.")
-		self.get_field('_payload').set_doc("This 16-bit value is treated as an unsigned integer giving the number of bytes in the IPv6 datagram following 												the 40-byte packet header.")
-		self.get_field('_nxt_hdr').set_doc("Specifies the next encapsulated protocol. The values are compatible with those specified for the IPv4 protocol 												field.")
-		self.get_field('_hop_limit').set_doc("For each router that forwards the packet, the hop limit is decremented by 1. When the hop limit field 						      reaches zero, the packet is discarded. This replaces the TTL field in the IPv4 header that was originally 												intended to be used as a time based hop limit.")
-		self.get_field('src').set_doc("The IPv6 address of the sending node.")
-		self.get_field('dst').set_doc("The IPv6 address of the destination node.")
+		fields['dscp'].set_doc("This 6-bit field is similar in spirit to the ToS field in IPv4 but it is part 8 bit traffic class field")
+		fields['_flow_label'].set_doc("Used for specifying special router handling from source to destination(s) for a sequence of packets.")
+		fields['_payload'].set_doc("This 16-bit value is treated as an unsigned integer giving the number of bytes in the IPv6 datagram following 												the 40-byte packet header.")
+		fields['_nxt_hdr'].set_doc("Specifies the next encapsulated protocol. The values are compatible with those specified for the IPv4 protocol 												field.")
+		fields['_hop_limit'].set_doc("For each router that forwards the packet, the hop limit is decremented by 1. When the hop limit field 						      reaches zero, the packet is discarded. This replaces the TTL field in the IPv4 header that was originally 												intended to be used as a time based hop limit.")
+		fields['src'].set_doc("The IPv6 address of the sending node.")
+		fields['dst'].set_doc("The IPv6 address of the destination node.")
+		return fields_list
 
 	def _pre_raw(self, raw_value, bit, protocol_container, protocol_bits):
 		"""
@@ -226,6 +230,18 @@ class IPV6(_protocols.Protocol):
 
 		return raw_value, bit
 
+	@classmethod
+	def _peek_raw(cls, buffer, offset):
+		"""
+		Return the length of the header and the next protocol's type.
+
+		See Protocol._peek_raw() for details.
+		"""
+
+		if len(buffer) < offset + 40:
+			return None
+		return 40, struct.unpack_from('!B', buffer, offset + 6)[0]
+
 	def load_raw(self, buffer):
 		"""
 		"""
@@ -96,6 +96,20 @@ class _HData(Field):
 
         return raw
 
+    def fillout_raw(self):
+        """
+        Fillout the field for the buffer-based serialization.
+
+        The data is returned as it is, without converting to the number.
+
+        @rtype: C{str}
+        @return: raw data of the field.
+        """
+
+        if self._value is None:
+            return super(_HData, self).fillout_raw()
+        return self._value
+
 class Payload(Protocol):
     """
     Payload -- data of 5-7 layers of the OSI model.
@@ -120,12 +134,20 @@ class Payload(Protocol):
         former argument.
         """
 
-        fields_list = [ _HData("Data"), ]
-
         if payload is not None and 'data' not in kwargs:
             kwargs['data'] = payload
 
-        super(Payload, self).__init__(fields_list, **kwargs)
+        super(Payload, self).__init__(**kwargs)
+
+    @classmethod
+    def _create_fields(cls):
+        """
+        Return new fields of the header.
+
+        See Protocol._create_fields() for details.
+        """
+
+        return [ _HData("Data"), ]
 
     def _pre_raw(self, raw_value, bit, protocol_container, protocol_bits):
         """
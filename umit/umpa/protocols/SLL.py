@@ -102,15 +102,21 @@ class SLL(_protocols.Protocol):
     _ordered_fields = ('_pkttype', '_hatype', '_halen',
                         'src', '_blank', '_etype')
 
-    def __init__(self, **kwargs):
+    @classmethod
+    def _create_fields(cls):
+        """
+        Return new fields of the header.
+
+        See Protocol._create_fields() for details.
+        """
+
         fields_list = [ _HPacketType("Packet Type"),
                         _HHeaderAddressType("Header Address Type"),
                         _HHeaderAddressLength("Header Address Length"),
                         _fields.MACAddrField("Source", "00:00:00:00:00:00"),
                         _HBlank("Blank"),
                         _HProtocol("Protocol") ]
-
-        super(SLL, self).__init__(fields_list, **kwargs)
+        return fields_list
 
     def _pre_raw(self, raw_value, bit, protocol_container, protocol_bits):
         """
@@ -167,6 +173,18 @@ class SLL(_protocols.Protocol):
 
         return raw_value, bit
 
+    @classmethod
+    def _peek_raw(cls, buffer, offset):
+        """
+        Return the length of the header and the next protocol's type.
+
+        See Protocol._peek_raw() for details.
+        """
+
+        if len(buffer) < offset + 16:
+            return None
+        return 16, struct.unpack_from('!H', buffer, offset + 14)[0]
+
     def load_raw(self, buffer):
         """
         Load raw and update a protocol's fields.
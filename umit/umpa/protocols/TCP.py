@@ -30,7 +30,7 @@ from umit.umpa.protocols import _fields
 from umit.umpa.protocols import _protocols
 from umit.umpa.protocols import _layer4
 from umit.umpa.protocols import _layer4_ipv6
-import umit.umpa.utils.net as _net
+import umit.umpa.utils.checksum as _cksum
 import umit.umpa.utils.bits as _bits
 from umit.umpa.protocols.IPV6 import IPV6
 from umit.umpa.protocols.IP import IP
@@ -338,7 +338,7 @@ class _HPort(_fields.EnumField):
         "FIDO" : _consts.PORT_TCP_FIDO,
     }
 
-class _HSequenceNumber(_fields.IntField):
+class _HSequenceNumber(_fields.SpecialIntField):
     """
     The sequence number of the first data octet in this segment (except
     when SYN is present).
@@ -483,11 +483,13 @@ class TCP(_protocols.Protocol):
                     '_reserved', 'flags', '_window_size', '_checksum',
                     '_urgent_pointer', 'options', '_padding',)
 
-    def __init__(self, **kwargs):
+    @classmethod
+    def _create_fields(cls):
         """
-        Create a new TCP().
+        Return new fields of the header.
+
+        See Protocol._create_fields() for details.
         """
-        #print "in tcp.py init"
 
         control_bits = ('urg', 'ack', 'psh', 'rst', 'syn', 'fin')
         control_bits_predefined = dict.fromkeys(control_bits, 0)
@@ -505,27 +507,26 @@ class TCP(_protocols.Protocol):
                         _HUrgentPointer("Urgent Pointer"),
                         _fields.IntField("Options", 0),
                         _fields.PaddingField("Padding") ]
-
-        # we call super.__init__ after prepared necessary data
-        super(TCP, self).__init__(fields_list, **kwargs)
+        fields = dict(zip(cls._ordered_fields, fields_list))
 
         # set __doc__ for fields - it's important if you want to get hints
         # in some frontends. E.g. Umit Project provides one...
-        self.get_field('srcport').set_doc("The source port number. "
+        fields['srcport'].set_doc("The source port number. "
             "See RFC 793 for more.")
-        self.get_field('dstport').set_doc("The destination port "
+        fields['dstport'].set_doc("The destination port "
             "number. See RFC 793 for more.")
-        self.get_field('flags').set_doc("URG, ACK, PSH, RST, SYN, FIN "
+        fields['flags'].set_doc("URG, ACK, PSH, RST, SYN, FIN "
             "flags. See RFC 793 for more.")
-        self.get_field('_checksum').set_doc("Checksum of Pseudo Header, TCP "
+        fields['_checksum'].set_doc("Checksum of Pseudo Header, TCP "
             "header and data. See RFC 793 for more.")
-        self.get_field('options').set_doc("Options may occupy space at the "
+        fields['options'].set_doc("Options may occupy space at the "
             "end of the TCP header and are a multiple of 8 bits in length. "
             "See RFC 793 for more.")
-        self.get_field('_padding').set_doc("The TCP header padding is used "
+        fields['_padding'].set_doc("The TCP header padding is used "
             "to ensure that the TCP header ends and data begins on a 32 bit "
             "boundary. See RFC 793 for more.")
-        self.get_field('_seq')._tmp_value  = 1234
+        fields['_seq']._tmp_value = 1234
+        return fields_list
 
     def _pre_raw(self, raw_value, bit, protocol_container, protocol_bits):
         """
@@ -565,7 +566,7 @@ class TCP(_protocols.Protocol):
         """
         Handle with fields after calling fillout() for them.
 
-        Calculate header checksum with new instance of PseudoHeader object.
+        Calculate header checksum (see _post_raw_buffer()).
 
         @type raw_value: C{int}
         @param raw_value: currently raw value for the packet.
@@ -582,75 +583,74 @@ class TCP(_protocols.Protocol):
         @return: C{raw_value, bit}
         """
 
-        #print "in tcp.py files"
-        # rev_offset it the offset from the right side
-        cksum_rev_offset = bit - self.get_offset('_checksum') - \
-                                            self.get_field('_checksum').bits
+        return self._post_raw_by_buffer(raw_value, bit, protocol_container,
+                                                                protocol_bits)
+
+    def _post_raw_buffer(self, buffer, protocol_container, protocol_bits):
+        """
+        Handle with fields after packing them into the buffer.
+
+        Calculate checksum of Pseudo Header, the header and payloads
+        of upper protocols.
+
+        @type buffer: C{bytearray}
+        @param buffer: raw header of the protocol.
+
+        @type protocol_container: C{tuple}
+        @param protocol_container: tuple of protocols included in the packet.
+
+        @type protocol_bits: C{int}
+        @param protocol_bits: currently length of the packet.
+
+        @rtype: C{bytearray}
+        @return: raw header of the protocol.
+        """
+
+        cksum_offset = self._raw_offset('_checksum')
+        cksum_bits = self.get_field('_checksum').bits
         # checking if user not defined his own value of checksum
-        if _bits.get_bits(raw_value, self.get_field('_checksum').bits,
-                                    cksum_rev_offset, rev_offset=True) == 0:
-            # Payload
-            if self.payload:
-                cksum = self.payload.__dict__['__raw_value']
-            else:
-                cksum = 0
-            offset = protocol_bits
-
-            # TCP Header
-            cksum |= raw_value << offset
-            offset += bit
-
-            # Pseudo Header
-            #
-            # TCP header length...converted to bits unit
-            total_length = self.get_field('_hdr_len').fillout()*32
-            # add payload
-            #print "prot bit value"
-            #print offset
-            total_length += protocol_bits
-            # conversion to bytes unit
-            total_length /= 8
-
-            # create pseudo header object
-            #in _layer4 also need to add ipv6 notation
-            #
-            it = iter(protocol_container)
-            for proto in it:
-                if isinstance(proto, IPV6):
-                    #print "i am here "
-                    pheader = _layer4_ipv6.PseudoHeader6(self.protocol_id, total_length)
-                    pheader_raw = pheader.get_raw(protocol_container, protocol_bits)[0]
-                    cksum |= pheader_raw << offset
-                    raw_cksum = _net.in_cksum(cksum)
-                    #print "proto in tcp checksum"
-                    #print proto.src
-                    #print proto.dst
-                    #print "==========================="
-                    if proto.dst == '0000:0000:0000:0000:0000:0000:0000:0001' and proto.src == '0000:0000:0000:0000:0000:0000:0000:0001':
-                        cksum_cal = ((raw_cksum << 8) | (raw_cksum >> 8)) & 0xFFFF
-                    else:
-                        cksum_cal = raw_cksum
-                    #cksum_cal = ((raw_cksum << 8) | (raw_cksum >> 8)) & 0xFFFF
-                    
-                    raw_value |= cksum_cal << cksum_rev_offset
-                elif isinstance(proto, IP):
-                    pheader = _layer4.PseudoHeader(self.protocol_id, total_length)
-                    pheader_raw = pheader.get_raw(protocol_container, protocol_bits)[0]
-                    cksum |= pheader_raw << offset
-                    raw_cksum = _net.in_cksum(cksum)
-                    raw_value |= raw_cksum << cksum_rev_offset
-                    
-            #pheader = _layer4.PseudoHeader(self.protocol_id, total_length)
-            # generate raw value of it
-            #pheader_raw = pheader.get_raw(protocol_container, protocol_bits)[0]
-            # added pseudo header bits to cksum value
-            #cksum |= pheader_raw << offset
-
-            # finally, calcute and apply checksum
-            #raw_cksum = _net.in_cksum(cksum)
-            #raw_value |= raw_cksum << cksum_rev_offset
+        if _bits.unpack_bits(buffer, cksum_offset, cksum_bits) != 0:
+            return buffer
+
+        # TCP header length (in 32-bit words) and payload in bytes
+        total_length = self.get_field('_hdr_len').fillout()*4 + \
+                                        protocol_bits / _consts.BYTE
+
+        # Pseudo Header depends on the version of IP
+        for proto in protocol_container:
+            if isinstance(proto, IPV6):
+                pheader = _layer4_ipv6.pseudo_header6(self.protocol_id,
+                                        total_length, protocol_container)
+                break
+            elif isinstance(proto, IP):
+                pheader = _layer4.pseudo_header(self.protocol_id,
+                                        total_length, protocol_container)
+                break
+        else:
+            # there is none IP instance, so the checksum can't be calculated
+            return buffer
+
+        # finally, calcute and apply checksum
+        data = [ pheader, buffer ] + self._get_payload_buffers()
+        _bits.pack_bits(buffer, cksum_offset, cksum_bits,
+                                                    _cksum.in_cksum(data))
+
+        return buffer
+
+    @classmethod
+    def _peek_raw(cls, buffer, offset):
+        """
+        Return the length of the header and the next protocol's type.
 
-        return raw_value, bit
+        See Protocol._peek_raw() for details.
+        """
+
+        if len(buffer) < offset + 20:
+            return None
+        length = (struct.unpack_from('!B', buffer, offset + 12)[0] >> 4) * 4
+        if length < 20 or len(buffer) < offset + length:
+            return None
+        return length, None
 
     def load_raw(self, buffer):
         """
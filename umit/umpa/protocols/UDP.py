@@ -30,7 +30,7 @@ from umit.umpa.protocols import _fields
 from umit.umpa.protocols import _protocols
 from umit.umpa.protocols import _layer4
 from umit.umpa.protocols import _layer4_ipv6
-import umit.umpa.utils.net as _net
+import umit.umpa.utils.checksum as _cksum
 import umit.umpa.utils.bits as _bits
 from umit.umpa.protocols.IPV6 import IPV6
 from umit.umpa.protocols.IP import IP
@@ -292,27 +292,29 @@ class UDP(_protocols.Protocol):
 
     _ordered_fields = ('srcport', 'dstport', '_length', '_checksum')
 
-    def __init__(self, **kwargs):
+    @classmethod
+    def _create_fields(cls):
         """
-        Create a new UDP().
+        Return new fields of the header.
+
+        See Protocol._create_fields() for details.
         """
 
         fields_list = [ _HPort("Source Port", 0),
                         _HPort("Destination Port", 0),
                         _HLength("Length"),
                         _layer4.Layer4ChecksumField("Checksum"), ]
-
-        # we call super.__init__ after prepared necessary data
-        super(UDP, self).__init__(fields_list, **kwargs)
+        fields = dict(zip(cls._ordered_fields, fields_list))
 
         # set __doc__ for fields - it's important if you want to get hints
         # in some frontends. E.g. Umit Project provides one...
-        self.get_field('srcport').set_doc("The source port number. "
+        fields['srcport'].set_doc("The source port number. "
             "See RFC 768 for more.")
-        self.get_field('dstport').set_doc("The destination port "
+        fields['dstport'].set_doc("The destination port "
             "number. See RFC 768 for more.")
-        self.get_field('_checksum').set_doc("Checksum of Pseudo Header, UDP "
+        fields['_checksum'].set_doc("Checksum of Pseudo Header, UDP "
             "header and data. See RFC 768 for more.")
+        return fields_list
 
     def _pre_raw(self, raw_value, bit, protocol_container, protocol_bits):
         """
@@ -344,7 +346,7 @@ class UDP(_protocols.Protocol):
         """
         Handle with fields after calling fillout() for them.
 
-        Calculate header checksum with new instance of PseudoHeader object.
+        Calculate header checksum (see _post_raw_buffer()).
 
         @type raw_value: C{int}
         @param raw_value: currently raw value for the packet.
@@ -361,58 +363,70 @@ class UDP(_protocols.Protocol):
         @return: C{raw_value, bit}
         """
 
-        cksum_rev_offset = 0
+        return self._post_raw_by_buffer(raw_value, bit, protocol_container,
+                                                                protocol_bits)
+
+    def _post_raw_buffer(self, buffer, protocol_container, protocol_bits):
+        """
+        Handle with fields after packing them into the buffer.
+
+        Calculate checksum of Pseudo Header, the header and payloads
+        of upper protocols.
+
+        @type buffer: C{bytearray}
+        @param buffer: raw header of the protocol.
+
+        @type protocol_container: C{tuple}
+        @param protocol_container: tuple of protocols included in the packet.
+
+        @type protocol_bits: C{int}
+        @param protocol_bits: currently length of the packet.
+
+        @rtype: C{bytearray}
+        @return: raw header of the protocol.
+        """
+
+        cksum_offset = self._raw_offset('_checksum')
+        cksum_bits = self.get_field('_checksum').bits
         # checking if user not defined his own value of checksum
-        if _bits.get_bits(raw_value, self.get_field('_checksum').bits,
-                                    cksum_rev_offset, rev_offset=True) == 0:
-            # Payload
-            if self.payload:
-                cksum = self.payload.__dict__['__raw_value']
-            else:
-                cksum = 0
-            offset = protocol_bits
-
-            # UDP Header
-            cksum |= raw_value << offset
-            offset += bit
-
-            # Pseudo Header
-            #
-            # create pseudo header object
-            it = iter(protocol_container)
-            for proto in it:
-                if isinstance(proto, IPV6):
-                    pheader = _layer4_ipv6.PseudoHeader6(self.protocol_id,self.get_field('_length').fillout())
-                    pheader_raw = pheader.get_raw(protocol_container, protocol_bits)[0]
-                    cksum |= pheader_raw << offset
-                    raw_cksum = _net.in_cksum(cksum)
-                    if proto.dst == '0000:0000:0000:0000:0000:0000:0000:0001' and proto.src == '0000:0000:0000:0000:0000:0000:0000:0001':
-                        cksum_cal = ((raw_cksum << 8) | (raw_cksum >> 8)) & 0xFFFF
-                    else:
-                        cksum_cal = raw_cksum
-                        
-                    #cksum_cal = ((raw_cksum << 8) | (raw_cksum >> 8)) & 0xFFFF
-                    #cksum_cal = raw_cksum
-                    raw_value |= cksum_cal << cksum_rev_offset
-                elif isinstance(proto, IP):
-                    pheader = _layer4.PseudoHeader(self.protocol_id,self.get_field('_length').fillout())
-                    pheader_raw = pheader.get_raw(protocol_container, protocol_bits)[0]
-                    cksum |= pheader_raw << offset
-                    raw_cksum = _net.in_cksum(cksum)
-                    raw_value |= raw_cksum << cksum_rev_offset
-                    
-            #pheader = _layer4.PseudoHeader(self.protocol_id,self.get_field('_length').fillout())
-            
-            # generate raw value of it
-            #pheader_raw = pheader.get_raw(protocol_container, protocol_bits)[0]
-            # added pseudo header bits to cksum value
-            #cksum |= pheader_raw << offset
-
-            # finally, calcute and apply checksum
-            #raw_cksum = _net.in_cksum(cksum)
-            #raw_value |= raw_cksum << cksum_rev_offset
+        if _bits.unpack_bits(buffer, cksum_offset, cksum_bits) != 0:
+            return buffer
+
+        # UDP header and payload in bytes
+        total_length = self.get_field('_length').fillout()
+
+        # Pseudo Header depends on the version of IP
+        for proto in protocol_container:
+            if isinstance(proto, IPV6):
+                pheader = _layer4_ipv6.pseudo_header6(self.protocol_id,
+                                        total_length, protocol_container)
+                break
+            elif isinstance(proto, IP):
+                pheader = _layer4.pseudo_header(self.protocol_id,
+                                        total_length, protocol_container)
+                break
+        else:
+            # there is none IP instance, so the checksum can't be calculated
+            return buffer
+
+        # finally, calcute and apply checksum
+        data = [ pheader, buffer ] + self._get_payload_buffers()
+        _bits.pack_bits(buffer, cksum_offset, cksum_bits,
+                                                    _cksum.in_cksum(data))
+
+        return buffer
+
+    @classmethod
+    def _peek_raw(cls, buffer, offset):
+        """
+        Return the length of the header and the next protocol's type.
 
-        return raw_value, bit
+        See Protocol._peek_raw() for details.
+        """
+
+        if len(buffer) < offset + 8:
+            return None
+        return 8, None
 
     def load_raw(self, buffer):
         """
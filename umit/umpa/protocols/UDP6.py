@@ -29,7 +29,7 @@ from umit.umpa.protocols import _consts
 from umit.umpa.protocols import _fields
 from umit.umpa.protocols import _protocols
 from umit.umpa.protocols import _layer4_ipv6
-import umit.umpa.utils.net as _net
+import umit.umpa.utils.checksum as _cksum
 import umit.umpa.utils.bits as _bits
 
 __all__ = [ "UDP6", ]
@@ -276,27 +276,29 @@ class UDP6(_protocols.Protocol):
 
     _ordered_fields = ('srcport', 'dstport', '_length', '_checksum')
 
-    def __init__(self, **kwargs):
+    @classmethod
+    def _create_fields(cls):
         """
-        Create a new UDP().
+        Return new fields of the header.
+
+        See Protocol._create_fields() for details.
         """
 
         fields_list = [ _HPort("Source Port", 0),
                         _HPort("Destination Port", 0),
                         _HLength("Length"),
                         _layer4_ipv6.Layer4ChecksumField("Checksum"), ]
-
-        # we call super.__init__ after prepared necessary data
-        super(UDP6, self).__init__(fields_list, **kwargs)
+        fields = dict(zip(cls._ordered_fields, fields_list))
 
         # set __doc__ for fields - it's important if you want to get hints
         # in some frontends. E.g. Umit Project provides one...
-        self.get_field('srcport').set_doc("The source port number. "
+        fields['srcport'].set_doc("The source port number. "
             "See RFC 768 for more.")
-        self.get_field('dstport').set_doc("The destination port "
+        fields['dstport'].set_doc("The destination port "
             "number. See RFC 768 for more.")
-        self.get_field('_checksum').set_doc("Checksum of Pseudo Header, UDP "
+        fields['_checksum'].set_doc("Checksum of Pseudo Header, UDP "
             "header and data. See RFC 768 for more.")
+        return fields_list
 
     def _pre_raw(self, raw_value, bit, protocol_container, protocol_bits):
         """
@@ -309,39 +311,79 @@ class UDP6(_protocols.Protocol):
 
     def _post_raw(self, raw_value, bit, protocol_container, protocol_bits):
         """
+        Handle with fields after calling fillout() for them.
+
+        Calculate header checksum (see _post_raw_buffer()).
+
+        @type raw_value: C{int}
+        @param raw_value: currently raw value for the packet.
+
+        @type bit: C{int}
+        @param bit: currently length of the protocol.
+
+        @type protocol_container: C{tuple}
+        @param protocol_container: tuple of protocols included in the packet.
+
+        @type protocol_bits: C{int}
+        @param protocol_bits: currently length of the packet.
+
+        @return: C{raw_value, bit}
+        """
+
+        return self._post_raw_by_buffer(raw_value, bit, protocol_container,
+                                                                protocol_bits)
+
+    def _post_raw_buffer(self, buffer, protocol_container, protocol_bits):
+        """
+        Handle with fields after packing them into the buffer.
+
+        Calculate checksum of Pseudo Header, the header and payloads
+        of upper protocols.
+
+        @type buffer: C{bytearray}
+        @param buffer: raw header of the protocol.
+
+        @type protocol_container: C{tuple}
+        @param protocol_container: tuple of protocols included in the packet.
+
+        @type protocol_bits: C{int}
+        @param protocol_bits: currently length of the packet.
+
+        @rtype: C{bytearray}
+        @return: raw header of the protocol.
         """
 
-        cksum_rev_offset = 0
+        cksum_offset = self._raw_offset('_checksum')
+        cksum_bits = self.get_field('_checksum').bits
         # checking if user not defined his own value of checksum
-        if _bits.get_bits(raw_value, self.get_field('_checksum').bits,
-                                    cksum_rev_offset, rev_offset=True) == 0:
-            # Payload
-            if self.payload:
-                cksum = self.payload.__dict__['__raw_value']
-            else:
-                cksum = 0
-            offset = protocol_bits
-
-            # UDP Header
-            cksum |= raw_value << offset
-            offset += bit
-
-            # Pseudo Header
-            #
-            # create pseudo header object
-            pheader = _layer4_ipv6.PseudoHeader(self.protocol_id,
-                                        self.get_field('_length').fillout())
-            # generate raw value of it
-            pheader_raw = pheader.get_raw(protocol_container, protocol_bits)[0]
-            # added pseudo header bits to cksum value
-            cksum |= pheader_raw << offset
-
-            # finally, calcute and apply checksum
-            raw_cksum = _net.in_cksum(cksum)
-            cksum_cal = ((raw_cksum << 8) | (raw_cksum >> 8)) & 0xFFFF
-            raw_value |= cksum_cal << cksum_rev_offset
+        if _bits.unpack_bits(buffer, cksum_offset, cksum_bits) != 0:
+            return buffer
 
-        return raw_value, bit
+        # UDP header and payload in bytes
+        total_length = self.get_field('_length').fillout()
+
+        # Pseudo Header
+        pheader = _layer4_ipv6.pseudo_header6(self.protocol_id, total_length,
+                                                        protocol_container)
+
+        # finally, calcute and apply checksum
+        data = [ pheader, buffer ] + self._get_payload_buffers()
+        _bits.pack_bits(buffer, cksum_offset, cksum_bits,
+                                                    _cksum.in_cksum(data))
+
+        return buffer
+
+    @classmethod
+    def _peek_raw(cls, buffer, offset):
+        """
+        Return the length of the header and the next protocol's type.
+
+        See Protocol._peek_raw() for details.
+        """
+
+        if len(buffer) < offset + 8:
+            return None
+        return 8, None
 
     def load_raw(self, buffer):
         """
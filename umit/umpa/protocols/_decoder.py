@@ -19,61 +19,250 @@
 # along with this library; if not, write to the Free Software Foundation, 
 # Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA 
 
+
+"""
+Decoding of raw packets.
+
+Protocols are found by a dispatch table which maps (layer, type) pairs
+to protocols' classes, e.g. (3, ETHERTYPE_IP) to IP. The table is built
+once and rebuilt only if local protocols change.
+
+Use Decoder objects to decode streams of packets of the same datalink.
+"""
+
+import struct
+
 import umit.umpa
 import umit.umpa.protocols
 from umit.umpa.protocols import Payload
 
-def _prepare_protos():
-    d = {2:[], 3:[], 4:[], 5:[]}
-    for cls in umit.umpa.protocols.get_all().values():
-        d[cls.layer].append(cls)
-    return d
+_table = None
+_table_locals = None
 
-def decode(buffer, linktype):
+def _get_table():
     """
-    Decode raw buffer of packet and return umit.umpa.Packet's object.
-    
-    @param buffer: raw buffer
+    Return the dispatch table of protocols.
 
-    @type linktype: C{int}
-    @param linktype: datalink of 2nd layer
-    (return by datalink() method of pcap session)
+    Keys are (layer, protocol_id) tuples, values are protocols' classes.
+    If more protocols have the same key, the first one returned by
+    umit.umpa.protocols.get_all() is used.
 
-    @rtype: C{umit.umpa.Packet}
-    @return: decoded packet
+    @rtype: C{dict}
+    @return: the dispatch table.
+    """
+
+    global _table, _table_locals
+
+    local_protos = umit.umpa.protocols.get_locals()
+    if _table is None or local_protos != _table_locals:
+        table = {}
+        for cls in umit.umpa.protocols.get_all().values():
+            table.setdefault((cls.layer, cls.protocol_id), cls)
+        _table = table
+        _table_locals = local_protos.copy()
+    return _table
+
+class Decoder(object):
     """
+    Decoder of raw packets of the same datalink.
+
+    >>> decoder = Decoder(session.datalink(), lazy=True)
+    >>> packet = decoder.decode(session.next()[1])
+    """
+
+    def __init__(self, linktype, lazy=False):
+        """
+        Create a new Decoder().
+
+        @type linktype: C{int}
+        @param linktype: datalink of 2nd layer
+        (return by datalink() method of pcap session)
+
+        @type lazy: C{bool}
+        @param lazy: decode protocols on demand (default: I{False})
+        """
+
+        self.linktype = linktype
+        self.lazy = lazy
+
+    def decode(self, buffer):
+        """
+        Decode raw buffer of packet and return umit.umpa.Packet's object.
+
+        @param buffer: raw buffer
+
+        @rtype: C{umit.umpa.Packet}
+        @return: decoded packet
+        """
+
+        if self.lazy:
+            return self._decode_lazy(buffer, _get_table())
+        return self._decode(buffer, _get_table())
+
+    def _decode(self, buffer, table):
+        """
+        Decode all protocols of the packet.
+
+        @param buffer: raw buffer
+
+        @type table: C{dict}
+        @param table: the dispatch table
+
+        @rtype: C{umit.umpa.Packet}
+        @return: decoded packet
+        """
+
+        packet = umit.umpa.Packet(strict=False, warn=False)
+
+        # XXX: currently there is no protocols in upper layers (above 4th layer)
+        #      propably if they would be implemented - some changes are needed
+        #      to detect what protocol it is
+        #      statical version of decode was existing till r5043
+        next_type = self.linktype
+        layer = 2
+        while next_type:
+            proto = table.get((layer, next_type))
+            if proto is None:
+                header = Payload()
+                header.load_raw(buffer)
+                packet.include(header)
+                return packet
+
+            header = proto()
+            buffer = header.load_raw(buffer)
+            if header.payload_fieldname:
+                next_type = getattr(header, header.payload_fieldname)
+            else:
+                next_type = None
+            packet.include(header)
+            layer += 1
+
+        # payload
+        if len(buffer) > 0:
+            data = Payload()
+            data.load_raw(buffer)
+            packet.include(data)
+
+        return packet
+
+    def _decode_lazy(self, buffer, table):
+        """
+        Decode the packet in the lazy mode.
 
-    protos = _prepare_protos()
-    packet = umit.umpa.Packet(strict=False, warn=False)
-
-    # XXX: currently there is no protocols in upper layers (above 4th layer)
-    #      propably if they would be implemented - some changes are needed
-    #      to detect what protocol it is
-    #      statical version of decode was existing till r5043
-    next_type = linktype
-    layer = 2
-    while next_type:
-        for proto in protos[layer]:
-            if next_type == proto.protocol_id:
+        Protocols which don't implement _peek_raw() are decoded normally.
+
+        @param buffer: raw buffer
+
+        @type table: C{dict}
+        @param table: the dispatch table
+
+        @rtype: C{umit.umpa.Packet}
+        @return: decoded packet
+        """
+
+        packet = umit.umpa.Packet(strict=False, warn=False)
+
+        length = len(buffer)
+        offset = 0
+        next_type = self.linktype
+        layer = 2
+        while next_type:
+            proto = table.get((layer, next_type))
+            if proto is None:
+                packet.include(Payload._new_lazy(buffer, offset))
+                return packet
+
+            info = proto._peek_raw(buffer, offset)
+            if info is None:
                 header = proto()
-                buffer = header.load_raw(buffer)
+                offset = length - len(header.load_raw(buffer[offset:]))
                 if header.payload_fieldname:
                     next_type = getattr(header, header.payload_fieldname)
                 else:
                     next_type = None
-                packet.include(header)
-                break
-        else:
-            header = Payload()
-            header.load_raw(buffer)
+            else:
+                header = proto._new_lazy(buffer, offset)
+                header_length, next_type = info
+                offset += header_length
             packet.include(header)
-            return packet
-        layer += 1
+            layer += 1
+
+        # payload
+        if offset < length:
+            packet.include(Payload._new_lazy(buffer, offset))
+
+        return packet
+
+    def headers(self, buffer):
+        """
+        Find headers of the packet without creating protocols' objects.
+
+        Protocols which don't implement _peek_raw() are decoded to find
+        the length of their headers. If such a header can't be decoded
+        (e.g. it's truncated), the rest of the packet is the payload.
+
+        @param buffer: raw buffer
+
+        @rtype: C{list}
+        @return: (protocol's class, offset in bytes) tuples; the payload
+        (if any) is the last one.
+        """
+
+        table = _get_table()
+        headers = []
+        length = len(buffer)
+        offset = 0
+        next_type = self.linktype
+        layer = 2
+        while next_type:
+            proto = table.get((layer, next_type))
+            if proto is None:
+                break
+
+            info = proto._peek_raw(buffer, offset)
+            if info is None:
+                header = proto()
+                try:
+                    rest = header.load_raw(buffer[offset:])
+                except struct.error:
+                    break
+                headers.append((proto, offset))
+                offset = length - len(rest)
+                if header.payload_fieldname:
+                    next_type = getattr(header, header.payload_fieldname)
+                else:
+                    next_type = None
+            else:
+                headers.append((proto, offset))
+                header_length, next_type = info
+                offset += header_length
+            layer += 1
+
+        if offset < length:
+            headers.append((Payload, offset))
+        return headers
+
+def decode(buffer, linktype, lazy=False):
+    """
+    Decode raw buffer of packet and return umit.umpa.Packet's object.
+
+    In the lazy mode only the types and offsets of headers are found.
+    Fields of a protocol are loaded on the first access to the protocol's
+    attributes, so it's much faster if only some fields are checked.
+
+    Use a Decoder object to decode many packets.
     
-    # payload
-    if len(buffer) > 0:
-        data = Payload()
-        data.load_raw(buffer)
-        packet.include(data)
+    @param buffer: raw buffer
+
+    @type linktype: C{int}
+    @param linktype: datalink of 2nd layer
+    (return by datalink() method of pcap session)
+
+    @type lazy: C{bool}
+    @param lazy: decode protocols on demand (default: I{False})
+
+    @rtype: C{umit.umpa.Packet}
+    @return: decoded packet
+    """
 
-    return packet
+    return Decoder(linktype, lazy).decode(buffer)
@@ -27,6 +27,12 @@ of a Field class or of a subclass thereof (especially some generic subclasses
 provided by this module).
 
 Use these fields' classes to create new implementation of any protocols.
+
+Fields use __slots__ to keep packets small (there are dozens of fields
+in every packet). Subclasses get empty __slots__ automatically, so declare
+__slots__ explicitly if new instance attributes are needed. Class-level
+values of slotted attributes (e.g. bits or auto) are defaults of instance
+attributes.
 """
 
 import types
@@ -34,6 +40,104 @@ import types
 from umit.umpa.utils.exceptions import UMPAException, UMPAAttributeException
 from umit.umpa.utils.bits import BYTE, str_to_bits
 
+# addresses (as strings) already validated by AddrField._is_valid()
+# keyed by (separator, base, piece_size, pieces_amount, address)
+_valid_addrs = {}
+_VALID_ADDRS_MAX = 1024
+
+class _Doc(object):
+    """
+    Docstring of a field's class which may be overridden by instances.
+
+    See Field.set_doc().
+    """
+
+    def __init__(self, text):
+        self.text = text
+
+    def __get__(self, obj, cls):
+        if obj is None or obj._doc is None:
+            return self.text
+        return obj._doc
+
+    def __set__(self, obj, text):
+        obj._doc = text
+
+def _default(name):
+    """
+    Return a property of the metaclass for the default value of attribute.
+    """
+
+    key = '_default_' + name
+    def get(cls):
+        return getattr(cls, key)
+    def set(cls, value):
+        setattr(cls, key, value)
+    return property(get, set)
+
+def _make_copier(slots):
+    """
+    Return a function which copies the slots of a field.
+
+    Generated assignments are a few times faster than a loop
+    with getattr()/setattr() (see Field.__copy__()).
+
+    @type slots: C{tuple}
+    @param slots: names of slots.
+
+    @return: function which takes the field and returns the copy.
+    """
+
+    lines = [ "def copy(field, new=object.__new__):",
+              "    result = new(field.__class__)" ]
+    lines += [ "    result.%s = field.%s" % (slot, slot) for slot in slots ]
+    lines.append("    return result")
+    namespace = {}
+    exec "\n".join(lines) in namespace
+    return namespace['copy']
+
+class _FieldType(type):
+    """
+    Metaclass of fields.
+
+    Add empty __slots__ to classes which don't define them, so instances
+    have no __dict__. Class-level values of attributes which are slots
+    (e.g. bits) would hide the slots, so they are stored as _default_<name>
+    attributes. Instances are initialized with these defaults.
+
+    All slots of the class (with inherited ones) are listed in _all_slots
+    and copied by the generated _copy_slots() (see Field.__copy__()).
+    """
+
+    def __new__(mcs, name, bases, dct):
+        dct.setdefault('__slots__', ())
+        slots = set(dct['__slots__'])
+        for base in bases:
+            for cls in base.__mro__:
+                slots.update(cls.__dict__.get('__slots__', ()))
+        for attr in _FieldType._defaults:
+            if attr in dct and attr in slots:
+                dct['_default_' + attr] = dct.pop(attr)
+        dct['__doc__'] = _Doc(dct.get('__doc__'))
+        cls = super(_FieldType, mcs).__new__(mcs, name, bases, dct)
+        cls._all_slots = tuple([ slot for base in reversed(cls.__mro__)
+                            for slot in base.__dict__.get('__slots__', ()) ])
+        cls._copy_slots = staticmethod(_make_copier(cls._all_slots))
+        return cls
+
+    _defaults = ('bits', 'auto', 'active', 'enumerable', 'separator', 'base',
+                 'piece_size', 'pieces_amount')
+
+    # class-level access, e.g. IPv4AddrField.bits
+    bits = _default('bits')
+    auto = _default('auto')
+    active = _default('active')
+    enumerable = _default('enumerable')
+    separator = _default('separator')
+    base = _default('base')
+    piece_size = _default('piece_size')
+    pieces_amount = _default('pieces_amount')
+
 class Field(object):
     """
     Superclass for any fields.
@@ -47,6 +151,10 @@ class Field(object):
     like the one provided by Umit Project.
     """
 
+    __metaclass__ = _FieldType
+    __slots__ = ('name', '_value', 'bits', 'auto', 'active', '_shortname',
+                                                                    '_doc')
+
     bits = 0
     auto = False
     active = True
@@ -69,13 +177,17 @@ class Field(object):
 
         self.name = name
         self.active = active
+        self._shortname = None
+        self._doc = None
         if auto is not None:
             self.auto = auto
         else:
-            self.auto = self.__class__.auto
+            self.auto = self._default_auto
 
         if bits is not None:
             self.bits = bits
+        else:
+            self.bits = self._default_bits
         if value is None:
             self._value = None
         # XXX hack for unitttests, normally Field is only super-class for others
@@ -105,6 +217,39 @@ class Field(object):
 
         return self.name
 
+    def __copy__(self):
+        """
+        Return a copy of the field.
+
+        Protocols create their fields once per class and every instance
+        gets copies of them (see Protocol._create_fields()), so it's much
+        cheaper than creating fields again.
+
+        @rtype: C{Field}
+        @return: the copy of the field.
+        """
+
+        try:
+            return self._copy_slots(self)
+        except AttributeError:
+            # some slots are not set (see _fill_slots())
+            field = object.__new__(self.__class__)
+            for slot in self._all_slots:
+                if hasattr(self, slot):
+                    setattr(field, slot, getattr(self, slot))
+            return field
+
+    def _fill_slots(self):
+        """
+        Set None for attributes (slots) which are not set yet.
+
+        Fields with all slots set are copied by the fast path of __copy__().
+        """
+
+        for slot in self._all_slots:
+            if not hasattr(self, slot):
+                setattr(self, slot, None)
+
     def get(self):
         """
         Return the current value of the field.
@@ -223,6 +368,19 @@ class Field(object):
         
         return raw
 
+    def fillout_raw(self):
+        """
+        Fillout the field for the buffer-based serialization.
+
+        Behave as fillout() but fields which keep raw binary data may return
+        the data as a string instead of converting it to the number.
+        See umit.umpa.utils.bits.pack_bits() for details.
+
+        @return: bits of the field (a number or a string).
+        """
+
+        return self.fillout()
+
 class IntField(Field):
     """
     Superclass for number-type fields.
@@ -234,6 +392,10 @@ class IntField(Field):
     like the one provided by Umit Project.
     """
 
+    # slots of SpecialIntField and EnumField, because protocols combine
+    # them (e.g. IP's _HProtocol) and only one base class may add slots
+    __slots__ = ('_temp_value', 'enumerable')
+
     def _raw_value(self):
         """
         Convert the value to the raw mode.
@@ -290,7 +452,7 @@ class SpecialIntField(IntField):
         """
 
         super(SpecialIntField, self).__init__(*args, **kwargs)
-        self.__temp_value = 0
+        self._temp_value = 0
 
     def get_tmpvalue(self):
         """
@@ -300,7 +462,7 @@ class SpecialIntField(IntField):
         @return: temporary value of the field.
         """
 
-        return self.__temp_value
+        return self._temp_value
 
     def set_tmpvalue(self, value):
         """
@@ -310,14 +472,14 @@ class SpecialIntField(IntField):
         @param value: temporary value for special cases
         """
 
-        self.__temp_value = value
+        self._temp_value = value
 
     def clear_tmpvalue(self):
         """
         Clear the temporary value.
         """
 
-        self.__temp_value = 0
+        self._temp_value = 0
 
     _tmp_value = property(get_tmpvalue, set_tmpvalue, clear_tmpvalue, """
     The temporary value -- attribute for special cases in pre/post raw methods.
@@ -342,6 +504,16 @@ class EnumField(IntField):
 
     enumerable = {}
 
+    def __init__(self, *args, **kwargs):
+        """
+        Create a new EnumField().
+
+        Call the super constructor and use the dictionary of the class.
+        """
+
+        self.enumerable = self._default_enumerable
+        super(EnumField, self).__init__(*args, **kwargs)
+
     def get(self, human=False):
         """
         Return the current value of the field.
@@ -390,12 +562,27 @@ class AddrField(Field):
      2. tuples as (127,0,0,1) or (0,0,0,0,0,0,0,1)
     """
 
+    __slots__ = ('separator', 'base', 'piece_size', 'pieces_amount')
+
     separator = ""
     base = 0
     piece_size = 0
     pieces_amount = 0
     bits = 0
 
+    def __init__(self, *args, **kwargs):
+        """
+        Create a new AddrField().
+
+        Call the super constructor and use the format of the class.
+        """
+
+        self.separator = self._default_separator
+        self.base = self._default_base
+        self.piece_size = self._default_piece_size
+        self.pieces_amount = self._default_pieces_amount
+        super(AddrField, self).__init__(*args, **kwargs)
+
     def set(self, value):
         """
         Set the new value of the field.
@@ -452,12 +639,34 @@ class AddrField(Field):
         """
 
         if isinstance(value, types.StringType):
-            pieces = value.split(self.separator)
+            # the same addresses are set again and again (e.g. while
+            # building many packets), so valid strings are remembered
+            key = (self.separator, self.base, self.piece_size,
+                                                self.pieces_amount, value)
+            if key in _valid_addrs:
+                return True
+            if not self._is_valid_pieces(value.split(self.separator)):
+                return False
+            if len(_valid_addrs) >= _VALID_ADDRS_MAX:
+                _valid_addrs.clear()
+            _valid_addrs[key] = True
+            return True
         elif isinstance(value, types.TupleType):
-            pieces = value
+            return self._is_valid_pieces(value)
         else:
             return False
 
+    def _is_valid_pieces(self, pieces):
+        """
+        Validate pieces of the new value.
+
+        @type pieces: C{list} or C{tuple}
+        @param pieces: pieces of the address.
+
+        @rtype: C{bool}
+        @return: result of the validation.
+        """
+
         if len(pieces) != self.pieces_amount:
             return False
 
@@ -521,6 +730,20 @@ class DataField(Field):
 
         return str_to_bits(self._value)
 
+    def fillout_raw(self):
+        """
+        Fillout the field for the buffer-based serialization.
+
+        The data is returned as it is, without converting to the number.
+
+        @rtype: C{str}
+        @return: raw data of the field.
+        """
+
+        if self._value is None:
+            return super(DataField, self).fillout_raw()
+        return self._value
+
 
 
 class IPAddrField(AddrField):
@@ -589,6 +812,8 @@ class PaddingField(SpecialIntField):
     This is common fields for many protocols.
     """
 
+    __slots__ = ('_word',)
+
     bits = 0
     auto = True
 
@@ -666,8 +891,14 @@ class Flags(Field):
 
     Most of protocols have a special field with bit-flags.
     E.g. TCP use them for ACK,SYN and others flags.
+
+    Values of bit-flags are kept in a dictionary (see BitField for
+    the meaning of values); BitField objects are created only to print
+    the field.
     """
 
+    __slots__ = ('_ordered_fields',)
+
     def __init__(self, name, names, **preset):
         """
         Create a new Flags()
@@ -699,6 +930,20 @@ class Flags(Field):
             else:
                 self.set(False, name)
 
+    def __copy__(self):
+        """
+        Return a copy of the field.
+
+        Values of bit-flags are not shared with the original.
+
+        @rtype: C{Flags}
+        @return: the copy of the field.
+        """
+
+        field = super(Flags, self).__copy__()
+        field._value = self._value.copy()
+        return field
+
     def __str__(self):
         """
         Print in human-readable tree-style a content of the field.
@@ -711,7 +956,7 @@ class Flags(Field):
         print "| +-[ %-25s ]\t%s" % (self.name, self._shortname)
         print "| | \\"
         for bit in self._ordered_fields:
-            print self._value[bit]
+            print BitField(bit, self._value[bit])
         print "| | /"
         return "| \\-[ %-25s ]\tcontains %d bit flags" % (self.name,
                                                     len(self._ordered_fields))
@@ -731,12 +976,12 @@ class Flags(Field):
         """
 
         try:
-            result = [ self._value[val].get() for val in names ]
+            result = [ _bit_value(self._value[val]) for val in names ]
         except KeyError, msg:
             raise UMPAAttributeException(msg)
         except TypeError:
             if len(names[0]) == 0:
-                result = [ self._value[bit].get() for bit in
+                result = [ _bit_value(self._value[bit]) for bit in
                                                         self._ordered_fields ]
             else:
                 raise
@@ -744,7 +989,7 @@ class Flags(Field):
         if not names:
             result = 0
             for bit in self._ordered_fields:
-                result += self._value[bit].get()
+                result += _bit_value(self._value[bit])
                 result <<= 1
             result >>= 1
 
@@ -773,7 +1018,8 @@ class Flags(Field):
         # for Flags we have to handle different types
         # 1) numeric-value 2) lists 3) dicts
 
-        if value in (None, False, True):
+        # compare by identity because 0 == False and 1 == True
+        if value is None or value is False or value is True:
             pass
         elif isinstance(value, types.IntType):
             # check if a value exceeds flags's length
@@ -816,10 +1062,8 @@ class Flags(Field):
         """
 
         # we overwrite an attribute self._value
-        # because we need a list instead of simple var here
-        self._value = {}
-        for flag in self._ordered_fields:
-            self._value[flag] = BitField(flag, False)
+        # because we need a dictionary instead of simple var here
+        self._value = dict.fromkeys(self._ordered_fields, False)
 
     def fillout(self):
         """
@@ -833,7 +1077,11 @@ class Flags(Field):
 
         raw = 0
         for bitname in self._ordered_fields:
-            raw += self._value[bitname].fillout()
+            value = self._value[bitname]
+            if value is None:
+                # the same as BitField.fillout() for undefined values
+                BitField(bitname).fillout()
+            raw += bool(value)
             raw <<= 1
         raw >>= 1
         return raw
@@ -866,10 +1114,20 @@ class Flags(Field):
 
         for flag_name in names:
             if self._is_valid(flag_name):
-                self._value[flag_name].set(value)
+                # BitField accepts every value
+                self._value[flag_name] = value
             else:
                 raise UMPAAttributeException(flag_name + ' is not allowed')
 
+def _bit_value(value):
+    """
+    Return the value of bit-flag as BitField.get() does.
+    """
+
+    if value is None:
+        return value
+    return bool(value)
+
 class BitField(Field):
     """
     This class is used for bit-flags of Flags field.
@@ -24,13 +24,19 @@ Usefull classes for 4th layer's protocols.
 
 TCP/UDP use special pseudo header to calculate checksum. These classes
 are provided.
+
+To calculate a checksum, use pseudo_header() function which returns raw
+bytes of the header without creating new PseudoHeader object.
 """
 
+import struct
+
 from umit.umpa.protocols._protocols import Protocol
 from umit.umpa.protocols.IP import IP
-from umit.umpa.protocols._fields import IntField, IPv4AddrField, IPv6AddrField
+from umit.umpa.protocols._fields import IntField, SpecialIntField, \
+                                        IPv4AddrField, IPv6AddrField
 
-class Layer4ChecksumField(IntField):
+class Layer4ChecksumField(SpecialIntField):
     """
     A checksum for the common classes of 4th layer of OSI model.
 
@@ -136,3 +142,35 @@ class PseudoHeader(Protocol):
         """
 
         return raw_value, bit
+
+# 127.0.0.1
+_LOCALHOST = 0x7f000001
+
+def pseudo_header(protocol_id, total_length, protocol_container):
+    """
+    Return raw Pseudo Header.
+
+    Source/destination addresses are taken from the first IP protocol
+    of the container (localhost is used if there is none IP instance).
+
+    @type protocol_id: C{int}
+    @param protocol_id: id of the protocol which use Pseudo Header.
+
+    @type total_length: C{int}
+    @param total_length: length of the real header and payload.
+
+    @type protocol_container: C{tuple}
+    @param protocol_container: tuple of protocols included in the packet.
+
+    @rtype: C{str}
+    @return: raw Pseudo Header.
+    """
+
+    src = dst = _LOCALHOST
+    for proto in protocol_container:
+        if isinstance(proto, IP):
+            src = proto.get_field('src').fillout()
+            dst = proto.get_field('dst').fillout()
+            break
+
+    return struct.pack('!IIBBH', src, dst, 0, protocol_id, total_length)
@@ -24,13 +24,20 @@ Usefull classes for 4th layer's protocols.
 
 TCP/UDP use special pseudo header to calculate checksum. These classes
 are provided.
+
+To calculate a checksum, use pseudo_header6() function which returns raw
+bytes of the header without creating new PseudoHeader6 object.
 """
 
+import struct
+
 from umit.umpa.protocols._protocols import Protocol
 from umit.umpa.protocols.IPV6 import IPV6
-from umit.umpa.protocols._fields import IntField, IPv4AddrField, IPv6AddrField
+import umit.umpa.utils.bits as _bits
+from umit.umpa.protocols._fields import IntField, SpecialIntField, \
+     IPv4AddrField, IPv6AddrField
 
-class Layer4ChecksumField(IntField):
+class Layer4ChecksumField(SpecialIntField):
     """
     A checksum for the common classes of 4th layer of OSI model.
 
@@ -133,3 +140,37 @@ class PseudoHeader6(Protocol):
         """
 
         return raw_value, bit
+
+# 0:0:0:0:0:0:0:1
+_LOCALHOST = 1
+
+def pseudo_header6(protocol_id, total_length, protocol_container):
+    """
+    Return raw Pseudo Header for IPv6.
+
+    Source/destination addresses are taken from the first IPV6 protocol
+    of the container (localhost is used if there is none IPV6 instance).
+
+    @type protocol_id: C{int}
+    @param protocol_id: id of the protocol which use Pseudo Header.
+
+    @type total_length: C{int}
+    @param total_length: length of the real header and payload.
+
+    @type protocol_container: C{tuple}
+    @param protocol_container: tuple of protocols included in the packet.
+
+    @rtype: C{str}
+    @return: raw Pseudo Header.
+    """
+
+    src = dst = _LOCALHOST
+    for proto in protocol_container:
+        if isinstance(proto, IPV6):
+            src = proto.get_field('src').fillout()
+            dst = proto.get_field('dst').fillout()
+            break
+
+    return struct.pack('!16s16sI3xB', _bits.number_to_bytes(src, 16),
+                        _bits.number_to_bytes(dst, 16), total_length,
+                        protocol_id)
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2008-2009 Adriano Monteiro Marques.
+#
+# Author: Bartosz SKOWRON <getxsick at gmail dot com>
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation; either version 2.1 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+
+"""
+Compiled layouts of protocols' headers.
+
+A layout describes where every active field of the protocol is placed
+(offsets and widths) and how to pack them all with one struct.pack_into()
+call. Fields which don't start or end at the byte boundary (e.g. 4-bit
+version and header length of IP) are merged into the smallest byte-aligned
+unit first.
+
+Layouts are cached per protocol's class and looked up by the signature
+of the header (widths of the fields, -1 for inactive ones), so they are
+compiled again only if some fields are enabled/disabled or change the size
+(like options or padding).
+"""
+
+import struct
+
+from umit.umpa.protocols._consts import BYTE
+from umit.umpa.utils.exceptions import UMPAException
+import umit.umpa.utils.bits as _bits
+
+# formats of byte-aligned units which are packed as numbers
+_FORMATS = { 1 : 'B', 2 : 'H', 4 : 'I', 8 : 'Q' }
+
+# maximum amount of cached layouts per class
+CACHE_SIZE = 32
+
+class Layout(object):
+    """
+    Compiled layout of the protocol's header.
+
+    Create it by get_layout() function to take advantage of the cache.
+    """
+
+    def __init__(self, names, widths):
+        """
+        Compile a new layout.
+
+        @type names: C{tuple}
+        @param names: ordered names of active fields.
+
+        @type widths: C{tuple}
+        @param widths: widths of active fields in bits.
+        """
+
+        self.names = names
+        self.widths = widths
+        self.offsets = {}
+
+        # units are merged fields, every one is described as:
+        # (is_number, length in bytes, ((index, shift, mask), ...))
+        units = []
+        fmt = ['!']
+        parts = []
+        unit_bits = 0
+        offset = 0
+        for index, (name, width) in enumerate(zip(names, widths)):
+            self.offsets[name] = offset
+            offset += width
+            if not width:
+                continue
+            parts.append((index, width))
+            unit_bits += width
+            if unit_bits % BYTE:
+                continue
+
+            # the unit is closed at the byte boundary
+            size = unit_bits / BYTE
+            compiled = []
+            shift = unit_bits
+            for part_index, part_width in parts:
+                shift -= part_width
+                compiled.append((part_index, shift, (1 << part_width) - 1))
+            if size in _FORMATS:
+                units.append((True, size, tuple(compiled)))
+                fmt.append(_FORMATS[size])
+            else:
+                units.append((len(compiled) > 1, size, tuple(compiled)))
+                fmt.append('%ds' % size)
+            parts = []
+            unit_bits = 0
+
+        if unit_bits:
+            raise UMPAException('odd number of bits in the header')
+
+        self.bits = offset
+        self.length = offset / BYTE
+        self._units = tuple(units)
+        self.struct = struct.Struct(''.join(fmt))
+
+    def pack_into(self, buffer, offset, values):
+        """
+        Pack values of the fields into the buffer.
+
+        @type buffer: C{bytearray}
+        @param buffer: the buffer which will be updated.
+
+        @type offset: C{int}
+        @param offset: offset in bytes from the beginning of the buffer.
+
+        @type values: C{list}
+        @param values: values of active fields (as returned by fillout_raw()).
+        """
+
+        packed = []
+        for is_number, size, parts in self._units:
+            if is_number:
+                number = 0
+                for index, shift, mask in parts:
+                    value = values[index]
+                    if isinstance(value, str):
+                        value = _bits.bytes_to_number(value)
+                    number |= (value & mask) << shift
+                if size not in _FORMATS:
+                    number = _bits.number_to_bytes(number, size)
+                packed.append(number)
+            else:
+                # a single byte-aligned field like an address or data
+                value = values[parts[0][0]]
+                if not isinstance(value, str):
+                    value = _bits.number_to_bytes(value & parts[0][2], size)
+                packed.append(value)
+        self.struct.pack_into(buffer, offset, *packed)
+
+    def pack(self, values):
+        """
+        Pack values of the fields into a new buffer.
+
+        @type values: C{list}
+        @param values: values of active fields (as returned by fillout_raw()).
+
+        @rtype: C{bytearray}
+        @return: raw header.
+        """
+
+        buffer = bytearray(self.length)
+        self.pack_into(buffer, 0, values)
+        return buffer
+
+def get_layout(cls, names, widths, signature):
+    """
+    Return the compiled layout for the protocol's class.
+
+    The layout is taken from the cache of the class or compiled
+    and cached if it's the first request for this signature.
+
+    @type cls: C{type}
+    @param cls: class of the protocol.
+
+    @type names: C{tuple}
+    @param names: ordered names of active fields.
+
+    @type widths: C{tuple}
+    @param widths: widths of active fields in bits.
+
+    @type signature: C{tuple}
+    @param signature: widths of all fields in order, -1 for inactive ones.
+
+    @rtype: C{Layout}
+    @return: compiled layout.
+    """
+
+    # every class has its own cache (not inherited from the super-class)
+    cache = cls.__dict__.get('_layouts')
+    if cache is None:
+        cache = {}
+        cls._layouts = cache
+
+    try:
+        return cache[signature]
+    except KeyError:
+        pass
+
+    if len(cache) >= CACHE_SIZE:
+        cache.clear()
+    layout = Layout(names, widths)
+    cache[signature] = layout
+    return layout
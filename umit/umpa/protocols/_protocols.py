@@ -30,63 +30,155 @@ information.
 from umit.umpa.protocols._consts import BYTE
 from umit.umpa.protocols._fields import Field, Flags
 from umit.umpa.utils.exceptions import UMPAException, UMPAAttributeException
+import umit.umpa.utils.bits as _bits
+from umit.umpa.protocols import _layout
 from umit.umpa.utils.tools import dict_from_sequence as _dict_from_sequence
 
+class _FieldProperty(object):
+    """
+    Descriptor which returns the value of the field (the proto.field syntax).
+
+    Reading attributes of Protocol's objects by __getattr__() is slow,
+    because it's called after the failed lookup of the regular attribute.
+    Descriptors are found at once. Objects which are lazy (see
+    Protocol._new_lazy()) or don't have the field use __getattr__().
+    """
+
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, obj, cls):
+        if obj is None:
+            return self
+        try:
+            field = obj.__dict__['_fields'][self.name]
+        except KeyError:
+            return obj.__getattr__(self.name)
+        return field.get()
+
+class _ProtocolType(type):
+    """
+    Metaclass of protocols.
+
+    Add _FieldProperty descriptors for names of fields (see _ordered_fields)
+    which are not attributes of the class yet.
+    """
+
+    def __new__(mcs, name, bases, dct):
+        cls = super(_ProtocolType, mcs).__new__(mcs, name, bases, dct)
+        for field_name in cls._ordered_fields:
+            if not hasattr(cls, field_name):
+                setattr(cls, field_name, _FieldProperty(field_name))
+        return cls
+
 class Protocol(object):
     """
     Superclass for every protocol's implementations.
    
     You have to override following methods:
+     - _create_fields()
      - _pre_raw()
      - _post_raw()
-    They are used to make some tasks especially with SuperIntField objects.
-    Check IP.py, TCP.py for examples.
+    _pre_raw() and _post_raw() are used to make some tasks especially with
+    SuperIntField objects. Check IP.py, TCP.py for examples.
 
     Also, override this __doc__ to get hints in some frontends
     like the one provided by Umit Project.
     """
 
+    __metaclass__ = _ProtocolType
+
     _ordered_fields = ()
     layer = None
     protocol_id = None
     name = None
 
-    def __init__(self, fields_list, **preset):
+    def __init__(self, fields_list=None, **preset):
         """
         Create a new Protocol().
 
         @type fields_list: C{list}
-        @param fields_list: list of fields B{in correct order}.
+        @param fields_list: list of fields B{in correct order}
+        (default: copies of fields returned by _create_fields()).
 
         @param preset: predefined values for fields.
         """
 
-        # pack objects of header's fields to the dict
-        fields = dict(zip(self._ordered_fields, fields_list))
+        if fields_list is None:
+            fields = self._copy_fields()
+        else:
+            # pack objects of header's fields to the dict
+            fields = dict(zip(self._ordered_fields, fields_list))
+            # short-fieldname update
+            for field in fields:
+                fields[field]._shortname = field
 
         # because of overwritten __setattr__ we need to assign with __dict__
         self.__dict__['_fields'] = fields
         self.__dict__['payload'] = None
         self.__dict__['__raw_value'] = None
+        self.__dict__['__raw_buffer'] = None
+        self.__dict__['__layout'] = None
 
         # setting up passed fields
         for field in preset:
             setattr(self, field, preset[field])
 
-        # short-fieldname update
-        for field in fields:
-            self.get_field(field)._shortname = field
+    @classmethod
+    def _create_fields(cls):
+        """
+        Return new fields of the header B{in correct order}.
+
+        It's called once per class. Fields keep the metadata (names, docs,
+        lengths, default values), so set docs etc. here. Every instance
+        gets copies of these fields.
+
+        This method is an abstract. You HAVE TO override it or pass
+        the list of fields to Protocol.__init__().
+
+        @rtype: C{list}
+        @return: list of fields.
+        """
+
+        raise NotImplementedError("this is abstract class")
+
+    @classmethod
+    def _copy_fields(cls):
+        """
+        Return copies of fields of the class.
+
+        @rtype: C{dict}
+        @return: fields by their names.
+        """
+
+        # not inherited, subclasses may define other fields
+        prototypes = cls.__dict__.get('_prototypes')
+        if prototypes is None:
+            prototypes = zip(cls._ordered_fields, cls._create_fields())
+            for name, field in prototypes:
+                field._shortname = name
+                field._fill_slots()
+            cls._prototypes = prototypes
+        return dict([ (name, field.__copy__()) for name, field in prototypes ])
 
     def __getattr__(self, attr):
         """
         Return the value of the field.
+
+        Fields of _ordered_fields are read by descriptors of the class,
+        this method is used for other names and lazy objects.
         
         @type attr: C{str}
         @param attr: name of the field.
 
         @return: value of the field.
         """
-        
+
+        if '__lazy' in self.__dict__:
+            self._load_lazy()
+            return getattr(self, attr)
         return self.get_field(attr).get()
 
     def __setattr__(self, attr, value):
@@ -99,7 +191,67 @@ class Protocol(object):
         @param value: the new value.
         """
 
-        self.get_field(attr).set(value)
+        try:
+            field = self.__dict__['_fields'][attr]
+        except KeyError:
+            if '__lazy' in self.__dict__:
+                self._load_lazy()
+            field = self.get_field(attr)
+        field.set(value)
+
+    @classmethod
+    def _new_lazy(cls, buffer, offset):
+        """
+        Return a new object which is decoded on the first access.
+
+        The object keeps only the raw buffer and the offset of the header.
+        Fields are created and loaded by load_raw() when any of them
+        (or any other instance's attribute) is needed.
+
+        @param buffer: raw buffer of the whole packet.
+
+        @type offset: C{int}
+        @param offset: offset of the header in bytes.
+
+        @rtype: C{Protocol}
+        @return: the lazy object.
+        """
+
+        proto = cls.__new__(cls)
+        proto.__dict__['__lazy'] = (buffer, offset)
+        proto.__dict__['payload'] = None
+        return proto
+
+    def _load_lazy(self):
+        """
+        Create fields of the lazy object and load them from the buffer.
+        """
+
+        buffer, offset = self.__dict__.pop('__lazy')
+        payload = self.__dict__['payload']
+        self.__init__()
+        self.load_raw(buffer[offset:])
+        self.__dict__['payload'] = payload
+
+    @classmethod
+    def _peek_raw(cls, buffer, offset):
+        """
+        Return the length of the header and the next protocol's type.
+
+        It's used by lazy decoding to find headers without loading fields.
+        Override it with a cheap version for common protocols.
+
+        @param buffer: raw buffer of the whole packet.
+
+        @type offset: C{int}
+        @param offset: offset of the header in bytes.
+
+        @rtype: C{tuple}
+        @return: (length in bytes, value of the payload_fieldname field or
+        None) or None if the header has to be decoded normally.
+        """
+
+        return None
 
     def __str__(self):
         """
@@ -354,6 +506,9 @@ class Protocol(object):
         @return: C{raw_value, bit}
         """
 
+        # the layout is compiled by the buffer-based path only
+        self.__dict__['__layout'] = None
+
         # because of some protocols implementation, there are some tasks before
         # we call fillout() for fields
         raw_value, bit = self._pre_raw(raw_value, bit, protocol_container,
@@ -431,8 +586,177 @@ class Protocol(object):
             raise UMPAException('odd number of bits in ' + str(self.name))
 
         self.__dict__['__raw_value'] = raw_value
+        self.__dict__['__raw_buffer'] = bytearray(
+                                _bits.number_to_bytes(raw_value, bit / BYTE))
         return raw_value, bit
 
+    def _fillout_buffer(self):
+        """
+        Fillout active fields and pack them into a new buffer.
+
+        The compiled layout of the header is taken from the cache
+        (see _layout module), so the whole header is packed by one
+        struct.pack_into() call. The layout is compiled again only if
+        some fields were enabled/disabled or changed their length.
+
+        @rtype: C{bytearray}
+        @return: raw header of the protocol.
+        """
+
+        fields = self._fields
+        names = []
+        values = []
+        widths = []
+        signature = []
+        # keep the same order of fillout() calls as _raw() does
+        for name in reversed(self._ordered_fields):
+            field = fields[name]
+            if field.active:
+                names.append(name)
+                values.append(field.fillout_raw())
+                # some fields (e.g. PaddingField) know their length
+                # after fillout
+                widths.append(field.bits)
+                signature.append(field.bits)
+            else:
+                signature.append(-1)
+        names.reverse()
+        values.reverse()
+        widths.reverse()
+
+        # protocol should return byte-compatible length
+        if sum(widths) % BYTE != 0:
+            raise UMPAException('odd number of bits in ' + str(self.name))
+
+        layout = _layout.get_layout(self.__class__, tuple(names),
+                                    tuple(widths), tuple(signature))
+        self.__dict__['__layout'] = layout
+        return layout.pack(values)
+
+    def _raw_offset(self, field):
+        """
+        Return the offset for the field of the currently generated header.
+
+        It's the same as get_offset() but the compiled layout is used if
+        the header is generated by get_raw_buffer(), so it's cheap to call
+        it from _post_raw() (e.g. to place a checksum).
+
+        @type field: C{str}
+        @param field: name of the field
+
+        @rtype: C{int}
+        @return: offset of the field in bits.
+        """
+
+        layout = self.__dict__['__layout']
+        if layout is not None and field in layout.offsets:
+            return layout.offsets[field]
+        return self.get_offset(field)
+
+    def _post_raw_buffer(self, buffer, protocol_container, protocol_bits):
+        """
+        Handle with fields after packing them into the buffer.
+
+        This is the buffer-based counterpart of _post_raw() and it's called
+        by get_raw_buffer(). By default the buffer is converted to the number
+        and passed to _post_raw(), so protocols which implement only
+        the number-based methods work without changes.
+        Override it to handle with the buffer directly.
+
+        @type buffer: C{bytearray}
+        @param buffer: raw header of the protocol.
+
+        @type protocol_container: C{tuple}
+        @param protocol_container: tuple of protocols included in the packet.
+
+        @type protocol_bits: C{int}
+        @param protocol_bits: currently length of the packet.
+
+        @rtype: C{bytearray}
+        @return: raw header of the protocol.
+        """
+
+        raw_value, bit = self._post_raw(_bits.bytes_to_number(buffer),
+                                        len(buffer) * BYTE,
+                                        protocol_container, protocol_bits)
+        return bytearray(_bits.number_to_bytes(raw_value, bit / BYTE))
+
+    def _post_raw_by_buffer(self, raw_value, bit, protocol_container,
+                                                            protocol_bits):
+        """
+        Handle with fields after calling fillout() by _post_raw_buffer().
+
+        Protocols which override _post_raw_buffer() can return this
+        from their _post_raw(), so the number-based path uses the same code.
+
+        @type raw_value: C{int}
+        @param raw_value: currently raw value for the packet.
+
+        @type bit: C{int}
+        @param bit: currently length of the protocol.
+
+        @type protocol_container: C{tuple}
+        @param protocol_container: tuple of protocols included in the packet.
+
+        @type protocol_bits: C{int}
+        @param protocol_bits: currently length of the packet.
+
+        @return: C{raw_value, bit}
+        """
+
+        buffer = bytearray(_bits.number_to_bytes(raw_value, bit / BYTE))
+        buffer = self._post_raw_buffer(buffer, protocol_container,
+                                                            protocol_bits)
+        return _bits.bytes_to_number(buffer), bit
+
+    def get_raw_buffer(self, protocol_container, protocol_bits):
+        """
+        Return raw bytes of the protocol.
+
+        This is the buffer-based version of get_raw(). Fields are written
+        directly into a preallocated buffer instead of merging them into
+        one big number, what is much faster for long headers or payloads.
+
+        @type protocol_container: C{tuple}
+        @param protocol_container: tuple of protocols included in the packet.
+
+        @type protocol_bits: C{int}
+        @param protocol_bits: currently length of the packet.
+
+        @rtype: C{bytearray}
+        @return: raw header of the protocol.
+        """
+
+        if '__lazy' in self.__dict__:
+            self._load_lazy()
+        self._pre_raw(0, 0, protocol_container, protocol_bits)
+        buffer = self._fillout_buffer()
+        buffer = self._post_raw_buffer(buffer, protocol_container,
+                                                            protocol_bits)
+
+        self.__dict__['__raw_buffer'] = buffer
+        self.__dict__['__raw_value'] = None
+        return buffer
+
+    def _get_payload_buffers(self):
+        """
+        Return raw buffers of the upper protocols.
+
+        Upper protocols are generated before the current one, so their
+        buffers are ready to use (e.g. to calculate a checksum).
+
+        @rtype: C{list}
+        @return: list of raw buffers (C{bytearray}).
+        """
+
+        buffers = []
+        proto = self.payload
+        while proto is not None:
+            if proto.__dict__['__raw_buffer'] is not None:
+                buffers.append(proto.__dict__['__raw_buffer'])
+            proto = proto.payload
+        return buffers
+
     def load_raw(self, buffer):
         """
         Load raw and update a protocol's fields.
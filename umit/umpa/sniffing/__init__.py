@@ -19,10 +19,16 @@
 # along with this library; if not, write to the Free Software Foundation, 
 # Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA 
 
+import asyncore
+import heapq
 import os.path
 
 import umit.umpa
-from umit.umpa.protocols._decoder import decode
+from umit.umpa import _parallel
+from umit.umpa.protocols._decoder import decode, Decoder
+from umit.umpa.sniffing._columns import PacketColumns
+from umit.umpa.sniffing.libpcap import pcapfile
+from umit.umpa.sniffing.libpcap.pcapfile import PcapWriter
 from umit.umpa.utils.exceptions import UMPASniffingException
 
 if umit.umpa.config['libpcap']:
@@ -34,7 +40,53 @@ if umit.umpa.config['libpcap']:
     lpcap._backend = umit.umpa.config['libpcap']
     del modulepath
 else:
-    raise UMPASniffingException("unknown/missing libpcap's wrapper")
+    # without the wrapper only offline functions work (see _open_file())
+    from umit.umpa.sniffing.libpcap import _abstract as lpcap
+    lpcap._backend = None
+
+def _open_file(filename):
+    """
+    Open pcap/pcapng file for reading.
+
+    The native reader (umit.umpa.sniffing.libpcap.pcapfile) is used.
+    Files in other formats are passed to the libpcap's wrapper.
+
+    @type filename: C{str}
+    @param filename: path to a file
+
+    @return: capture descriptor
+    """
+
+    if not os.path.isfile(filename):
+        raise UMPASniffingException("can't open file: %s" % filename)
+    try:
+        return pcapfile.open_pcap(filename)
+    except UMPASniffingException:
+        if lpcap._backend is None:
+            raise
+    return lpcap.open_pcap(filename)
+
+def _dumper(session, filename, snaplen):
+    """
+    Return a writer which stores sniffed packets into the file.
+
+    Packets are buffered, but flushed at least every second.
+
+    @type session: C{open_pcap}
+    @param session: capture descriptor
+
+    @type filename: C{str}
+    @param filename: path to a file
+
+    @type snaplen: C{int}
+    @param snaplen: maximum number of bytes of each packet
+
+    @rtype: C{PcapWriter}
+    @return: the writer.
+    """
+
+    return PcapWriter(filename, session.datalink(), snaplen,
+                                                    flush_interval=1)
 
 def get_available_devices():
     """
@@ -83,15 +135,18 @@ def sniff(count, filter=None, device=None, timeout=0, snaplen=1024,
         session.setfilter(filter)
     d = None
     if dump is not None:
-        d = lpcap.dumper(session, dump)
+        d = _dumper(session, dump, snaplen)
     captured = []
-    for i in xrange(count):
-        p = decode(session.next()[1], session.datalink())
-        captured.append(p)
+    try:
+        for i in xrange(count):
+            ts, pkt = session.next()
+            p = decode(pkt, session.datalink())
+            captured.append(p)
+            if d is not None:
+                d.write(pkt, ts)
+    finally:
         if d is not None:
-            d.dump()
-    if d is not None:
-        d.flush()
+            d.close()
     return captured
 
 def sniff_next(filter=None, device=None, timeout=0, snaplen=1024,promisc=True,
@@ -165,20 +220,22 @@ def sniff_loop(count=0, filter=None, device=None, timeout=0, snaplen=1024,
         session.setfilter(filter)
     d = None
     if dump is not None:
-        d = lpcap.dumper(session, dump)
+        d = _dumper(session, dump, snaplen)
 
     i = 0
-    while 1:
-        if i == count and count > 0:
-            break
-        ts, pkt = session.next()
-        decoded_pkt = decode(pkt, session.datalink())
+    try:
+        while 1:
+            if i == count and count > 0:
+                break
+            ts, pkt = session.next()
+            decoded_pkt = decode(pkt, session.datalink())
+            if d is not None:
+                d.write(pkt, ts)
+            callback(ts, decoded_pkt, *callback_args)
+            i += 1
+    finally:
         if d is not None:
-            d.dump()
-        callback(ts, decoded_pkt, *callback_args)
-        i += 1
-    if d is not None:
-        d.flush()
+            d.close()
 
 def sniff_any(dump=None):
     """
@@ -197,7 +254,7 @@ def from_file(filename, count=0, filter=None):
     Call callback for each or return list of packets.
 
     @type filename: C{str}
-    @param filename: path to a file in pcap format
+    @param filename: path to a file in pcap or pcapng format
 
     @type count: C{int}
     @param count: number of sniffing packets; 0 means infinity (default: I{0})
@@ -206,20 +263,19 @@ def from_file(filename, count=0, filter=None):
     @param filter: BPF filter
     """
 
-    if os.path.isfile(filename):
-        f = lpcap.open_pcap(filename)
-    else:
-        raise UMPASniffingException("can't open file: %s" % filename)
-
-    if filter:
-        f.setfilter(filter)
-
-    packets = []
-    for i, pkt in enumerate(f):
-        if i == count and count > 0:
-            break
-        p = decode(pkt[1], f.datalink())
-        packets.append(p)
+    f = _open_file(filename)
+    try:
+        if filter:
+            f.setfilter(filter)
+
+        packets = []
+        for i, pkt in enumerate(f):
+            if i == count and count > 0:
+                break
+            p = decode(pkt[1], f.datalink())
+            packets.append(p)
+    finally:
+        f.close()
     return packets
 
 def from_file_loop(filename, count=0, filter=None, callback=None,
@@ -234,7 +290,7 @@ def from_file_loop(filename, count=0, filter=None, callback=None,
     or other sniff's functions (without a loop feature).
 
     @type filename: C{str}
-    @param filename: path to a file in pcap format
+    @param filename: path to a file in pcap or pcapng format
 
     @type count: C{int}
     @param count: number of sniffing packets; 0 means infinity (default: I{0})
@@ -255,20 +311,578 @@ def from_file_loop(filename, count=0, filter=None, callback=None,
     if callback_args is None:
         callback_args = []
 
-    if os.path.isfile(filename):
-        f = lpcap.open_pcap(filename)
-    else:
+    f = _open_file(filename)
+    try:
+        if filter:
+            f.setfilter(filter)
+
+        for i, p in enumerate(f):
+            if i == count and count > 0:
+                break
+            ts, pkt = p
+            decoded_pkt = decode(pkt, f.datalink())
+            callback(ts, decoded_pkt, *callback_args)
+    finally:
+        f.close()
+
+def _get_decoder(mode, linktype):
+    """
+    Return a function which decodes raw packets in the selected mode.
+
+    @type mode: C{str}
+    @param mode: 'lazy', 'full' or 'raw'
+
+    @type linktype: C{int}
+    @param linktype: datalink of packets
+
+    @return: function which takes raw packet and returns the result.
+    """
+
+    if mode == 'lazy':
+        decoder = Decoder(linktype, lazy=True)
+        # lazy packets keep the raw packet, but backends may return views
+        # which are valid only until the next packet
+        return lambda raw: decoder.decode(str(raw))
+    elif mode == 'full':
+        return Decoder(linktype).decode
+    elif mode == 'raw':
+        return str
+    raise UMPASniffingException("unknown decode mode: %s" % mode)
+
+def _iter_session(open_session, count, filter, mode):
+    """
+    Yield (timestamp, packet) tuples from the session.
+
+    The session is opened when the generator is started (so generators
+    which are never started don't leave open sessions) and closed when
+    the generator is finished or closed.
+
+    @type open_session: C{func}
+    @param open_session: function which returns a capture descriptor
+
+    @type count: C{int}
+    @param count: number of packets; 0 means infinity
+
+    @type filter: C{str}
+    @param filter: BPF filter
+
+    @type mode: C{str}
+    @param mode: decode mode (see iter_file())
+    """
+
+    session = open_session()
+    try:
+        if filter:
+            session.setfilter(filter)
+        decode_packet = _get_decoder(mode, session.datalink())
+        for i, (ts, pkt) in enumerate(session):
+            yield ts, decode_packet(pkt)
+            # stop before reading the next packet, live sessions would
+            # wait for it
+            if count > 0 and i + 1 == count:
+                break
+    finally:
+        session.close()
+
+def iter_file(filename, filter=None, decode='lazy', count=0):
+    """
+    Load packets from pcap file one by one.
+
+    This is a generator of (timestamp, packet) tuples, so only the current
+    packet is kept in the memory. Stop iterating to close the file.
+
+    @type filename: C{str}
+    @param filename: path to a file in pcap or pcapng format
+
+    @type filter: C{str}
+    @param filter: BPF filter
+
+    @type decode: C{str}
+    @param decode: 'lazy' (protocols are decoded on demand, see
+                   umit.umpa.protocols._decoder.decode()), 'full' or 'raw'
+                   (raw packets are not decoded) (default: I{'lazy'})
+
+    @type count: C{int}
+    @param count: number of packets; 0 means infinity (default: I{0})
+    """
+
+    # check arguments at once, the file is opened by the generator
+    _get_decoder(decode, None)
+    if not os.path.isfile(filename):
         raise UMPASniffingException("can't open file: %s" % filename)
 
-    if filter:
-        f.setfilter(filter)
-
-    for i, p in enumerate(f):
-        if i == count and count > 0:
-            break
-        ts, pkt = p
-        decoded_pkt = decode(pkt, f.datalink())
-        callback(ts, decoded_pkt, *callback_args)
+    return _iter_session(lambda: _open_file(filename), count, filter, decode)
+
+# state of worker processes of parallel functions (inherited by fork)
+_worker = {}
+
+class FileStats(object):
+    """
+    Aggregated statistics of captured packets.
+
+    Statistics of parts of a file can be merged with merge().
+    """
+
+    def __init__(self):
+        # number of packets and captured bytes
+        self.packets = 0
+        self.bytes = 0
+        # timestamps of the first and the last packet
+        self.start = None
+        self.end = None
+        # number of packets per protocol name
+        self.protocols = {}
+        # captured bytes per (source, destination) of IP/IPv6
+        self.talkers = {}
+
+    def add(self, ts, packet, length):
+        """
+        Count the decoded packet.
+
+        @type ts: C{float}
+        @param ts: timestamp of the packet
+
+        @type packet: C{umit.umpa.Packet}
+        @param packet: decoded packet
+
+        @type length: C{int}
+        @param length: captured length of the packet
+        """
+
+        self.packets += 1
+        self.bytes += length
+        if self.start is None or ts < self.start:
+            self.start = ts
+        if self.end is None or ts > self.end:
+            self.end = ts
+        protocols = self.protocols
+        for proto in packet.protos:
+            protocols[proto.name] = protocols.get(proto.name, 0) + 1
+            if proto.name in ('IP', 'IPV6'):
+                talkers = (proto.src, proto.dst)
+                self.talkers[talkers] = self.talkers.get(talkers, 0) + length
+
+    def merge(self, other):
+        """
+        Add statistics of other packets.
+
+        @type other: C{FileStats}
+        @param other: statistics to add
+        """
+
+        self.packets += other.packets
+        self.bytes += other.bytes
+        if other.start is not None:
+            if self.start is None or other.start < self.start:
+                self.start = other.start
+            if self.end is None or other.end > self.end:
+                self.end = other.end
+        for name in other.protocols:
+            self.protocols[name] = self.protocols.get(name, 0) + \
+                                                        other.protocols[name]
+        for talkers in other.talkers:
+            self.talkers[talkers] = self.talkers.get(talkers, 0) + \
+                                                        other.talkers[talkers]
+
+    def top_talkers(self, count=10):
+        """
+        Return pairs of hosts which sent the most bytes.
+
+        @type count: C{int}
+        @param count: number of pairs
+
+        @rtype: C{list}
+        @return: ((source, destination), bytes) tuples sorted by bytes.
+        """
+
+        talkers = sorted(self.talkers.items(), key=lambda item: item[1],
+                                                            reverse=True)
+        return talkers[:count]
+
+def _split_file(filename, parts):
+    """
+    Split the file into record-aligned chunks.
+
+    @rtype: C{list}
+    @return: chunks (see pcapfile.open_pcap.split())
+    """
+
+    if not os.path.isfile(filename):
+        raise UMPASniffingException("can't open file: %s" % filename)
+    f = pcapfile.open_pcap(filename)
+    try:
+        return f.split(parts)
+    finally:
+        f.close()
+
+def _init_worker(filename, filter, mode, func, args):
+    _worker['filename'] = filename
+    _worker['filter'] = filter
+    _worker['mode'] = mode
+    _worker['func'] = func
+    _worker['args'] = args
+
+def _iter_chunk(chunk):
+    """
+    Yield (timestamp, raw packet, decoded packet) tuples of the chunk.
+    """
+
+    f = pcapfile.open_pcap(_worker['filename'])
+    try:
+        f.seek(chunk)
+        if _worker['filter']:
+            f.setfilter(_worker['filter'])
+        decode_packet = _get_decoder(_worker['mode'], f.datalink())
+        for ts, pkt in f:
+            yield ts, pkt, decode_packet(pkt)
+    finally:
+        f.close()
+
+def _map_chunk(chunk):
+    """
+    Call the function for every packet of the chunk.
+
+    @rtype: C{list}
+    @return: (timestamp, result) tuples sorted by timestamps.
+    """
+
+    func = _worker['func']
+    args = _worker['args']
+    results = []
+    for ts, raw, packet in _iter_chunk(chunk):
+        result = func(ts, packet, *args)
+        if result is not None:
+            results.append((ts, result))
+    # stable, so packets with the same timestamps keep the order
+    results.sort(key=lambda item: item[0])
+    return results
+
+def _stats_chunk(chunk):
+    """
+    Return FileStats of the chunk.
+    """
+
+    stats = FileStats()
+    for ts, raw, packet in _iter_chunk(chunk):
+        stats.add(ts, packet, len(raw))
+    return stats
+
+def map_file(filename, func, args=(), filter=None, decode='lazy',
+                                                            processes=None):
+    """
+    Decode packets of pcap file by a pool of processes.
+
+    The file is split into record-aligned chunks which are decoded
+    by worker processes. The function is called in workers as
+    func(timestamp, packet, *args) and its results are merged
+    in the order of timestamps. Packet objects can't be passed between
+    processes, so the function should return only needed data
+    (None results are skipped, so the function may filter packets too).
+    The function has to be defined at the top level of a module.
+
+    Only pcap and pcapng formats are supported (see
+    umit.umpa.sniffing.libpcap.pcapfile).
+
+    @type filename: C{str}
+    @param filename: path to a file in pcap or pcapng format
+
+    @type func: C{func}
+    @param func: function with (timestamp, packet, *args) prototype
+
+    @type args: C{tuple}
+    @param args: additional arguments for the function
+
+    @type filter: C{str}
+    @param filter: BPF filter
+
+    @type decode: C{str}
+    @param decode: decode mode (see iter_file()) (default: I{'lazy'})
+
+    @type processes: C{int}
+    @param processes: number of processes (default: number of CPUs)
+
+    @rtype: C{list}
+    @return: (timestamp, result) tuples sorted by timestamps.
+    """
+
+    # check the mode before starting processes
+    _get_decoder(decode, None)
+
+    pool, processes = _parallel._pool(processes, _init_worker,
+                                (filename, filter, decode, func, args))
+    try:
+        chunks = _split_file(filename, processes * 4)
+    except:
+        pool.terminate()
+        raise
+    results = _parallel._run(pool, _map_chunk, chunks)
+
+    # chunks are in the order of the file, so equal timestamps
+    # are merged in this order
+    merged = heapq.merge(*[ [ (ts, i, j, result)
+                                for j, (ts, result) in enumerate(results[i]) ]
+                            for i in xrange(len(results)) ])
+    return [ (ts, result) for ts, i, j, result in merged ]
+
+def iter_file_stats(filename, filter=None, processes=None):
+    """
+    Compute statistics of pcap file by a pool of processes.
+
+    This is a generator of FileStats objects of chunks of the file
+    which are yielded as soon as workers finish them (not in order).
+    Merge them to get statistics of the whole file (see file_stats()).
+
+    @type filename: C{str}
+    @param filename: path to a file in pcap or pcapng format
+
+    @type filter: C{str}
+    @param filter: BPF filter
+
+    @type processes: C{int}
+    @param processes: number of processes (default: number of CPUs)
+    """
+
+    pool, processes = _parallel._pool(processes, _init_worker,
+                                    (filename, filter, 'lazy', None, ()))
+    try:
+        chunks = _split_file(filename, processes * 4)
+        for stats in pool.imap_unordered(_stats_chunk, chunks):
+            yield stats
+        pool.close()
+    finally:
+        # e.g. the generator is closed before the end
+        pool.terminate()
+        pool.join()
+
+def file_stats(filename, filter=None, processes=None):
+    """
+    Compute statistics of pcap file by a pool of processes.
+
+    Packets and captured bytes are counted per protocol and per pairs
+    of IP/IPv6 addresses (see FileStats.top_talkers()).
+
+    @type filename: C{str}
+    @param filename: path to a file in pcap or pcapng format
+
+    @type filter: C{str}
+    @param filter: BPF filter
+
+    @type processes: C{int}
+    @param processes: number of processes (default: number of CPUs)
+
+    @rtype: C{FileStats}
+    @return: statistics of the whole file.
+    """
+
+    stats = FileStats()
+    for chunk_stats in iter_file_stats(filename, filter, processes):
+        stats.merge(chunk_stats)
+    return stats
+
+def file_columns(filename, filter=None, count=0):
+    """
+    Load packets of pcap file into a columnar store.
+
+    Packets are kept raw in one buffer and described by columns of
+    timestamps, offsets of headers and fields, which can be filtered
+    by NumPy expressions (see umit.umpa.sniffing._columns). Packets are
+    decoded on demand by PacketColumns.packet().
+
+    @type filename: C{str}
+    @param filename: path to a file in pcap or pcapng format
+
+    @type filter: C{str}
+    @param filter: BPF filter
+
+    @type count: C{int}
+    @param count: number of packets; 0 means infinity (default: I{0})
+
+    @rtype: C{PacketColumns}
+    @return: the store of packets.
+    """
+
+    f = _open_file(filename)
+    try:
+        if filter:
+            f.setfilter(filter)
+        store = PacketColumns(f.datalink())
+        for i, (ts, pkt) in enumerate(f):
+            if i == count and count > 0:
+                break
+            store.append(ts, pkt)
+    finally:
+        f.close()
+    return store
+
+def iter_live(count=0, filter=None, device=None, timeout=0, snaplen=1024,
+                                                promisc=True, decode='lazy'):
+    """
+    Sniff packets and yield them one by one.
+
+    This is a generator of (timestamp, packet) tuples.
+    Stop iterating to close the session.
+
+    @type count: C{int}
+    @param count: number of sniffing packets; 0 means infinity (default: I{0})
+
+    @type filter: C{str}
+    @param filter: BPF filter
+
+    @type device: C{str}
+    @param device: interface for sniffing
+
+    @type timeout: C{int}
+    @param timeout: timeout for sniffing
+
+    @type snaplen: C{int}
+    @param snaplen: maximum number of bytes to capture of each packet
+                    (default: I{1024})
+
+    @type promisc: C{bool}
+    @param promisc: promiscous mode sniffing
+
+    @type decode: C{str}
+    @param decode: 'lazy', 'full' or 'raw' (see iter_file())
+    """
+
+    _get_decoder(decode, None)
+
+    return _iter_session(lambda: lpcap.open_pcap(device, snaplen, promisc,
+                                                 timeout),
+                         count, filter, decode)
+
+class AsyncSession(asyncore.dispatcher):
+    """
+    Capture session registered in asyncore's loop.
+
+    The callback is called for every captured packet when the session's
+    descriptor is readable, so one thread can sniff on many devices
+    (and send with umit.umpa.AsyncSocket) at the same time.
+    The backend has to support fileno() and setnonblock().
+
+    >>> session = sniff_async(callback, filter="tcp", device="eth0")
+    >>> asyncore.loop(use_poll=True)
+    """
+
+    def __init__(self, session, callback, callback_args=None, count=0,
+                                                decode='lazy', map=None):
+        """
+        Create a new AsyncSession().
+
+        @type session: C{open_pcap}
+        @param session: live capture descriptor
+
+        @type callback: C{func}
+        @param callback: function with (timestamp, pkt, *callback_args)
+                         prototype
+
+        @type callback_args: C{list}
+        @param callback_args: additional arguments for callback function
+
+        @type count: C{int}
+        @param count: number of packets; 0 means infinity. The session
+                      is closed after the last one (default: I{0})
+
+        @type decode: C{str}
+        @param decode: 'lazy', 'full' or 'raw' (see iter_file())
+
+        @type map: C{dict}
+        @param map: asyncore's map of channels (default: the global one)
+        """
+
+        asyncore.dispatcher.__init__(self, map=map)
+        self.session = session
+        self.callback = callback
+        if callback_args is None:
+            callback_args = []
+        self.callback_args = callback_args
+        self.count = count
+        self.captured = 0
+        self._decode = _get_decoder(decode, session.datalink())
+
+        session.setnonblock(True)
+        # the descriptor is duplicated and closed by the wrapper
+        self.set_socket(asyncore.file_wrapper(session.fileno()), map)
+        self.connected = True
+
+    def _handle_packet(self, ts, pkt):
+        if self.count > 0 and self.captured >= self.count:
+            return
+        self.captured += 1
+        self.callback(ts, self._decode(pkt), *self.callback_args)
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return False
+
+    def handle_read(self):
+        if self.count > 0:
+            self.session.dispatch(self.count - self.captured,
+                                  self._handle_packet)
+        else:
+            self.session.dispatch(-1, self._handle_packet)
+        if self.count > 0 and self.captured >= self.count:
+            self.close()
+
+    def close(self):
+        asyncore.dispatcher.close(self)
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+
+def sniff_async(callback, count=0, filter=None, device=None, snaplen=1024,
+                promisc=True, decode='lazy', callback_args=None, map=None):
+    """
+    Start sniffing in asyncore's loop.
+
+    Run asyncore.loop() to capture packets (the callback is called
+    for each).
+
+    @type callback: C{func}
+    @param callback: function with (timestamp, pkt, *callback_args) prototype
+
+    @type count: C{int}
+    @param count: number of sniffing packets; 0 means infinity (default: I{0})
+
+    @type filter: C{str}
+    @param filter: BPF filter
+
+    @type device: C{str}
+    @param device: interface for sniffing
+
+    @type snaplen: C{int}
+    @param snaplen: maximum number of bytes to capture of each packet
+                    (default: I{1024})
+
+    @type promisc: C{bool}
+    @param promisc: promiscous mode sniffing
+
+    @type decode: C{str}
+    @param decode: 'lazy', 'full' or 'raw' (see iter_file())
+
+    @type callback_args: C{list}
+    @param callback_args: additional arguments for callback function
+
+    @type map: C{dict}
+    @param map: asyncore's map of channels (default: the global one)
+
+    @rtype: C{AsyncSession}
+    @return: the session (close() it to stop sniffing).
+    """
+
+    _get_decoder(decode, None)
+
+    session = lpcap.open_pcap(device, snaplen, promisc, 0)
+    try:
+        if filter:
+            session.setfilter(filter)
+        return AsyncSession(session, callback, callback_args, count, decode,
+                                                                        map)
+    except Exception:
+        session.close()
+        raise
 
 def to_file(fname, count, filter=None, device=None, timeout=0, snaplen=1024,
                                                                 promisc=True):
@@ -0,0 +1,496 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2009 Adriano Monteiro Marques.
+#
+# Author: Bartosz SKOWRON <getxsick at gmail dot com>
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation; either version 2.1 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+
+"""
+Columnar store of captured packets.
+
+Raw packets are kept in one shared byte arena. Every packet is described
+by a row of columns: timestamp, captured length, offset in the arena
+and offsets of headers of found protocols (the payload too). Headers are
+found by the decoder without creating protocols' objects.
+
+Columns of fields (e.g. 'ip.src' or 'tcp.dstport') are gathered from
+the arena by NumPy operations on the first access, so packets are
+filtered by vectorized expressions and only needed rows are decoded:
+
+>>> store = umit.umpa.sniffing.file_columns('dump.pcap')
+>>> rows = store.where((store['tcp.dstport'] == 80) &
+...                    (store['ip.dst'] == store.encode('ip.dst', '10.0.0.1')))
+>>> packet = store.packet(rows[0])
+
+Only fields with a fixed position in the header (before any field
+of variable length, like options) can be used as columns. Values are raw,
+e.g. IPv4 addresses are numbers (see encode()). Packets without
+the protocol have 0 in columns of its fields (see has()).
+
+NumPy is an optional dependency. It's required by this module only.
+"""
+
+import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import umit.umpa.protocols
+from umit.umpa.protocols._consts import BYTE
+from umit.umpa.protocols._decoder import Decoder
+from umit.umpa.protocols._fields import PaddingField
+from umit.umpa.utils.exceptions import UMPAException, UMPAAttributeException
+import umit.umpa.utils.bits as _bits
+
+# the longest field which is stored as a number
+_MAX_INT_BITS = 64
+
+# offset of headers which are not in the packet
+_NO_HEADER = -1
+
+# cached positions of fields, (class, field's name) -> (offset, bits)
+_positions = {}
+
+def _get_class(name):
+    """
+    Return the protocol's class with the name (case-insensitive).
+
+    @type name: C{str}
+    @param name: name of the protocol
+
+    @rtype: C{class}
+    @return: protocol's class.
+    """
+
+    for cls in umit.umpa.protocols.get_all().values():
+        if cls.name.lower() == name.lower():
+            return cls
+    raise UMPAAttributeException("unknown protocol: %s" % name)
+
+def _get_position(cls, field_name):
+    """
+    Return the position of the field in the protocol's header.
+
+    @type cls: C{class}
+    @param cls: protocol's class
+
+    @type field_name: C{str}
+    @param field_name: name of the field
+
+    @rtype: C{tuple}
+    @return: (offset, length) of the field in bits.
+    """
+
+    key = (cls, field_name)
+    if key not in _positions:
+        proto = cls()
+        if field_name not in proto._ordered_fields:
+            raise UMPAAttributeException("%s is not a field of %s"
+                                                    % (field_name, cls.name))
+        offset = 0
+        for name in proto._ordered_fields:
+            field = proto.get_field(name)
+            if not field.active or not field.bits or \
+                                            isinstance(field, PaddingField):
+                raise UMPAAttributeException("%s.%s has no fixed position"
+                                                    % (cls.name, field_name))
+            if name == field_name:
+                break
+            offset += field.bits
+        _positions[key] = (offset, field.bits)
+    return _positions[key]
+
+def _split_name(name):
+    """
+    Split the name of the column into names of the protocol and the field.
+    """
+
+    try:
+        proto_name, field_name = name.split('.')
+    except ValueError:
+        raise UMPAAttributeException(name + " is not in 'proto.field' "
+                                                                    "format")
+    return proto_name, field_name
+
+def _get_dtype(bits):
+    """
+    Return the smallest unsigned type for numbers of the length.
+    """
+
+    for dtype in (numpy.uint8, numpy.uint16, numpy.uint32):
+        if bits <= numpy.dtype(dtype).itemsize * BYTE:
+            return dtype
+    return numpy.uint64
+
+def _to_numpy(items):
+    """
+    Return a copy of array.array as a NumPy array.
+
+    Views would be invalid after the array grows.
+    """
+
+    return numpy.frombuffer(items, dtype=items.typecode).copy()
+
+class PacketColumns(object):
+    """
+    Columnar store of captured packets of the same datalink.
+
+    Fill it by append()/extend() (or use umit.umpa.sniffing.file_columns())
+    and get columns by the store[name] syntax. Columns are:
+      - 'ts' - timestamps,
+      - 'length' - captured lengths,
+      - 'start' - offsets of packets in the arena,
+      - 'proto.field' - raw values of fields (e.g. 'ip.src', 'tcp.flags').
+
+    Offsets of headers are returned by offsets().
+    """
+
+    def __init__(self, linktype):
+        """
+        Create a new empty PacketColumns().
+
+        @type linktype: C{int}
+        @param linktype: datalink of 2nd layer
+        (return by datalink() method of pcap session)
+        """
+
+        if numpy is None:
+            raise UMPAException("NumPy is required for columnar stores")
+
+        self.linktype = linktype
+        self._decoder = Decoder(linktype)
+        self._arena = bytearray()
+        self._ts = array.array('d')
+        self._starts = array.array('L')
+        self._lengths = array.array('L')
+        # offsets of headers in packets per lowercase protocol's name
+        self._headers = {}
+        # NumPy columns (cleared when packets are added)
+        self._cache = {}
+
+    def __len__(self):
+        return len(self._ts)
+
+    def append(self, ts, raw):
+        """
+        Add the packet to the store.
+
+        @type ts: C{float}
+        @param ts: timestamp of the packet
+
+        @param raw: raw buffer of the packet
+        """
+
+        # backends may return views which are valid only until the next packet
+        raw = str(raw)
+        row = len(self._ts)
+        # NumPy views of the arena don't let it grow
+        self._cache.clear()
+
+        for proto, offset in self._decoder.headers(raw):
+            name = proto.name.lower()
+            offsets = self._headers.get(name)
+            if offsets is None:
+                offsets = array.array('l', [_NO_HEADER]) * row
+                self._headers[name] = offsets
+            # only the first header of the same protocol (e.g. tunnels)
+            if len(offsets) == row:
+                offsets.append(offset)
+        for offsets in self._headers.itervalues():
+            if len(offsets) == row:
+                offsets.append(_NO_HEADER)
+
+        self._ts.append(ts)
+        self._starts.append(len(self._arena))
+        self._lengths.append(len(raw))
+        self._arena.extend(raw)
+
+    def extend(self, packets):
+        """
+        Add packets to the store.
+
+        @param packets: iterable of (timestamp, raw buffer) tuples (e.g.
+        umit.umpa.sniffing.iter_file() in the 'raw' mode).
+        """
+
+        for ts, raw in packets:
+            self.append(ts, raw)
+
+    def __getitem__(self, name):
+        """
+        Return the column.
+
+        @type name: C{str}
+        @param name: 'ts', 'length', 'start' or 'proto.field'
+
+        @rtype: C{numpy.ndarray}
+        @return: one item per packet.
+        """
+
+        column = self._cache.get(name)
+        if column is None:
+            if name == 'ts':
+                column = _to_numpy(self._ts)
+            elif name == 'length':
+                column = _to_numpy(self._lengths)
+            elif name == 'start':
+                column = _to_numpy(self._starts)
+            else:
+                column = self._gather(name)
+            self._cache[name] = column
+        return column
+
+    def _gather(self, name):
+        """
+        Gather raw values of the field from the arena.
+
+        @type name: C{str}
+        @param name: name of the field (as 'proto.field').
+
+        @rtype: C{numpy.ndarray}
+        @return: column of the field.
+        """
+
+        proto_name, field_name = _split_name(name)
+        offset, bits = _get_position(_get_class(proto_name), field_name)
+        first = offset / BYTE
+        last = (offset + bits + BYTE - 1) / BYTE
+        size = last - first
+        if bits > _MAX_INT_BITS and (offset % BYTE or bits % BYTE):
+            raise UMPAException("%s is too long to be unaligned" % name)
+        if bits <= _MAX_INT_BITS and size * BYTE > _MAX_INT_BITS:
+            raise UMPAException("%s is unaligned to bytes" % name)
+
+        headers = self.offsets(proto_name)
+        present = (headers != _NO_HEADER) & \
+                                (headers + last <= self['length'])
+        positions = numpy.where(present,
+                                self['start'].astype(numpy.int64) + headers,
+                                0) + first
+        if len(self._arena):
+            arena = numpy.frombuffer(self._arena, dtype=numpy.uint8)
+            chunks = arena.take(positions[:, None] + numpy.arange(size),
+                                                                mode='clip')
+        else:
+            chunks = numpy.zeros((0, size), dtype=numpy.uint8)
+        chunks[~present] = 0
+
+        if bits > _MAX_INT_BITS:
+            return chunks.view('S%d' % size).ravel()
+
+        values = numpy.zeros(len(self), dtype=numpy.uint64)
+        for i in xrange(size):
+            values = (values << numpy.uint64(BYTE)) | chunks[:, i]
+        values >>= numpy.uint64(size * BYTE - offset % BYTE - bits)
+        if bits < _MAX_INT_BITS:
+            values &= numpy.uint64((1 << bits) - 1)
+        return values.astype(_get_dtype(bits))
+
+    def offsets(self, proto_name):
+        """
+        Return offsets of headers of the protocol in packets.
+
+        @type proto_name: C{str}
+        @param proto_name: name of the protocol (case-insensitive),
+        'payload' for offsets of payloads.
+
+        @rtype: C{numpy.ndarray}
+        @return: offsets in bytes from the begin of packets or -1 if packets
+        don't have the protocol.
+        """
+
+        name = proto_name.lower()
+        key = '@' + name
+        column = self._cache.get(key)
+        if column is None:
+            if name in self._headers:
+                column = _to_numpy(self._headers[name]).astype(numpy.int64)
+            else:
+                _get_class(name)
+                column = numpy.empty(len(self), dtype=numpy.int64)
+                column.fill(_NO_HEADER)
+            self._cache[key] = column
+        return column
+
+    def has(self, proto_name):
+        """
+        Return the mask of packets which have the protocol.
+
+        @type proto_name: C{str}
+        @param proto_name: name of the protocol (case-insensitive)
+
+        @rtype: C{numpy.ndarray}
+        @return: array of booleans.
+        """
+
+        return self.offsets(proto_name) != _NO_HEADER
+
+    def encode(self, name, value):
+        """
+        Convert the value of the field to the format of its column.
+
+        @type name: C{str}
+        @param name: name of the field (as 'proto.field').
+
+        @param value: value as accepted by the field (e.g. '10.0.0.1').
+
+        @return: the raw value (a number or a string for fields longer
+        than 64 bits).
+        """
+
+        proto_name, field_name = _split_name(name)
+        cls = _get_class(proto_name)
+        offset, bits = _get_position(cls, field_name)
+        field = cls().get_field(field_name)
+        field.set(value)
+        raw = field.fillout_raw()
+        if bits > _MAX_INT_BITS:
+            if isinstance(raw, str):
+                return raw
+            return _bits.number_to_bytes(raw, bits / BYTE)
+        if isinstance(raw, str):
+            return _bits.bytes_to_number(raw)
+        return raw
+
+    def where(self, mask):
+        """
+        Return numbers of rows which match the mask.
+
+        @type mask: C{numpy.ndarray}
+        @param mask: array of booleans (e.g. store['tcp.dstport'] == 80)
+
+        @rtype: C{numpy.ndarray}
+        @return: numbers of rows.
+        """
+
+        return numpy.flatnonzero(mask)
+
+    def select(self, rows):
+        """
+        Return a new store with selected packets.
+
+        @param rows: array of booleans or numbers of rows
+
+        @rtype: C{PacketColumns}
+        @return: the new store.
+        """
+
+        rows = numpy.asarray(rows)
+        if rows.dtype == numpy.bool_:
+            rows = numpy.flatnonzero(rows)
+
+        store = PacketColumns(self.linktype)
+        for name in self._headers:
+            store._headers[name] = array.array('l')
+        for row in rows.tolist():
+            start = self._starts[row]
+            length = self._lengths[row]
+            store._ts.append(self._ts[row])
+            store._starts.append(len(store._arena))
+            store._lengths.append(length)
+            store._arena.extend(self._arena[start:start + length])
+            for name, offsets in self._headers.iteritems():
+                store._headers[name].append(offsets[row])
+        return store
+
+    def raw(self, row):
+        """
+        Return the raw packet.
+
+        @type row: C{int}
+        @param row: number of the row
+
+        @rtype: C{str}
+        @return: raw buffer of the packet.
+        """
+
+        start = self._starts[row]
+        return str(self._arena[start:start + self._lengths[row]])
+
+    def payload(self, row):
+        """
+        Return the payload of the packet.
+
+        @type row: C{int}
+        @param row: number of the row
+
+        @rtype: C{str}
+        @return: data above the last decoded protocol (may be empty).
+        """
+
+        offsets = self._headers.get('payload')
+        if offsets is None or offsets[row] == _NO_HEADER:
+            return ''
+        start = self._starts[row]
+        return str(self._arena[start + offsets[row]:
+                                            start + self._lengths[row]])
+
+    def packet(self, row, lazy=False):
+        """
+        Decode the packet.
+
+        @type row: C{int}
+        @param row: number of the row
+
+        @type lazy: C{bool}
+        @param lazy: decode protocols on demand (default: I{False})
+
+        @rtype: C{umit.umpa.Packet}
+        @return: decoded packet
+        """
+
+        if lazy:
+            return Decoder(self.linktype, lazy).decode(self.raw(row))
+        return self._decoder.decode(self.raw(row))
+
+    def packets(self, rows=None, lazy=True):
+        """
+        Decode packets one by one.
+
+        This is a generator of (timestamp, packet) tuples.
+
+        @param rows: array of booleans or numbers of rows (default: all)
+
+        @type lazy: C{bool}
+        @param lazy: decode protocols on demand (default: I{True})
+        """
+
+        if rows is None:
+            rows = xrange(len(self))
+        else:
+            rows = numpy.asarray(rows)
+            if rows.dtype == numpy.bool_:
+                rows = numpy.flatnonzero(rows)
+            rows = rows.tolist()
+        decoder = Decoder(self.linktype, lazy)
+        for row in rows:
+            yield self._ts[row], decoder.decode(self.raw(row))
+
+    @property
+    def nbytes(self):
+        """
+        Memory used by packets and columns of offsets (without cached
+        columns of fields).
+        """
+
+        size = len(self._arena)
+        for items in [self._ts, self._starts, self._lengths] + \
+                                                self._headers.values():
+            size += len(items) * items.itemsize
+        return size
@@ -136,6 +136,35 @@ class open_pcap(object):
         raise NotImplementedError("not implemented method for the "
                         "selected libpcap backend or abstract module")
 
+    def fileno(self):
+        """
+        Return file descriptor which is readable when packets are ready
+        (for select(), poll() etc.).
+        """
+
+        raise NotImplementedError("not implemented method for the "
+                        "selected libpcap backend or abstract module")
+
+    def setnonblock(self, nonblock=True):
+        """
+        Set non-blocking mode. dispatch() returns 0 immediately then
+        if there are no packets.
+
+        @type nonblock: C{bool}
+        @param nonblock: True for non-blocking mode
+        """
+
+        raise NotImplementedError("not implemented method for the "
+                        "selected libpcap backend or abstract module")
+
+    def close(self):
+        """
+        Close the capture descriptor.
+        """
+
+        raise NotImplementedError("not implemented method for the "
+                        "selected libpcap backend or abstract module")
+
 class dumper(object):
     """
     Store sniffed packtes into a savefile.
@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2009 Adriano Monteiro Marques.
+#
+# Author: Bartosz SKOWRON <getxsick at gmail dot com>
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation; either version 2.1 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+
+
+"""
+BPF (Berkeley Packet Filter) support for native backends.
+
+Filters are compiled by libpcap library (loaded by ctypes) and can be
+attached to sockets or run by the interpreter for offline capturing.
+"""
+
+import ctypes
+import ctypes.util
+import struct
+
+from umit.umpa.protocols._consts import DLT_EN10MB
+from umit.umpa.utils.exceptions import UMPASniffingException
+
+PCAP_NETMASK_UNKNOWN = 0xffffffff # from pcap/pcap.h
+
+# instruction classes, sizes, modes and operations from pcap/bpf.h
+BPF_LD = 0x00
+BPF_LDX = 0x01
+BPF_ST = 0x02
+BPF_STX = 0x03
+BPF_ALU = 0x04
+BPF_JMP = 0x05
+BPF_RET = 0x06
+BPF_MISC = 0x07
+
+BPF_W = 0x00
+BPF_H = 0x08
+BPF_B = 0x10
+
+BPF_IMM = 0x00
+BPF_ABS = 0x20
+BPF_IND = 0x40
+BPF_MEM = 0x60
+BPF_LEN = 0x80
+BPF_MSH = 0xa0
+
+BPF_ADD = 0x00
+BPF_SUB = 0x10
+BPF_MUL = 0x20
+BPF_DIV = 0x30
+BPF_OR = 0x40
+BPF_AND = 0x50
+BPF_LSH = 0x60
+BPF_RSH = 0x70
+BPF_NEG = 0x80
+BPF_MOD = 0x90
+BPF_XOR = 0xa0
+
+BPF_JA = 0x00
+BPF_JEQ = 0x10
+BPF_JGT = 0x20
+BPF_JGE = 0x30
+BPF_JSET = 0x40
+
+BPF_K = 0x00
+BPF_X = 0x08
+BPF_A = 0x10
+
+BPF_TAX = 0x00
+BPF_TXA = 0x80
+
+BPF_MEMWORDS = 16
+
+_MASK = 0xffffffff
+_SIZES = { BPF_W : ('!I', 4), BPF_H : ('!H', 2), BPF_B : ('!B', 1) }
+
+class bpf_insn(ctypes.Structure):
+    """
+    struct bpf_insn (struct sock_filter) from linux/filter.h
+    """
+
+    _fields_ = [('code', ctypes.c_ushort),
+                ('jt', ctypes.c_ubyte),
+                ('jf', ctypes.c_ubyte),
+                ('k', ctypes.c_uint32)]
+
+class bpf_program(ctypes.Structure):
+    """
+    struct bpf_program from pcap/bpf.h
+    """
+
+    _fields_ = [('bf_len', ctypes.c_uint),
+                ('bf_insns', ctypes.POINTER(bpf_insn))]
+
+def compile_filter(filter, snaplen=65535, linktype=DLT_EN10MB):
+    """
+    Compile the filter to BPF instructions.
+
+    libpcap library is needed (it's loaded by ctypes).
+
+    @type filter: C{str}
+    @param filter: filter string in BPF format (see pcap manual)
+
+    @type snaplen: C{int}
+    @param snaplen: maximum number of bytes to capture
+
+    @type linktype: C{int}
+    @param linktype: datalink of captured frames
+
+    @rtype: C{list}
+    @return: (code, jt, jf, k) instructions (like tcpdump -dd prints).
+    """
+
+    libname = ctypes.util.find_library('pcap')
+    if libname is None:
+        raise UMPASniffingException("libpcap library is needed to compile "
+                        "filters. Pass compiled instructions instead.")
+    lib = ctypes.CDLL(libname)
+
+    program = bpf_program()
+    if lib.pcap_compile_nopcap(snaplen, linktype, ctypes.byref(program),
+                               filter, 1, PCAP_NETMASK_UNKNOWN) < 0:
+        raise UMPASniffingException("wrong filter: " + filter)
+    insns = [ (insn.code, insn.jt, insn.jf, insn.k)
+                                for insn in program.bf_insns[:program.bf_len] ]
+    lib.pcap_freecode(ctypes.byref(program))
+    return insns
+
+def run_filter(insns, packet, wirelen=None):
+    """
+    Run BPF program for the packet.
+
+    This is a Python version of bpf_filter() from libpcap.
+
+    @type insns: C{list}
+    @param insns: (code, jt, jf, k) instructions
+
+    @param packet: raw packet (any buffer)
+
+    @type wirelen: C{int}
+    @param wirelen: original length of the packet (default: length of
+                    the packet)
+
+    @rtype: C{int}
+    @return: number of bytes to accept (0 means the packet is dropped).
+    """
+
+    if wirelen is None:
+        wirelen = len(packet)
+    buflen = len(packet)
+    a = 0
+    x = 0
+    mem = [0] * BPF_MEMWORDS
+    pc = 0
+    while True:
+        code, jt, jf, k = insns[pc]
+        pc += 1
+        cls = code & 0x07
+
+        if cls == BPF_RET:
+            if code & 0x18 == BPF_A:
+                return a
+            if code & 0x18 == BPF_X:
+                return x
+            return k
+
+        elif cls == BPF_LD or cls == BPF_LDX:
+            mode = code & 0xe0
+            if mode == BPF_IMM:
+                value = k
+            elif mode == BPF_LEN:
+                value = wirelen
+            elif mode == BPF_MEM:
+                value = mem[k]
+            elif mode == BPF_MSH:
+                if k >= buflen:
+                    return 0
+                value = (ord(packet[k]) & 0x0f) << 2
+            else:
+                offset = k
+                if mode == BPF_IND:
+                    offset = (x + k) & _MASK
+                fmt, size = _SIZES[code & 0x18]
+                if offset + size > buflen:
+                    return 0
+                value = struct.unpack_from(fmt, packet, offset)[0]
+            if cls == BPF_LD:
+                a = value
+            else:
+                x = value
+
+        elif cls == BPF_ST:
+            mem[k] = a
+        elif cls == BPF_STX:
+            mem[k] = x
+
+        elif cls == BPF_ALU:
+            op = code & 0xf0
+            if op == BPF_NEG:
+                a = -a & _MASK
+                continue
+            if code & 0x08 == BPF_X:
+                operand = x
+            else:
+                operand = k
+            if op == BPF_ADD:
+                a = (a + operand) & _MASK
+            elif op == BPF_SUB:
+                a = (a - operand) & _MASK
+            elif op == BPF_MUL:
+                a = (a * operand) & _MASK
+            elif op == BPF_DIV or op == BPF_MOD:
+                if operand == 0:
+                    return 0
+                if op == BPF_DIV:
+                    a = a / operand
+                else:
+                    a = a % operand
+            elif op == BPF_OR:
+                a |= operand
+            elif op == BPF_AND:
+                a &= operand
+            elif op == BPF_LSH:
+                a = (a << operand) & _MASK
+            elif op == BPF_RSH:
+                a >>= operand
+            elif op == BPF_XOR:
+                a ^= operand
+
+        elif cls == BPF_JMP:
+            op = code & 0xf0
+            if op == BPF_JA:
+                pc += k
+                continue
+            if code & 0x08 == BPF_X:
+                operand = x
+            else:
+                operand = k
+            if op == BPF_JEQ:
+                result = a == operand
+            elif op == BPF_JGT:
+                result = a > operand
+            elif op == BPF_JGE:
+                result = a >= operand
+            else:
+                result = a & operand
+            if result:
+                pc += jt
+            else:
+                pc += jf
+
+        else:
+            if code & 0xf8 == BPF_TXA:
+                a = x
+            else:
+                x = a
@@ -0,0 +1,773 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2009 Adriano Monteiro Marques.
+#
+# Author: Bartosz SKOWRON <getxsick at gmail dot com>
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation; either version 2.1 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+
+
+"""
+Native reader and writer of pcap and pcapng files.
+
+Files are memory-mapped and packets are returned as buffer objects
+pointing into the map, so they are not copied. No libpcap's wrapper
+is needed, so offline functions of umit.umpa.sniffing use this backend
+even if no wrapper is installed (libpcap library is used to compile
+BPF filters only, see umit.umpa.sniffing.libpcap._bpf).
+
+Supported formats:
+ - pcap in both byte orders with microsecond or nanosecond timestamps,
+ - pcapng with Section Header, Interface Description, Enhanced Packet
+   and Simple Packet blocks (other blocks are skipped).
+
+Only offline capturing is supported.
+
+PcapWriter writes captured packets or Packet objects to files.
+Records are collected in a buffer and written at once, so there is
+no system call per packet.
+"""
+
+import mmap
+import os
+import struct
+import time
+
+from umit.umpa.protocols._consts import DLT_EN10MB, DLT_RAW
+
+from umit.umpa.sniffing.libpcap._abstract import *
+from umit.umpa.sniffing.libpcap._bpf import compile_filter, run_filter
+from umit.umpa.utils.exceptions import UMPASniffingException
+
+# see umit.umpa.sniffing.libpcap._abstract for docstrings
+
+# magic numbers as read in little-endian order
+PCAP_MAGIC = 0xa1b2c3d4
+PCAP_MAGIC_SWAPPED = 0xd4c3b2a1
+PCAP_NSEC_MAGIC = 0xa1b23c4d
+PCAP_NSEC_MAGIC_SWAPPED = 0x4d3cb2a1
+PCAPNG_BYTE_ORDER_MAGIC = 0x1a2b3c4d
+
+# pcapng block types and options
+PCAPNG_SHB = 0x0a0d0d0a
+PCAPNG_IDB = 0x00000001
+PCAPNG_SPB = 0x00000003
+PCAPNG_EPB = 0x00000006
+OPT_ENDOFOPT = 0
+IF_SNAPLEN = 2
+IF_TSRESOL = 9
+IF_TSOFFSET = 14
+
+# LINKTYPE_ value of raw IP in files (DLT_RAW differs between platforms)
+LINKTYPE_RAW = 101
+
+_PCAP_MAGICS = {
+    PCAP_MAGIC : ('<', 1e6),
+    PCAP_MAGIC_SWAPPED : ('>', 1e6),
+    PCAP_NSEC_MAGIC : ('<', 1e9),
+    PCAP_NSEC_MAGIC_SWAPPED : ('>', 1e9),
+}
+
+class _Interface(object):
+    """
+    Interface of pcapng section (described by Interface Description Block).
+    """
+
+    def __init__(self, linktype, snaplen, units=1e6, offset=0):
+        """
+        @type linktype: C{int}
+        @param linktype: datalink of packets
+
+        @type snaplen: C{int}
+        @param snaplen: maximum number of bytes of packets (0 means no limit)
+
+        @type units: C{float}
+        @param units: timestamp units per second
+
+        @type offset: C{int}
+        @param offset: offset of timestamps in seconds
+        """
+
+        self.linktype = linktype
+        self.snaplen = snaplen
+        self.units = units
+        self.offset = offset
+
+class open_pcap(open_pcap):
+    def __init__(self, device=None, snaplen=1024, promisc=True, to_ms=0):
+        """
+        @type device: C{str}
+        @param device: path to a file in pcap or pcapng format
+
+        Other arguments are ignored (they are for compatibility with
+        other backends).
+        """
+
+        if device is None:
+            raise UMPASniffingException("live capturing is not supported")
+        self.device = device
+
+        try:
+            f = open(device, 'rb')
+        except IOError, msg:
+            raise UMPASniffingException(msg)
+        try:
+            try:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, EnvironmentError):
+                # e.g. an empty file can't be mapped
+                raise UMPASniffingException("unknown file format: %s" %
+                                                                    device)
+        finally:
+            f.close()
+
+        self._filter = None
+        self._end = len(self._map)
+        try:
+            if len(self._map) < 4:
+                raise UMPASniffingException("unknown file format: %s" %
+                                                                    device)
+            magic, = struct.unpack_from('<I', self._map, 0)
+            if magic in _PCAP_MAGICS:
+                self._open_pcap(magic)
+            elif magic == PCAPNG_SHB:
+                self._open_pcapng()
+            else:
+                raise UMPASniffingException("unknown file format: %s" %
+                                                                    device)
+        except (UMPASniffingException, struct.error), msg:
+            self._map.close()
+            if isinstance(msg, struct.error):
+                raise UMPASniffingException("truncated file: %s" % device)
+            raise
+
+    def _open_pcap(self, magic):
+        """
+        Read the global header of pcap file.
+        """
+
+        order, self._units = _PCAP_MAGICS[magic]
+        self.snaplen, self._linktype = struct.unpack_from(order + 'II',
+                                                          self._map, 16)
+        self._record = struct.Struct(order + 'IIII')
+        self._offset = 24
+        self._read = self._read_pcap
+
+    def _open_pcapng(self):
+        """
+        Find the first interface of pcapng file.
+        """
+
+        self._interfaces = []
+        self._order = '<'
+        self._offset = 0
+        self._read = self._read_pcapng
+
+        # the first interface is described before any packet
+        offset = 0
+        order = '<'
+        while offset + 12 <= len(self._map):
+            block_type, = struct.unpack_from(order + 'I', self._map, offset)
+            if block_type == PCAPNG_SHB:
+                order = self._byte_order(offset)
+            length, = struct.unpack_from(order + 'I', self._map, offset + 4)
+            if block_type == PCAPNG_IDB:
+                self._linktype, self.snaplen = struct.unpack_from(
+                                        order + 'H2xI', self._map, offset + 8)
+                return
+            if length < 12:
+                break
+            offset += length
+        raise UMPASniffingException("no interface in file: %s" % self.device)
+
+    def _byte_order(self, offset):
+        """
+        Return byte order of pcapng section which starts at the offset.
+        """
+
+        magic, = struct.unpack_from('<I', self._map, offset + 8)
+        if magic == PCAPNG_BYTE_ORDER_MAGIC:
+            return '<'
+        return '>'
+
+    def _read_pcap(self):
+        """
+        Read the next packet record of pcap file.
+
+        @rtype: C{tuple}
+        @return: (timestamp, packet, original length) or None at the end.
+        """
+
+        offset = self._offset
+        if offset >= self._end:
+            return None
+        try:
+            sec, frac, caplen, length = self._record.unpack_from(self._map,
+                                                                    offset)
+        except struct.error:
+            raise UMPASniffingException("truncated file: %s" % self.device)
+        offset += 16
+        if offset + caplen > len(self._map):
+            raise UMPASniffingException("truncated file: %s" % self.device)
+        self._offset = offset + caplen
+        return sec + frac / self._units, buffer(self._map, offset, caplen), \
+                                                                    length
+
+    def _read_interface(self, offset, length):
+        """
+        Read Interface Description Block of pcapng file.
+        """
+
+        order = self._order
+        linktype, snaplen = struct.unpack_from(order + 'H2xI', self._map,
+                                                                offset + 8)
+        iface = _Interface(linktype, snaplen)
+
+        position = offset + 16
+        end = offset + length - 4
+        while position + 4 <= end:
+            code, size = struct.unpack_from(order + 'HH', self._map, position)
+            position += 4
+            if code == OPT_ENDOFOPT:
+                break
+            if code == IF_TSRESOL:
+                resol = ord(self._map[position])
+                if resol & 0x80:
+                    iface.units = float(2 ** (resol & 0x7f))
+                else:
+                    iface.units = float(10 ** resol)
+            elif code == IF_TSOFFSET:
+                iface.offset, = struct.unpack_from(order + 'q', self._map,
+                                                                    position)
+            position += (size + 3) & ~3
+        self._interfaces.append(iface)
+
+    def _read_pcapng(self):
+        """
+        Read blocks of pcapng file until the next packet.
+
+        @rtype: C{tuple}
+        @return: (timestamp, packet, original length) or None at the end.
+        """
+
+        data = self._map
+        size = len(data)
+        while self._offset < self._end:
+            offset = self._offset
+            try:
+                block_type, = struct.unpack_from(self._order + 'I', data,
+                                                                    offset)
+                if block_type == PCAPNG_SHB:
+                    # new section; interfaces are described again
+                    self._order = self._byte_order(offset)
+                    self._interfaces = []
+                length, = struct.unpack_from(self._order + 'I', data,
+                                                                offset + 4)
+            except struct.error:
+                raise UMPASniffingException("truncated file: %s" %
+                                                                self.device)
+            if length < 12 or offset + length > size:
+                raise UMPASniffingException("truncated file: %s" %
+                                                                self.device)
+            self._offset = offset + length
+
+            if block_type == PCAPNG_EPB:
+                iface_id, high, low, caplen, wirelen = struct.unpack_from(
+                                        self._order + 'IIIII', data, offset + 8)
+                try:
+                    iface = self._interfaces[iface_id]
+                except IndexError:
+                    raise UMPASniffingException("unknown interface %d in "
+                                        "file: %s" % (iface_id, self.device))
+                caplen = min(caplen, length - 32)
+                ts = ((high << 32) | low) / iface.units + iface.offset
+                return ts, buffer(data, offset + 28, caplen), wirelen
+            elif block_type == PCAPNG_SPB:
+                wirelen, = struct.unpack_from(self._order + 'I', data,
+                                                                offset + 8)
+                caplen = min(wirelen, length - 16)
+                if self._interfaces and self._interfaces[0].snaplen:
+                    caplen = min(caplen, self._interfaces[0].snaplen)
+                # Simple Packet Blocks have no timestamps
+                return 0, buffer(data, offset + 12, caplen), wirelen
+            elif block_type == PCAPNG_IDB:
+                self._read_interface(offset, length)
+        return None
+
+    def _skip_pcap(self, boundary):
+        """
+        Skip records of pcap file which start before the boundary.
+        """
+
+        data = self._map
+        size = len(data)
+        unpack = self._record.unpack_from
+        offset = self._offset
+        try:
+            while offset < boundary and offset < size:
+                offset += 16 + unpack(data, offset)[2]
+        except struct.error:
+            raise UMPASniffingException("truncated file: %s" % self.device)
+        self._offset = min(offset, size)
+
+    def _skip_pcapng(self, boundary):
+        """
+        Skip blocks of pcapng file which start before the boundary.
+
+        Section headers and interfaces are read, so the state of the reader
+        is valid at the new offset.
+        """
+
+        data = self._map
+        size = len(data)
+        offset = self._offset
+        while offset < boundary and offset < size:
+            try:
+                block_type, = struct.unpack_from(self._order + 'I', data,
+                                                                    offset)
+                if block_type == PCAPNG_SHB:
+                    self._order = self._byte_order(offset)
+                    self._interfaces = []
+                length, = struct.unpack_from(self._order + 'I', data,
+                                                                offset + 4)
+            except struct.error:
+                raise UMPASniffingException("truncated file: %s" %
+                                                                self.device)
+            if length < 12 or offset + length > size:
+                raise UMPASniffingException("truncated file: %s" %
+                                                                self.device)
+            if block_type == PCAPNG_IDB:
+                self._read_interface(offset, length)
+            offset += length
+        self._offset = offset
+
+    def _get_state(self):
+        """
+        Return the state of the reader needed to read from the current offset.
+        """
+
+        if self._read == self._read_pcapng:
+            return self._order, tuple(self._interfaces)
+        return None
+
+    def split(self, parts):
+        """
+        Split the rest of the file into chunks aligned to records.
+
+        Chunks have similar sizes in bytes and can be read independently
+        (e.g. by other processes) after seek(). Only headers of records
+        are read, packets are not touched.
+
+        @type parts: C{int}
+        @param parts: maximum number of chunks
+
+        @rtype: C{list}
+        @return: chunks as (start offset, end offset, state) tuples.
+        """
+
+        start = self._offset
+        state = self._get_state()
+        size = len(self._map)
+        chunks = []
+        try:
+            for i in xrange(1, parts + 1):
+                begin = self._offset
+                begin_state = self._get_state()
+                if i == parts:
+                    self._offset = size
+                elif self._read == self._read_pcapng:
+                    self._skip_pcapng(start + (size - start) * i // parts)
+                else:
+                    self._skip_pcap(start + (size - start) * i // parts)
+                if self._offset > begin:
+                    chunks.append((begin, self._offset, begin_state))
+        finally:
+            self.seek((start, self._end, state))
+        return chunks
+
+    def seek(self, chunk):
+        """
+        Limit reading to the chunk returned by split().
+
+        @type chunk: C{tuple}
+        @param chunk: (start offset, end offset, state)
+        """
+
+        self._offset, self._end, state = chunk
+        if state is not None:
+            self._order, interfaces = state
+            self._interfaces = list(interfaces)
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        """
+        Return the next packet of the file.
+
+        Packets are buffer objects pointing into the mapped file,
+        so they are valid until the file is closed.
+
+        @rtype: C{tuple}
+        @return: (timestamp, packet)
+        """
+
+        while True:
+            record = self._read()
+            if record is None:
+                raise StopIteration
+            ts, packet, wirelen = record
+            if self._filter is None:
+                return ts, packet
+            accepted = run_filter(self._filter, packet, wirelen)
+            if accepted:
+                if accepted < len(packet):
+                    packet = packet[:accepted]
+                return ts, packet
+
+    def dispatch(self, cnt, callback, *user):
+        count = 0
+        for ts, packet in self:
+            callback(ts, packet, *user)
+            count += 1
+            if count == cnt:
+                break
+        return count
+
+    def loop(self, cnt, callback, *user):
+        return self.dispatch(cnt, callback, *user)
+
+    def setfilter(self, filter):
+        """
+        Specify a filter.
+
+        Filters are run by the BPF interpreter for every packet.
+
+        @type filter: C{str} or C{list}
+        @param filter: filter string in BPF format (see pcap manual)
+                       or compiled (code, jt, jf, k) instructions
+        """
+
+        if isinstance(filter, basestring):
+            filter = compile_filter(filter, self.snaplen or 65535,
+                                    self.datalink())
+        self._filter = list(filter)
+
+    def datalink(self):
+        """
+        Return datalink value.
+
+        For pcapng files it's datalink of the first interface.
+        """
+
+        if self._linktype == LINKTYPE_RAW:
+            return DLT_RAW
+        return self._linktype
+
+    def close(self):
+        """
+        Close the file.
+
+        Packets returned before are not valid anymore.
+        """
+
+        self._map.close()
+
+class PcapWriter(object):
+    """
+    Buffered writer of pcap/pcapng files.
+
+    Captured packets (timestamp and raw data) and Packet objects
+    (or anything else with get_raw() method) are accepted.
+
+    Files can be rotated by size or time. Next files are named with
+    a number suffix (e.g. dump.pcap, dump.pcap.1, dump.pcap.2).
+
+    >>> writer = PcapWriter("dump.pcap")
+    >>> writer.write(Packet(Ethernet(), IP(), TCP()))
+    >>> writer.write(raw, ts)
+    >>> writer.close()
+    """
+
+    def __init__(self, filename, linktype=None, snaplen=65535, format='pcap',
+                    nsec=False, buffer_size=2**20, flush_interval=None,
+                    rotate_size=None, rotate_interval=None):
+        """
+        Create a new PcapWriter() and open the file.
+
+        @type filename: C{str}
+        @param filename: path to the file
+
+        @type linktype: C{int}
+        @param linktype: datalink of packets; if None it's taken from
+                         the first Packet object (Ethernet if raw data
+                         is written) (default: I{None})
+
+        @type snaplen: C{int}
+        @param snaplen: maximum number of bytes stored of each packet
+                        (default: I{65535})
+
+        @type format: C{str}
+        @param format: 'pcap' or 'pcapng' (default: I{'pcap'})
+
+        @type nsec: C{bool}
+        @param nsec: store timestamps with nanosecond resolution
+                     (default: I{False})
+
+        @type buffer_size: C{int}
+        @param buffer_size: number of bytes collected before writing
+                            (default: I{1MiB})
+
+        @type flush_interval: C{float}
+        @param flush_interval: maximum time in seconds that records stay
+                               in the buffer (checked while writing)
+
+        @type rotate_size: C{int}
+        @param rotate_size: maximum size of a file in bytes
+
+        @type rotate_interval: C{float}
+        @param rotate_interval: maximum time in seconds of writing to
+                                a file
+        """
+
+        if format not in ('pcap', 'pcapng'):
+            raise UMPASniffingException("unknown file format: %s" % format)
+        self.filename = filename
+        self.linktype = linktype
+        self.snaplen = snaplen
+        self.format = format
+        self.nsec = nsec
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.rotate_size = rotate_size
+        self.rotate_interval = rotate_interval
+
+        self.filenames = []
+        self._file = None
+        self._chunks = []
+        self._buffered = 0
+        self._written = 0
+        self._records = 0
+        self._opened = None
+        self._flushed = None
+        if nsec:
+            self._units = 1000000000
+        else:
+            self._units = 1000000
+        if linktype is not None:
+            self._open()
+
+    def _file_linktype(self):
+        """
+        Return linktype stored in the file.
+        """
+
+        if self.linktype == DLT_RAW:
+            return LINKTYPE_RAW
+        return self.linktype
+
+    def _header(self):
+        """
+        Return header of a new file.
+        """
+
+        if self.format == 'pcap':
+            if self.nsec:
+                magic = PCAP_NSEC_MAGIC
+            else:
+                magic = PCAP_MAGIC
+            return struct.pack('=IHHiIII', magic, 2, 4, 0, 0, self.snaplen,
+                                                    self._file_linktype())
+
+        shb = struct.pack('=IIIHHqI', PCAPNG_SHB, 28, PCAPNG_BYTE_ORDER_MAGIC,
+                                                            1, 0, -1, 28)
+        options = struct.pack('=HHI', IF_SNAPLEN, 4, self.snaplen)
+        if self.nsec:
+            options += struct.pack('=HHB3x', IF_TSRESOL, 1, 9)
+        options += struct.pack('=HH', OPT_ENDOFOPT, 0)
+        length = 20 + len(options)
+        idb = struct.pack('=IIHHI', PCAPNG_IDB, length,
+                          self._file_linktype(), 0, self.snaplen) + \
+                                    options + struct.pack('=I', length)
+        return shb + idb
+
+    def _open(self):
+        """
+        Open the next file and write its header.
+        """
+
+        filename = self.filename
+        if self.filenames:
+            filename = "%s.%d" % (self.filename, len(self.filenames))
+        try:
+            # the buffer is ours, so write directly to the file
+            self._file = open(filename, 'wb', 0)
+        except IOError, msg:
+            raise UMPASniffingException(msg)
+        self.filenames.append(filename)
+        self._opened = time.time()
+        self._flushed = self._opened
+        self._written = 0
+        self._records = 0
+        header = self._header()
+        self._chunks.append(header)
+        self._buffered += len(header)
+
+    def _rotate(self, length):
+        """
+        Check if the next record of the length needs a new file.
+        """
+
+        if not self._records:
+            # at least one record per file
+            return False
+        if self.rotate_size is not None and \
+                    self._written + self._buffered + length > self.rotate_size:
+            return True
+        if self.rotate_interval is not None and \
+                    time.time() - self._opened >= self.rotate_interval:
+            return True
+        return False
+
+    def write(self, packet, ts=None):
+        """
+        Write a packet.
+
+        @param packet: Packet object (anything with get_raw()), raw packet
+                       (str or buffer) or (timestamp, raw packet) tuple
+
+        @type ts: C{float}
+        @param ts: timestamp of the packet (default: current time)
+        """
+
+        if isinstance(packet, tuple):
+            ts, packet = packet
+        if hasattr(packet, 'get_raw'):
+            linktype = self._get_linktype(packet)
+            packet = packet.get_raw()
+        else:
+            linktype = self.linktype
+            if linktype is None:
+                linktype = DLT_EN10MB
+        if self._file is None:
+            if self._chunks is None:
+                raise UMPASniffingException("the writer is closed")
+            self.linktype = linktype
+            self._open()
+        elif linktype != self.linktype:
+            raise UMPASniffingException("wrong datalink of the packet: %d "
+                                        "(%d expected)" % (linktype,
+                                                           self.linktype))
+
+        if ts is None:
+            ts = time.time()
+        length = len(packet)
+        caplen = min(length, self.snaplen)
+        if caplen < length or not isinstance(packet, str):
+            packet = str(packet[:caplen])
+        units = int(round(ts * self._units))
+
+        if self.format == 'pcap':
+            header = struct.pack('=IIII', units // self._units,
+                                 units % self._units, caplen, length)
+            padding = ''
+        else:
+            padding = '\0' * (-caplen % 4)
+            block_length = 32 + caplen + len(padding)
+            header = struct.pack('=IIIIIII', PCAPNG_EPB, block_length, 0,
+                                 units >> 32, units & 0xffffffff, caplen,
+                                 length)
+            padding += struct.pack('=I', block_length)
+
+        if (self.rotate_size is not None or
+                        self.rotate_interval is not None) and \
+                        self._rotate(len(header) + caplen + len(padding)):
+            self._close_file()
+            self._open()
+
+        self._chunks.append(header)
+        self._chunks.append(packet)
+        if padding:
+            self._chunks.append(padding)
+        self._buffered += len(header) + caplen + len(padding)
+        self._records += 1
+
+        if self._buffered >= self.buffer_size:
+            self.flush()
+        elif self.flush_interval is not None and \
+                        time.time() - self._flushed >= self.flush_interval:
+            self.flush()
+
+    def write_many(self, packets):
+        """
+        Write packets.
+
+        @type packets: C{list}
+        @param packets: packets as accepted by write()
+        """
+
+        for packet in packets:
+            self.write(packet)
+
+    def _get_linktype(self, packet):
+        """
+        Return datalink of the Packet object.
+        """
+
+        protos = packet.protos
+        if protos and protos[0].layer == 2:
+            return protos[0].protocol_id
+        return DLT_RAW
+
+    def flush(self):
+        """
+        Write buffered records to the file.
+        """
+
+        if self._file is None or not self._chunks:
+            return
+        try:
+            self._file.write(''.join(self._chunks))
+        except IOError, msg:
+            raise UMPASniffingException(msg)
+        self._written += self._buffered
+        self._chunks = []
+        self._buffered = 0
+        self._flushed = time.time()
+
+    def _close_file(self):
+        """
+        Flush and close the current file.
+        """
+
+        self.flush()
+        self._file.close()
+        self._file = None
+
+    def close(self):
+        """
+        Flush buffered records and close the file.
+        """
+
+        if self._file is not None:
+            self._close_file()
+        self._chunks = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
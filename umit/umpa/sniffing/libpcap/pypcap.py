@@ -74,6 +74,16 @@ class open_pcap(open_pcap):
     def datalink(self):
         return self._pcap.datalink()
 
+    def fileno(self):
+        return self._pcap.fileno()
+
+    def setnonblock(self, nonblock=True):
+        self._pcap.setnonblock(nonblock)
+
+    def close(self):
+        # pypcap closes the descriptor when the object is deleted
+        self._pcap = None
+
 class dumper(dumper):
     def __init__(self, p=None, fname=None, open=True):
         if p is not None:
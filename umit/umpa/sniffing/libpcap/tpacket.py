@@ -0,0 +1,362 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2009 Adriano Monteiro Marques.
+#
+# Author: Bartosz SKOWRON <getxsick at gmail dot com>
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation; either version 2.1 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+
+"""
+Linux PACKET_MMAP capturing backend.
+
+Packets are captured by AF_PACKET socket with memory-mapped receive ring
+(TPACKET_V3) shared with the kernel. The kernel fills whole blocks of
+frames, so there is no system call per packet. No libpcap's wrapper
+is needed (libpcap library is used to compile BPF filters only).
+
+To use it set the config before importing umit.umpa.sniffing:
+
+>>> umit.umpa.config['libpcap'] = 'tpacket'
+
+Frames of the current block can be processed without copying them
+with next_block(). Only live capturing is supported.
+"""
+
+import ctypes
+import mmap
+import os
+import select
+import socket
+import struct
+from fcntl import ioctl
+
+from umit.umpa.protocols._consts import DLT_EN10MB, DLT_LINUX_SLL
+from umit.umpa.sniffing.libpcap._abstract import *
+from umit.umpa.sniffing.libpcap._bpf import bpf_insn, compile_filter
+from umit.umpa.utils.exceptions import UMPASniffingException
+
+# see umit.umpa.sniffing.libpcap._abstract for docstrings
+
+# constants from various header files not available under Python
+ETH_P_ALL = 3                     # from linux/if_ether.h
+SOL_PACKET = 263                  # from linux/socket.h
+SO_ATTACH_FILTER = 26             # from asm-generic/socket.h
+SIOCGIFINDEX = 0x8933             # from linux/sockios.h
+ARPHRD_ETHER = 1                  # from linux/if_arp.h
+ARPHRD_LOOPBACK = 772
+PACKET_ADD_MEMBERSHIP = 1         # from linux/if_packet.h
+PACKET_MR_PROMISC = 1
+PACKET_RX_RING = 5
+PACKET_VERSION = 10
+TPACKET_V3 = 2
+TP_STATUS_KERNEL = 0
+TP_STATUS_USER = 1
+TPACKET3_HDRLEN = 48              # TPACKET_ALIGN(sizeof(struct tpacket3_hdr))
+
+def lookupdev():
+    for device in findalldevs():
+        if device in ('any', 'lo'):
+            continue
+        try:
+            state = open('/sys/class/net/%s/operstate' % device).read()
+        except IOError:
+            continue
+        if state.strip() == 'up':
+            return device
+    raise UMPASniffingException("no suitable device found")
+
+def findalldevs():
+    try:
+        devices = sorted(os.listdir('/sys/class/net'))
+    except OSError, msg:
+        raise UMPASniffingException(msg)
+    return devices + ['any']
+
+class open_pcap(open_pcap):
+    def __init__(self, device=None, snaplen=1024, promisc=True, to_ms=0,
+                                        block_size=2**17, block_nr=64):
+        """
+        @type block_size: C{int}
+        @param block_size: size of blocks of the ring
+                           (a multiple of the page size)
+
+        @type block_nr: C{int}
+        @param block_nr: number of blocks of the ring
+        """
+
+        if device is None:
+            self.device = lookupdev()
+        else:
+            self.device = device
+        self.snaplen = snaplen
+        self.promisc = promisc
+        self.to_ms = to_ms
+
+        if os.path.isfile(self.device):
+            raise UMPASniffingException("offline capturing is not supported")
+
+        try:
+            self._sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW,
+                                       socket.htons(ETH_P_ALL))
+        except socket.error, msg:
+            raise UMPASniffingException(msg)
+
+        try:
+            if self.device == 'any':
+                # frames of different interfaces get Linux cooked headers
+                self._cooked = True
+            else:
+                self._sock.bind((self.device, ETH_P_ALL))
+                hatype = self._sock.getsockname()[3]
+                self._cooked = hatype not in (ARPHRD_ETHER, ARPHRD_LOOPBACK)
+                if promisc:
+                    ifreq = ioctl(self._sock, SIOCGIFINDEX,
+                                  struct.pack("16si", self.device, 0))
+                    ifindex = struct.unpack("16si", ifreq)[1]
+                    self._sock.setsockopt(SOL_PACKET, PACKET_ADD_MEMBERSHIP,
+                            struct.pack("iHH8s", ifindex, PACKET_MR_PROMISC,
+                                                                    0, ""))
+            self._setup_ring(block_size, block_nr)
+        except (socket.error, EnvironmentError), msg:
+            self._sock.close()
+            raise UMPASniffingException(msg)
+
+        self._poll = select.poll()
+        self._poll.register(self._sock, select.POLLIN | select.POLLERR)
+        self._filter = None
+        self._nonblock = False
+
+        # frames of the current block
+        self._current = None
+        self._frames = []
+        self._index = 0
+
+    def _setup_ring(self, block_size, block_nr):
+        """
+        Set up the receive ring and map it into the memory.
+        """
+
+        self.block_size = block_size
+        self.block_nr = block_nr
+        # frames are variable-length in TPACKET_V3, but the kernel checks
+        # the geometry anyway
+        frame_size = 2048
+        if self.to_ms > 0:
+            retire = self.to_ms
+        else:
+            retire = 10
+
+        self._sock.setsockopt(SOL_PACKET, PACKET_VERSION, TPACKET_V3)
+        self._sock.setsockopt(SOL_PACKET, PACKET_RX_RING,
+                        struct.pack("IIIIIII", block_size, block_nr,
+                                    frame_size,
+                                    block_size / frame_size * block_nr,
+                                    retire, 0, 0))
+        self._ring = mmap.mmap(self._sock.fileno(), block_size * block_nr,
+                               mmap.MAP_SHARED,
+                               mmap.PROT_READ | mmap.PROT_WRITE)
+        self._block = 0
+
+    def _release(self):
+        """
+        Return the current block to the kernel.
+        """
+
+        if self._current is not None:
+            struct.pack_into("I", self._ring, self._current + 8,
+                                                        TP_STATUS_KERNEL)
+            self._current = None
+            self._block = (self._block + 1) % self.block_nr
+        self._frames = []
+        self._index = 0
+
+    def _wait(self, timeout):
+        """
+        Wait for the next block filled by the kernel.
+
+        @type timeout: C{int}
+        @param timeout: timeout in miliseconds (None means infinity)
+
+        @rtype: C{bool}
+        @return: True if the block is ready.
+        """
+
+        self._release()
+        offset = self._block * self.block_size
+        while not struct.unpack_from("I", self._ring, offset + 8)[0] & \
+                                                            TP_STATUS_USER:
+            if not self._poll.poll(timeout) and timeout is not None:
+                return False
+        self._current = offset
+        self._frames = self._read_block(offset)
+        return True
+
+    def _read_block(self, offset):
+        """
+        Return frames of the block.
+
+        @type offset: C{int}
+        @param offset: offset of the block in the ring
+
+        @rtype: C{list}
+        @return: (timestamp, frame) tuples.
+        """
+
+        ring = self._ring
+        num_pkts, position = struct.unpack_from("II", ring, offset + 12)
+        position += offset
+        frames = []
+        for i in xrange(num_pkts):
+            next_offset, sec, nsec, snaplen, length, status, mac, net = \
+                        struct.unpack_from("IIIIIIHH", ring, position)
+            ts = sec + nsec / 1e9
+            if self._cooked:
+                # build Linux cooked header from struct sockaddr_ll
+                sll = position + TPACKET3_HDRLEN
+                proto, = struct.unpack_from("!H", ring, sll + 2)
+                hatype, pkttype, halen, addr = struct.unpack_from("HBB8s",
+                                                            ring, sll + 8)
+                length = min(mac + snaplen - net, self.snaplen - 16)
+                frame = struct.pack("!HHH8sH", pkttype, hatype, halen,
+                                    addr, proto) + \
+                                    ring[position + net:position + net + length]
+            else:
+                # the frame stays in the ring
+                frame = buffer(ring, position + mac, min(snaplen, self.snaplen))
+            frames.append((ts, frame))
+            position += next_offset
+        return frames
+
+    def __iter__(self):
+        return self
+
+    def next_block(self, timeout=None):
+        """
+        Collect and return frames of the next block of the ring.
+
+        Frames aren't copied (except Linux cooked ones), so they are valid
+        until the next call of any collecting method.
+
+        @type timeout: C{int}
+        @param timeout: timeout in miliseconds (default: infinity)
+
+        @rtype: C{list}
+        @return: (timestamp, frame) tuples; empty list after timeout.
+        """
+
+        if self._index < len(self._frames):
+            # rest of the current block
+            frames = self._frames[self._index:]
+            self._index = len(self._frames)
+            return frames
+        if not self._wait(timeout):
+            return []
+        self._index = len(self._frames)
+        return self._frames
+
+    def dispatch(self, cnt, callback, *user):
+        # frames passed to the callback are valid until it returns
+        if self._index >= len(self._frames):
+            if self._nonblock:
+                timeout = 0
+            elif self.to_ms > 0:
+                timeout = self.to_ms
+            else:
+                timeout = None
+            if not self._wait(timeout):
+                return 0
+
+        if cnt > 0:
+            end = min(self._index + cnt, len(self._frames))
+        else:
+            end = len(self._frames)
+        count = 0
+        while self._index < end:
+            ts, frame = self._frames[self._index]
+            self._index += 1
+            callback(ts, frame, *user)
+            count += 1
+        return count
+
+    def loop(self, cnt, callback, *user):
+        count = 0
+        while cnt <= 0 or count < cnt:
+            if cnt > 0:
+                count += self.dispatch(cnt - count, callback, *user)
+            else:
+                count += self.dispatch(-1, callback, *user)
+        return count
+
+    def next(self):
+        while self._index >= len(self._frames):
+            self._wait(None)
+        ts, frame = self._frames[self._index]
+        self._index += 1
+        return ts, str(frame)
+
+    def setfilter(self, filter):
+        """
+        Specify a filter.
+
+        @type filter: C{str} or C{list}
+        @param filter: filter string in BPF format (see pcap manual)
+                       or compiled (code, jt, jf, k) instructions
+
+        @note: filters of 'any' device are compiled for Ethernet frames.
+        """
+
+        if isinstance(filter, basestring):
+            filter = compile_filter(filter, self.snaplen)
+
+        insns = (bpf_insn * len(filter))()
+        for i, insn in enumerate(filter):
+            insns[i].code, insns[i].jt, insns[i].jf, insns[i].k = insn
+        try:
+            self._sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER,
+                    struct.pack("HL", len(filter), ctypes.addressof(insns)))
+        except socket.error, msg:
+            raise UMPASniffingException(msg)
+        # the kernel copies the program, but keep it anyway
+        self._filter = insns
+
+        # drop frames captured before the filter was attached
+        self._release()
+        offset = self._block * self.block_size
+        while struct.unpack_from("I", self._ring, offset + 8)[0] & \
+                                                            TP_STATUS_USER:
+            self._current = offset
+            self._release()
+            offset = self._block * self.block_size
+
+    def fileno(self):
+        return self._sock.fileno()
+
+    def setnonblock(self, nonblock=True):
+        self._nonblock = nonblock
+
+    def datalink(self):
+        if self._cooked:
+            return DLT_LINUX_SLL
+        return DLT_EN10MB
+
+    def close(self):
+        """
+        Close the capture descriptor.
+        """
+
+        self._frames = []
+        self._ring.close()
+        self._sock.close()
@@ -26,6 +26,7 @@ These functions are more independented from the packet manipulations issue.
 
 They are splitted in the following categories (modules):
     - bits -- some extra manipulations of bits
+    - checksum -- Internet Checksum of raw buffers
     - exceptions -- UMPA's exceptions
     - net -- network issues
     - security -- security issues
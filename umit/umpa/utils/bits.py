@@ -23,10 +23,16 @@
 Functions related with parsing bits of numbers.
 """
 
+import binascii
+import struct
+
 from umit.umpa.utils.exceptions import UMPAException
 
 BYTE = 8
 
+# struct formats for byte-aligned chunks which fit into C types
+_FORMATS = { 1 : '!B', 2 : '!H', 4 : '!I', 8 : '!Q' }
+
 def split_number_into_chunks(number, chunk_size=BYTE, chunk_amount=None):
     """
     Split the big number into small chunks.
@@ -104,3 +110,126 @@ def str_to_bits(chars):
         raw += ord(char)
 
     return raw
+
+def number_to_bytes(number, length):
+    """
+    Convert the number into a big-endian string of bytes.
+
+    It works in linear time, so it's suitable for really big numbers
+    (unlike split_number_into_chunks()).
+
+    @type number: C{int}
+    @param number: the non-negative number for converting.
+
+    @type length: C{int}
+    @param length: length of the result in bytes.
+
+    @rtype: C{str}
+    @return: big-endian representation of the number.
+    """
+
+    if length == 0:
+        if number:
+            raise UMPAException("Number %d doesn't fit in 0 bytes." % number)
+        return ''
+    hexed = '%x' % number
+    if len(hexed) > length * 2:
+        raise UMPAException("Number %d doesn't fit in %d bytes."
+                                                        % (number, length))
+    return binascii.unhexlify(hexed.zfill(length * 2))
+
+def bytes_to_number(chars):
+    """
+    Convert a big-endian string of bytes to the number.
+
+    @type chars: C{str} or C{bytearray}
+    @param chars: raw bytes
+
+    @rtype: C{int}
+    @return: value represented by the bytes.
+    """
+
+    if not len(chars):
+        return 0
+    return int(binascii.hexlify(chars), 16)
+
+def pack_bits(buffer, offset, bits, value):
+    """
+    Write n bits of the value into the buffer at the offset.
+
+    The offset is counted in bits from the left side (big-endian order),
+    so it's possible to store fields like 4-bit or 13-bit ones which
+    don't start or end at the byte boundary. Other bits of partially
+    covered bytes are kept untouched.
+
+    @type buffer: C{bytearray}
+    @param buffer: the buffer which will be updated.
+
+    @type offset: C{int}
+    @param offset: offset of the bits from the beginning of the buffer.
+
+    @type bits: C{int}
+    @param bits: number of bits to write.
+
+    @type value: C{int} or C{str}
+    @param value: the value; strings are treated as raw big-endian data.
+    """
+
+    if not bits:
+        return
+
+    start = offset >> 3
+    end = (offset + bits + BYTE - 1) >> 3
+    shift = end * BYTE - offset - bits
+    aligned = not shift and not offset & 7
+
+    if isinstance(value, (str, bytearray)):
+        if aligned and len(value) == end - start:
+            buffer[start:end] = value
+            return
+        value = bytes_to_number(value)
+
+    value &= (1 << bits) - 1
+    if aligned:
+        if end - start in _FORMATS:
+            struct.pack_into(_FORMATS[end - start], buffer, start, value)
+        else:
+            buffer[start:end] = number_to_bytes(value, end - start)
+        return
+
+    # not aligned, so merge bits with the neighbours
+    size = end - start
+    mask = bytearray(number_to_bytes(((1 << bits) - 1) << shift, size))
+    chunk = bytearray(number_to_bytes(value << shift, size))
+    for i in xrange(size):
+        buffer[start + i] = (buffer[start + i] & ~mask[i] & 0xff) | chunk[i]
+
+def unpack_bits(buffer, offset, bits):
+    """
+    Return n bits from the buffer at the offset.
+
+    This is a counterpart of pack_bits().
+
+    @type buffer: C{bytearray} or C{str}
+    @param buffer: the buffer which will be parsed.
+
+    @type offset: C{int}
+    @param offset: offset of the bits from the beginning of the buffer.
+
+    @type bits: C{int}
+    @param bits: number of bits to read.
+
+    @rtype: C{int}
+    @return: grabbed n bits from the buffer.
+    """
+
+    if not bits:
+        return 0
+
+    start = offset >> 3
+    end = (offset + bits + BYTE - 1) >> 3
+    shift = end * BYTE - offset - bits
+    if not shift and not offset & 7 and end - start in _FORMATS:
+        return struct.unpack_from(_FORMATS[end - start], buffer, start)[0]
+    number = bytes_to_number(buffer[start:end])
+    return (number >> shift) & ((1 << bits) - 1)
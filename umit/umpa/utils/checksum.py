@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2008-2009 Adriano Monteiro Marques.
+#
+# Author: Bartosz SKOWRON <getxsick at gmail dot com>
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published
+# by the Free Software Foundation; either version 2.1 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
+
+"""
+Internet Checksum (RFC 1071) calculated on raw buffers.
+
+The data is summed up as 16-bit words by array('H') without any copying
+of the buffers (they are accessed by buffer() objects). Words are summed
+in the native byte order and the result is swapped at the end if needed,
+what is allowed because of the byte order independence of the checksum.
+
+The data may be passed as a sequence of buffers (e.g. a pseudo header,
+a header and payloads), so there is no need to join them first.
+
+Also, incremental updates (RFC 1624) are supported, so the checksum
+doesn't have to be calculated again if only some fields were changed.
+"""
+
+import array
+import sys
+
+_LITTLE_ENDIAN = sys.byteorder == 'little'
+
+def _fold(cksum):
+    """
+    Fold 32-bit (or longer) sum to 16 bits with end-around carry.
+
+    @type cksum: C{int}
+    @param cksum: the sum.
+
+    @rtype: C{int}
+    @return: 16-bit one's complement sum.
+    """
+
+    while cksum >> 16:
+        cksum = (cksum & 0xffff) + (cksum >> 16)
+    return cksum
+
+def _swap(word):
+    """
+    Swap bytes of the 16-bit word.
+
+    @type word: C{int}
+    @param word: 16-bit value.
+
+    @rtype: C{int}
+    @return: swapped value.
+    """
+
+    return ((word << 8) | (word >> 8)) & 0xffff
+
+def _byte(chunk, index):
+    """
+    Return the byte of the buffer as a number.
+
+    @type chunk: C{str}, C{bytearray} or C{buffer}
+    @param chunk: raw data.
+
+    @type index: C{int}
+    @param index: index of the byte.
+
+    @rtype: C{int}
+    @return: value of the byte.
+    """
+
+    byte = chunk[index]
+    if isinstance(byte, str):
+        byte = ord(byte)
+    return byte
+
+def cksum_add(data, cksum=0):
+    """
+    Return one's complement sum of the data (not complemented).
+
+    Use it to calculate partial sums of buffers and then pass the result
+    to in_cksum() as the cksum argument.
+
+    @type data: C{str}, C{bytearray} or a sequence of them
+    @param data: raw data (in network byte order).
+
+    @type cksum: C{int}
+    @param cksum: already calculated sum (default: 0)
+
+    @rtype: C{int}
+    @return: 16-bit one's complement sum.
+    """
+
+    if isinstance(data, (str, bytearray, buffer)):
+        data = (data,)
+
+    # words are summed up in the native order
+    total = 0
+    odd = None
+    for chunk in data:
+        length = len(chunk)
+        if not length:
+            continue
+        start = 0
+        # the last byte of the previous chunk is paired with the first one
+        if odd is not None:
+            first = _byte(chunk, 0)
+            if _LITTLE_ENDIAN:
+                total += odd | first << 8
+            else:
+                total += odd << 8 | first
+            odd = None
+            start = 1
+        end = start + ((length - start) & ~1)
+        if end - start:
+            words = array.array('H')
+            words.fromstring(buffer(chunk, start, end - start))
+            total += sum(words)
+        if end != length:
+            odd = _byte(chunk, end)
+
+    # odd length is padded with zero byte
+    if odd is not None:
+        if _LITTLE_ENDIAN:
+            total += odd
+        else:
+            total += odd << 8
+
+    total = _fold(total)
+    if _LITTLE_ENDIAN:
+        total = _swap(total)
+    return _fold(total + cksum)
+
+def in_cksum(data, cksum=0):
+    """
+    Return Internet Checksum of the raw data.
+
+    It is an implementation of RFC 1071.
+
+    To check if the already calculated checksum is correct, pass it as cksum
+    argument. If the result is 0, then the ckecksum has not detected an error.
+
+    @type data: C{str}, C{bytearray} or a sequence of them
+    @param data: the data from which checksum is calculated.
+
+    @type cksum: C{int}
+    @param cksum: already calculated checksum for comparision (default: 0)
+
+    @rtype: C{int}
+    @return: calculated checksum.
+    """
+
+    return ~cksum_add(data, cksum) & 0xffff
+
+def update_cksum(cksum, old, new):
+    """
+    Return the checksum updated after changing some words of the data.
+
+    It is an implementation of RFC 1624 (eqn. 3):
+    HC' = ~(~HC + ~m + m')
+
+    Old and new values have to be placed at the same even offset
+    of the data (so they are aligned to 16-bit words).
+
+    @type cksum: C{int}
+    @param cksum: already calculated checksum.
+
+    @type old: C{int}, C{str} or C{bytearray}
+    @param old: old value (16-bit word or raw data of even length).
+
+    @type new: C{int}, C{str} or C{bytearray}
+    @param new: new value (16-bit word or raw data of even length).
+
+    @rtype: C{int}
+    @return: updated checksum.
+    """
+
+    if not isinstance(old, (int, long)):
+        old = cksum_add(old)
+    if not isinstance(new, (int, long)):
+        new = cksum_add(new)
+
+    total = (~cksum & 0xffff) + (~old & 0xffff) + new
+    return ~_fold(total) & 0xffff
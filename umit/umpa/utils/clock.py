@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2008-2009 Adriano Monteiro Marques.
+#
+# Author: Bartosz SKOWRON <getxsick at gmail dot com>
+#
+# This library is free software; you can redistribute it and/or modify 
+# it under the terms of the GNU Lesser General Public License as published 
+# by the Free Software Foundation; either version 2.1 of the License, or 
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but 
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public 
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License 
+# along with this library; if not, write to the Free Software Foundation, 
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA 
+
+
+"""
+High-resolution monotonic clock and precise waiting.
+
+Python 2 has no monotonic clock, so clock_gettime(CLOCK_MONOTONIC)
+is called by ctypes. If it's not available time.time() is used.
+"""
+
+import ctypes
+import ctypes.util
+import time
+
+# the last part of waiting which is busy-waited (in seconds)
+SPIN_THRESHOLD = 0.002
+
+CLOCK_MONOTONIC = 1 # from linux/time.h
+
+class _timespec(ctypes.Structure):
+    """
+    struct timespec from time.h
+    """
+
+    _fields_ = [('tv_sec', ctypes.c_long),
+                ('tv_nsec', ctypes.c_long)]
+
+def _time_ns():
+    return int(time.time() * 1e9)
+
+def _get_monotonic():
+    """
+    Return functions which return the monotonic time in seconds
+    and in nanoseconds.
+    """
+
+    libname = ctypes.util.find_library('c')
+    try:
+        clock_gettime = ctypes.CDLL(libname, use_errno=True).clock_gettime
+    except (OSError, AttributeError):
+        return time.time, _time_ns
+    clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(_timespec)]
+
+    if clock_gettime(CLOCK_MONOTONIC, ctypes.byref(_timespec())) != 0:
+        return time.time, _time_ns
+
+    # ctypes releases the GIL during calls, so every call needs its own
+    # timespec (threads would overwrite a shared one)
+    byref = ctypes.byref
+
+    def monotonic():
+        ts = _timespec()
+        clock_gettime(CLOCK_MONOTONIC, byref(ts))
+        return ts.tv_sec + ts.tv_nsec * 1e-9
+    monotonic.__doc__ = """
+    Return the time of the monotonic clock in seconds.
+
+    Only differences between values are meaningful.
+
+    @rtype: C{float}
+    @return: time in seconds.
+    """
+
+    def monotonic_ns():
+        ts = _timespec()
+        clock_gettime(CLOCK_MONOTONIC, byref(ts))
+        return ts.tv_sec * 1000000000 + ts.tv_nsec
+    monotonic_ns.__doc__ = """
+    Return the time of the monotonic clock in nanoseconds.
+
+    Only differences between values are meaningful.
+
+    @rtype: C{int}
+    @return: time in nanoseconds.
+    """
+    return monotonic, monotonic_ns
+
+monotonic, monotonic_ns = _get_monotonic()
+
+def wait_until(target, spin=SPIN_THRESHOLD):
+    """
+    Wait until the target time of the monotonic clock.
+
+    Most of the time is slept, the last part is busy-waited
+    (sleeping is not precise enough for short gaps).
+
+    @type target: C{float}
+    @param target: time of the monotonic clock
+
+    @type spin: C{float}
+    @param spin: time in seconds which is busy-waited
+                 (default: I{SPIN_THRESHOLD})
+    """
+
+    delay = target - monotonic() - spin
+    if delay > 0:
+        time.sleep(delay)
+    while monotonic() < target:
+        pass
@@ -23,13 +23,16 @@
 Functions related to network issues.
 """
 
-import umit.umpa.utils.bits
+import binascii
+
+import umit.umpa.utils.checksum
 
 def in_cksum(data, cksum=0):
     """
     Return Internet Checksum.
 
     It is an implementation of RFC 1071.
+    For raw buffers use umit.umpa.utils.checksum module directly.
 
     To check if the already calculated checksum is correct, pass it as cksum
     argument. If the result is 0, then the ckecksum has not detected an error.
@@ -44,19 +47,11 @@ def in_cksum(data, cksum=0):
     @return: calculated checksum.
     """
 
-    pieces = umit.umpa.utils.bits.split_number_into_chunks(data)
-    if len(pieces)%2 == 1:
-        pieces.append(0)
-
-    for i in xrange(0, len(pieces), 2):
-        xxx = ((pieces[i] << 8) & 0xff00) + (pieces[i+1] & 0xff)
-        cksum += xxx
-
-    while cksum >> 16:
-        cksum = (cksum & 0xffff) + (cksum >> 16)
-
-    cksum = ~cksum
-    return int(cksum & 0xffff)
+    # leading zero bytes are not included (as the number doesn't store them)
+    hexed = '%x' % data
+    if len(hexed) % 2:
+        hexed = '0' + hexed
+    return umit.umpa.utils.checksum.in_cksum(binascii.unhexlify(hexed), cksum)
 
 def parse_ipv4(ip):
     """
@@ -0,0 +1,333 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2008-2009 Adriano Monteiro Marques.
+#
+# Author: Bartosz SKOWRON <getxsick at gmail dot com>
+#
+# This library is free software; you can redistribute it and/or modify 
+# it under the terms of the GNU Lesser General Public License as published 
+# by the Free Software Foundation; either version 2.1 of the License, or 
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but 
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public 
+# License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License 
+# along with this library; if not, write to the Free Software Foundation, 
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA 
+
+
+"""
+Opt-in profiling of hot paths.
+
+enable() replaces methods of hot paths by wrappers which count calls
+and cumulative nanoseconds, disable() restores the original methods,
+so there is no cost when profiling is disabled.
+
+Measured stages (keys of snapshot() are (subject, stage) tuples):
+ - protocols (subject is the name of the protocol's class):
+   'build' (whole get_raw_buffer()/get_raw()), 'pre_raw', 'fillout'
+   (fields are filled out and packed), 'post_raw' (e.g. checksums)
+   and 'load_raw' (decoding),
+ - ('Packet', 'get_raw') - the whole serialization of packets,
+ - ('Decoder', 'decode') - decoding of sniffed packets,
+ - sockets (subject is the name of the socket's class): 'send'
+   and 'send_raw',
+ - ('sniffing', name) - sniffing functions (e.g. 'sniff_loop' or
+   'from_file'; callbacks are included) and 'iter' (time spent
+   in iter_file()/iter_live() generators, without the caller's time).
+
+Nested calls of the same stage of the same subject (e.g. by super())
+are counted once. Protocols defined after enable() are not profiled.
+
+>>> with profile() as prof:
+...     packet.get_raw()
+>>> print prof.report()
+"""
+
+import threading
+
+from umit.umpa.utils.clock import monotonic_ns
+
+# methods of protocols and their stages
+PROTOCOL_STAGES = {
+    'get_raw' : 'build',
+    'get_raw_buffer' : 'build',
+    '_pre_raw' : 'pre_raw',
+    '_fillout_buffer' : 'fillout',
+    '_post_raw' : 'post_raw',
+    '_post_raw_buffer' : 'post_raw',
+    'load_raw' : 'load_raw',
+}
+
+# sniffing functions (generators are marked by True)
+SNIFFING_FUNCTIONS = {
+    'sniff' : False,
+    'sniff_next' : False,
+    'sniff_loop' : False,
+    'from_file' : False,
+    'from_file_loop' : False,
+    'to_file' : False,
+    '_iter_session' : True,
+}
+
+# (subject, stage) -> [calls, nanoseconds]
+_stats = {}
+# (owner, name, original attribute) of replaced attributes
+_patches = []
+# keys of measured calls in the current thread
+_local = threading.local()
+
+def _record(key, elapsed):
+    try:
+        counter = _stats[key]
+    except KeyError:
+        counter = _stats.setdefault(key, [0, 0])
+    counter[0] += 1
+    counter[1] += elapsed
+
+def _active():
+    try:
+        return _local.active
+    except AttributeError:
+        _local.active = set()
+        return _local.active
+
+def _method(func, stage, subject=None):
+    """
+    Return a timed wrapper of the method.
+
+    The subject is the name of the instance's class by default.
+    """
+
+    def wrapper(self, *args, **kwargs):
+        if subject is None:
+            key = (self.__class__.__name__, stage)
+        else:
+            key = (subject, stage)
+        active = _active()
+        if key in active:
+            return func(self, *args, **kwargs)
+        active.add(key)
+        start = monotonic_ns()
+        try:
+            return func(self, *args, **kwargs)
+        finally:
+            _record(key, monotonic_ns() - start)
+            active.discard(key)
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+def _function(func, key):
+    """
+    Return a timed wrapper of the function.
+    """
+
+    def wrapper(*args, **kwargs):
+        start = monotonic_ns()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _record(key, monotonic_ns() - start)
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+def _generator(func, key):
+    """
+    Return a wrapper of the generator function which times every step.
+    """
+
+    def wrapper(*args, **kwargs):
+        generator = func(*args, **kwargs)
+        try:
+            while True:
+                start = monotonic_ns()
+                try:
+                    item = generator.next()
+                finally:
+                    _record(key, monotonic_ns() - start)
+                yield item
+        finally:
+            generator.close()
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+def _patch(owner, name, wrapper):
+    original = owner.__dict__[name]
+    _patches.append((owner, name, original))
+    setattr(owner, name, wrapper)
+
+def _subclasses(cls):
+    classes = [cls]
+    for subclass in cls.__subclasses__():
+        for subsubclass in _subclasses(subclass):
+            if subsubclass not in classes:
+                classes.append(subsubclass)
+    return classes
+
+def is_enabled():
+    """
+    Check if profiling is enabled.
+
+    @rtype: C{bool}
+    @return: True if hot paths are profiled.
+    """
+
+    return bool(_patches)
+
+def enable():
+    """
+    Start profiling of hot paths.
+
+    Collected statistics are kept (see reset()).
+    """
+
+    if _patches:
+        return
+
+    # imported here, because utils are imported by these modules
+    from umit.umpa._packets import Packet
+    from umit.umpa._sockets import SocketL2, SocketL3
+    from umit.umpa.protocols._decoder import Decoder
+    from umit.umpa.protocols._protocols import Protocol
+
+    for cls in _subclasses(Protocol):
+        for name in PROTOCOL_STAGES:
+            if name in cls.__dict__:
+                _patch(cls, name, _method(cls.__dict__[name],
+                                          PROTOCOL_STAGES[name]))
+    _patch(Packet, 'get_raw', _method(Packet.__dict__['get_raw'], 'get_raw'))
+    _patch(Decoder, 'decode', _method(Decoder.__dict__['decode'], 'decode'))
+    for cls in _subclasses(SocketL2) + _subclasses(SocketL3):
+        for name in ('send', 'send_raw'):
+            if name in cls.__dict__:
+                _patch(cls, name, _method(cls.__dict__[name], name))
+
+    try:
+        import umit.umpa.sniffing as sniffing
+    except ImportError:
+        return
+    for name in SNIFFING_FUNCTIONS:
+        func = sniffing.__dict__[name]
+        if SNIFFING_FUNCTIONS[name]:
+            wrapper = _generator(func, ('sniffing', 'iter'))
+        else:
+            wrapper = _function(func, ('sniffing', name))
+        _patch(sniffing, name, wrapper)
+
+def disable():
+    """
+    Stop profiling and restore original methods.
+
+    Collected statistics are kept.
+    """
+
+    while _patches:
+        owner, name, original = _patches.pop()
+        setattr(owner, name, original)
+
+def reset():
+    """
+    Clear collected statistics.
+    """
+
+    _stats.clear()
+
+def snapshot():
+    """
+    Return collected statistics.
+
+    @rtype: C{dict}
+    @return: (subject, stage) -> (calls, nanoseconds)
+    """
+
+    result = {}
+    for key, counter in _stats.items():
+        result[key] = tuple(counter)
+    return result
+
+def diff(after, before):
+    """
+    Return statistics collected between two snapshots.
+
+    @type after: C{dict}
+    @param after: the later snapshot
+
+    @type before: C{dict}
+    @param before: the earlier snapshot
+
+    @rtype: C{dict}
+    @return: (subject, stage) -> (calls, nanoseconds)
+    """
+
+    result = {}
+    for key in after:
+        calls, elapsed = after[key]
+        if key in before:
+            calls -= before[key][0]
+            elapsed -= before[key][1]
+        if calls:
+            result[key] = (calls, elapsed)
+    return result
+
+def report(stats=None):
+    """
+    Return statistics as a table sorted by cumulative time.
+
+    @type stats: C{dict}
+    @param stats: statistics (default: snapshot())
+
+    @rtype: C{str}
+    @return: the table.
+    """
+
+    if stats is None:
+        stats = snapshot()
+    lines = ["%-12s %-12s %10s %14s %10s" % ('subject', 'stage', 'calls',
+                                             'total [ns]', 'per call')]
+    items = sorted(stats.items(), key=lambda item: item[1][1], reverse=True)
+    for (subject, stage), (calls, elapsed) in items:
+        lines.append("%-12s %-12s %10d %14d %10d" % (subject, stage, calls,
+                                                elapsed, elapsed // calls))
+    return "\n".join(lines)
+
+class profile(object):
+    """
+    Context manager which profiles its block.
+
+    Statistics of the block are available as the stats attribute
+    after the block. Profiling is disabled after the block if it was
+    disabled before.
+    """
+
+    def __init__(self):
+        self.stats = {}
+        self._enabled = None
+        self._before = None
+
+    def __enter__(self):
+        self._enabled = is_enabled()
+        self._before = snapshot()
+        enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not self._enabled:
+            disable()
+        self.stats = diff(snapshot(), self._before)
+
+    def report(self):
+        """
+        Return statistics of the block as a table (see report()).
+
+        @rtype: C{str}
+        @return: the table.
+        """
+
+        return report(self.stats)